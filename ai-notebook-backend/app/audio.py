@@ -0,0 +1,196 @@
+"""Audio transcription for ``/upload_audio`` and ``/transcribe-audio``.
+
+Audio is decoded to 16 kHz mono PCM (WAV natively, anything else through
+``ffmpeg`` on PATH), split on silence into segments of roughly
+AUDIO_SEGMENT_SECONDS (never longer than AUDIO_MAX_SEGMENT_SECONDS, so every
+request stays far below the provider's upload cap), and the segments are
+transcribed concurrently on AUDIO_TRANSCRIBE_WORKERS threads.
+
+The transcriber is selected by ``AUDIO_TRANSCRIBER``:
+
+- ``whisper-1`` (any name without a prefix): OpenAI API, through the upstream
+  scheduler like every other OpenAI call.
+- ``local:<size-or-path>``: faster-whisper on CPU, e.g. ``local:base``.
+"""
+import contextvars
+import shutil
+import subprocess
+import tempfile
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from pathlib import Path
+
+from . import progress
+from .config import settings
+from .embeddings import _openai_cls
+from .tracing import span
+from .upstream import BACKGROUND, scheduler
+
+RATE = 16000  # Whisper's native sample rate
+_FRAME = RATE * 30 // 1000  # 30 ms analysis frames
+
+
+class Transcriber:
+    model_id: str = ""
+
+    def transcribe(self, path: str, priority: int = BACKGROUND) -> str:
+        raise NotImplementedError
+
+
+class OpenAITranscriber(Transcriber):
+    def __init__(self, model: str) -> None:
+        self.model_id = model
+
+    def transcribe(self, path: str, priority: int = BACKGROUND) -> str:
+        if not settings.OPENAI_API_KEY:
+            raise RuntimeError("Missing OPENAI_API_KEY. Set it in .env or environment.")
+        client = _openai_cls()(api_key=settings.OPENAI_API_KEY, max_retries=0)
+
+        def call():
+            # fresh handle per attempt; a retry must not resume at EOF
+            with open(path, "rb") as f:
+                return client.audio.transcriptions.create(model=self.model_id, file=f, response_format="text")
+
+        return str(scheduler.run(self.model_id, call, priority=priority))
+
+
+class FasterWhisperTranscriber(Transcriber):
+    def __init__(self, model_id: str, name: str) -> None:
+        try:
+            from faster_whisper import WhisperModel
+        except Exception as e:
+            raise RuntimeError(f"AUDIO_TRANSCRIBER={model_id} needs faster-whisper installed: {e}")
+        self.model_id = model_id
+        self._model = WhisperModel(name, device="cpu", compute_type="int8")
+        self._lock = threading.Lock()  # the model runs one segment at a time
+
+    def transcribe(self, path: str, priority: int = BACKGROUND) -> str:
+        with self._lock:
+            segments, _ = self._model.transcribe(path, vad_filter=False)
+            return " ".join(s.text.strip() for s in segments)
+
+
+@lru_cache(maxsize=2)
+def _transcriber(model: str) -> Transcriber:
+    prefix, sep, rest = model.partition(":")
+    if sep and prefix == "local":
+        return FasterWhisperTranscriber(model, rest)
+    return OpenAITranscriber(model)
+
+
+def get_transcriber() -> Transcriber:
+    return _transcriber(settings.AUDIO_TRANSCRIBER)
+
+
+def load_pcm(path: str):
+    """16 kHz mono int16 samples of an audio file."""
+    import numpy as np
+
+    if Path(path).suffix.lower() == ".wav":
+        try:
+            with wave.open(path, "rb") as w:
+                rate, channels, width = w.getframerate(), w.getnchannels(), w.getsampwidth()
+                raw = w.readframes(w.getnframes())
+            if width == 2:
+                pcm = np.frombuffer(raw, dtype="<i2").reshape(-1, channels).mean(axis=1)
+                if rate != RATE:
+                    n = int(len(pcm) * RATE / rate)
+                    pcm = np.interp(np.linspace(0, len(pcm) - 1, n), np.arange(len(pcm)), pcm)
+                return pcm.astype(np.int16)
+        except wave.Error:
+            pass  # e.g. float or compressed WAV: let ffmpeg decode it
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError(f"Decoding {Path(path).suffix or 'this file'} needs ffmpeg on PATH (16-bit WAV works without it)")
+    proc = subprocess.run(
+        ["ffmpeg", "-nostdin", "-v", "error", "-i", path, "-ac", "1", "-ar", str(RATE), "-f", "s16le", "-"],
+        capture_output=True, check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode the audio: {proc.stderr.decode('utf8', 'replace')[-300:]}")
+    return np.frombuffer(proc.stdout, dtype="<i2")
+
+
+def split_on_silence(pcm) -> list[tuple[int, int]]:
+    """(start, end) sample ranges cut in pauses; all-silent ranges are left out.
+
+    A segment ends in the first pause of at least AUDIO_MIN_SILENCE_MS after
+    AUDIO_SEGMENT_SECONDS, or at the quietest frame before
+    AUDIO_MAX_SEGMENT_SECONDS when nobody pauses.
+    """
+    import numpy as np
+
+    n = len(pcm) // _FRAME
+    if n == 0:
+        return [(0, len(pcm))] if len(pcm) else []
+    frames = pcm[: n * _FRAME].astype(np.float32).reshape(n, _FRAME)
+    db = 20 * np.log10(np.sqrt((frames ** 2).mean(axis=1)) / 32768.0 + 1e-10)
+    silent = db < settings.AUDIO_SILENCE_DB
+    target = max(1, int(settings.AUDIO_SEGMENT_SECONDS * 1000 / 30))
+    longest = max(target, int(settings.AUDIO_MAX_SEGMENT_SECONDS * 1000 / 30))
+    min_gap = max(1, int(settings.AUDIO_MIN_SILENCE_MS / 30))
+
+    cuts, start = [], 0
+    while n - start > longest:
+        cut, run = None, 0
+        for i in range(start + target, start + longest):
+            run = run + 1 if silent[i] else 0
+            if run >= min_gap:
+                cut = i - run // 2  # middle of the pause
+                break
+        if cut is None:
+            cut = start + target + int(np.argmin(db[start + target:start + longest]))
+        cuts.append((start, cut))
+        start = cut
+    cuts.append((start, n))
+    out = []
+    for a, b in cuts:
+        if not silent[a:b].all():
+            out.append((a * _FRAME, len(pcm) if b == n else b * _FRAME))
+    return out
+
+
+@lru_cache(maxsize=1)
+def _pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max(1, settings.AUDIO_TRANSCRIBE_WORKERS), thread_name_prefix="audio")
+
+
+def _write_wav(path: Path, pcm) -> None:
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(pcm.tobytes())
+
+
+def transcribe(path: str, priority: int = BACKGROUND) -> list[dict]:
+    """Timestamped transcript: [{"start": s, "end": s, "text": str}, ...]."""
+    transcriber = get_transcriber()
+    with span("audio.transcribe", model=transcriber.model_id) as sp:
+        pcm = load_pcm(path)
+        ranges = split_on_silence(pcm)
+        progress.expect(segments_total=len(ranges))
+
+        def one(seg: str) -> str:
+            text = transcriber.transcribe(seg, priority)
+            progress.advance(segments_done=1)
+            return text
+
+        with tempfile.TemporaryDirectory(prefix="studylm-audio-") as tmp:
+            jobs = []
+            for i, (a, b) in enumerate(ranges):
+                seg = Path(tmp) / f"{i:05d}.wav"
+                _write_wav(seg, pcm[a:b])
+                ctx = contextvars.copy_context()
+                jobs.append(_pool().submit(ctx.run, one, str(seg)))
+            wait(jobs)  # no job may still be reading when the directory goes
+            texts = [(job.result() or "").strip() for job in jobs]
+        segments = [
+            {"start": round(a / RATE, 2), "end": round(b / RATE, 2), "text": t}
+            for (a, b), t in zip(ranges, texts)
+            if t
+        ]
+        if sp is not None:
+            sp.set(seconds=round(len(pcm) / RATE, 1), segments=len(ranges))
+    return segments
@@ -0,0 +1,199 @@
+"""File catalog behind ``/files``, ``/uploads-list`` and ``GET /file/{id}``.
+
+One SQLite row per uploaded source (name, kind, size, pages, chunk count,
+stage, label, title, timestamps), written as files are saved, ingested,
+relabelled and deleted, so listings are indexed queries instead of globbing
+``uploads/`` and parsing chunk mappings. The database runs in WAL mode and
+every thread opens its own connection, so worker processes and ingest threads
+can write while the UI reads.
+
+A new database is filled once from what is already on disk (``backfill``).
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .config import settings
+
+KINDS = {
+    ".pdf": "pdf", ".png": "image", ".jpg": "image", ".jpeg": "image", ".txt": "text",
+    ".mp3": "audio", ".wav": "audio", ".m4a": "audio", ".ogg": "audio", ".webm": "audio", ".flac": "audio", ".mp4": "audio",
+}
+SORTS = ("name", "uploaded_at", "updated_at", "size_bytes", "pages", "label", "stage")
+_COLUMNS = ("name", "kind", "ext", "size_bytes", "pages", "chunks", "stage", "label", "title", "uploaded_at", "updated_at", "progress")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER,
+    chunks INTEGER,
+    stage TEXT,
+    label TEXT,
+    title TEXT,
+    uploaded_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    progress TEXT
+);
+CREATE INDEX IF NOT EXISTS files_name ON files(name);
+CREATE INDEX IF NOT EXISTS files_uploaded ON files(uploaded_at);
+CREATE INDEX IF NOT EXISTS files_kind ON files(kind, name);
+CREATE INDEX IF NOT EXISTS files_stage ON files(stage, name);
+CREATE INDEX IF NOT EXISTS files_label ON files(label, name);
+CREATE INDEX IF NOT EXISTS files_updated ON files(updated_at);
+"""
+
+_local = threading.local()
+
+
+def _path() -> Path:
+    return Path(settings.CATALOG_DB)
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != _path():
+        conn = sqlite3.connect(_path(), timeout=30, isolation_level=None)  # autocommit
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name='files'").fetchone() and not any(
+            r[1] == "progress" for r in conn.execute("PRAGMA table_info(files)")
+        ):
+            conn.execute("ALTER TABLE files ADD COLUMN progress TEXT")  # catalogs created before progress events
+        conn.executescript(_SCHEMA)
+        _local.conn, _local.path = conn, _path()
+    return conn
+
+
+def _kind(name: str) -> tuple[str, str]:
+    ext = Path(name).suffix.lower()
+    return KINDS.get(ext, "other"), ext
+
+
+def add(file_id: str, name: str, size_bytes: int = 0, title: str | None = None, stage: str | None = "queued") -> None:
+    """Record a newly saved upload; saving it again resets everything but label and upload time."""
+    kind, ext = _kind(name)
+    now = time.time()
+    _conn().execute(
+        "INSERT INTO files (file_id, name, kind, ext, size_bytes, stage, title, uploaded_at, updated_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT(file_id) DO UPDATE SET name=excluded.name, kind=excluded.kind, ext=excluded.ext,"
+        " size_bytes=excluded.size_bytes, stage=excluded.stage, title=coalesce(excluded.title, title),"
+        " updated_at=excluded.updated_at",
+        (file_id, name, kind, ext, int(size_bytes), stage, title, now, now),
+    )
+
+
+def update(file_id: str, **fields) -> None:
+    """Set columns of an existing entry (ids that were never added, like content ids, are ignored)."""
+    unknown = set(fields) - set(_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown catalog fields: {', '.join(sorted(unknown))}")
+    fields["updated_at"] = time.time()
+    sets = ", ".join(f"{k}=?" for k in fields)
+    _conn().execute(f"UPDATE files SET {sets} WHERE file_id=?", (*fields.values(), file_id))
+
+
+def remove(file_id: str) -> None:
+    _conn().execute("DELETE FROM files WHERE file_id=?", (file_id,))
+
+
+def get(file_id: str) -> dict | None:
+    row = _conn().execute("SELECT * FROM files WHERE file_id=?", (file_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def names() -> list[str]:
+    return [r[0] for r in _conn().execute("SELECT name FROM files ORDER BY name")]
+
+
+def query(
+    kind: str | None = None,
+    stage: str | None = None,
+    label: str | None = None,
+    q: str | None = None,
+    sort: str = "name",
+    order: str = "asc",
+    limit: int | None = None,
+    offset: int = 0,
+) -> tuple[int, list[dict]]:
+    """(total matching, one page of rows) filtered by exact kind/stage/label and substring ``q``."""
+    if sort not in SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(SORTS)}")
+    where, args = [], []
+    for col, value in (("kind", kind), ("stage", stage), ("label", label)):
+        if value is not None:
+            where.append(f"{col}=?")
+            args.append(value)
+    if q:
+        like = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where.append("(name LIKE ? ESCAPE '\\' OR title LIKE ? ESCAPE '\\' OR label LIKE ? ESCAPE '\\')")
+        args += [like, like, like]
+    cond = f" WHERE {' AND '.join(where)}" if where else ""
+    conn = _conn()
+    total = conn.execute(f"SELECT count(*) FROM files{cond}", args).fetchone()[0]
+    direction = "DESC" if order.lower() == "desc" else "ASC"
+    sql = f"SELECT * FROM files{cond} ORDER BY {sort} {direction}, file_id {direction} LIMIT ? OFFSET ?"
+    rows = conn.execute(sql, (*args, -1 if limit is None else max(0, limit), max(0, offset))).fetchall()
+    return total, [dict(r) for r in rows]
+
+
+def changed_since(ts: float, file_ids: set[str] | None = None) -> list[dict]:
+    """Rows updated after ``ts`` (optionally only ``file_ids``), oldest first."""
+    rows = _conn().execute(
+        "SELECT file_id, stage, progress, updated_at FROM files WHERE updated_at > ? ORDER BY updated_at", (ts,)
+    ).fetchall()
+    return [dict(r) for r in rows if file_ids is None or r["file_id"] in file_ids]
+
+
+def _pages(chunks_path: Path) -> tuple[int | None, int | None]:
+    try:
+        chunks = json.loads(chunks_path.read_text(encoding="utf8"))
+    except Exception:
+        return None, None
+    return max((c.get("page_end") or c.get("page_start") or 0 for c in chunks), default=0) or None, len(chunks)
+
+
+def backfill(uploads_dir: Path, vectors_dir: Path, labels: dict) -> int:
+    """Add every file in ``uploads_dir`` the catalog does not know yet; returns how many."""
+    conn = _conn()
+    known = {r[0] for r in conn.execute("SELECT file_id FROM files")}
+    added = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for p in sorted(uploads_dir.iterdir()):
+            file_id = p.name.split(".")[0]
+            if not p.is_file() or p.name.startswith(".") or p.suffix.lower() not in KINDS or file_id in known:
+                continue
+            known.add(file_id)
+            st = p.stat()
+            stage_path = vectors_dir / f"{file_id}.stage.txt"
+            stage = stage_path.read_text(encoding="utf8").strip() if stage_path.exists() else None
+            pages, chunks = _pages(vectors_dir / f"{file_id}_chunks.json")
+            kind, ext = _kind(p.name)
+            conn.execute(
+                "INSERT INTO files (file_id, name, kind, ext, size_bytes, pages, chunks, stage, label, title, uploaded_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_id, p.name, kind, ext, st.st_size, pages, chunks, stage,
+                 (labels.get(file_id) or {}).get("label"), None, st.st_mtime, st.st_mtime),
+            )
+            added += 1
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return added
+
+
+def initialized() -> bool:
+    return _conn().execute("PRAGMA user_version").fetchone()[0] >= 1
+
+
+def mark_initialized() -> None:
+    _conn().execute("PRAGMA user_version=1")
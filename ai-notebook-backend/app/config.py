@@ -28,6 +28,16 @@ class Settings:
 
         # Vector store directory
         self.VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "vector_store")
+        # SQLite file catalog behind /files, /uploads-list and GET /file/{id}
+        self.CATALOG_DB = os.getenv("CATALOG_DB", "catalog.sqlite3")
+        # Internal nginx location that serves uploads/ (e.g. "/_uploads/"): /uploads
+        # responses then carry X-Accel-Redirect and nginx sends the bytes (sendfile)
+        self.UPLOADS_ACCEL_REDIRECT = os.getenv("UPLOADS_ACCEL_REDIRECT", "")
+        # Compress responses of at least this many bytes (-1 disables): brotli when
+        # installed and accepted, else gzip. Levels favour speed for dynamic JSON.
+        self.COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+        self.COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "5"))
+        self.COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
 
     # Risk guardrails (allow much larger PDFs by default)
         self.MAX_PDF_MB = int(os.getenv("MAX_PDF_MB", "100"))
@@ -39,19 +49,165 @@ class Settings:
         allowed = os.getenv("CHAT_MODELS_ALLOWED", "gpt-4o-mini,gpt-4o,gpt-4.1-mini,gpt-4.1")
         self.CHAT_MODELS_ALLOWED = [m.strip() for m in allowed.split(",") if m.strip()]
 
-    # OCR settings (for scanned/image PDFs)
-    # OCR always enabled by default, high DPI for better accuracy
-    ocr_en = os.getenv("OCR_ENABLED", "1").strip().lower()
-    self.OCR_ENABLED = True
-    self.OCR_DPI = int(os.getenv("OCR_DPI", "300"))  # higher DPI for better OCR
-    self.OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
-    # Additional custom tesseract CLI flags; leave blank for defaults
-    self.OCR_TESSERACT_CONFIG = os.getenv("OCR_TESSERACT_CONFIG", "--psm 3") or None
-
-    # --- Future: Add more cool features here ---
-    # self.ENABLE_IMAGE_QA = True
-    # self.ENABLE_TABLE_EXTRACTION = True
-    # self.ENABLE_AUDIO_TRANSCRIPTION = True
+        # OCR settings (for scanned/image PDFs)
+        # OCR always enabled by default, high DPI for better accuracy
+        ocr_en = os.getenv("OCR_ENABLED", "1").strip().lower()
+        self.OCR_ENABLED = True
+        self.OCR_DPI = int(os.getenv("OCR_DPI", "300"))  # higher DPI for better OCR
+        self.OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+        # Additional custom tesseract CLI flags; leave blank for defaults
+        self.OCR_TESSERACT_CONFIG = os.getenv("OCR_TESSERACT_CONFIG", "--psm 3") or None
+        # Per-page DPI: OCR_DPI is the ceiling; pages are rendered lower when their
+        # scanned images are lower resolution or their glyphs are large (aiming at
+        # OCR_GLYPH_PX pixels per em), but not below OCR_MIN_DPI, and never above
+        # OCR_MAX_MEGAPIXELS per page
+        self.OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "150"))
+        self.OCR_GLYPH_PX = float(os.getenv("OCR_GLYPH_PX", "32"))
+        self.OCR_MAX_MEGAPIXELS = float(os.getenv("OCR_MAX_MEGAPIXELS", "12"))
+        # Pages whose thumbnail has at most this fraction of dark pixels are blank
+        self.OCR_BLANK_INK = float(os.getenv("OCR_BLANK_INK", "0.002"))
+        # Images on pages that do have text (slide screenshots): OCR those covering at
+        # least OCR_REGION_MIN_AREA of the page, on OCR_THREADS threads per process,
+        # dropping text below OCR_REGION_MIN_CONF mean confidence (tesserocr only)
+        reg = os.getenv("OCR_REGIONS", "1").strip().lower()
+        self.OCR_REGIONS = reg in {"1", "true", "yes", "on"}
+        self.OCR_REGION_MIN_AREA = float(os.getenv("OCR_REGION_MIN_AREA", "0.04"))
+        self.OCR_REGION_MIN_CONF = int(os.getenv("OCR_REGION_MIN_CONF", "40"))
+        self.OCR_THREADS = int(os.getenv("OCR_THREADS", "4"))
+        # OCR text cache keyed by page content; set empty to disable
+        self.OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", str(Path(self.VECTOR_STORE_DIR) / "ocr_cache"))
+
+        # Table extraction during PDF ingest (tables are indexed as extra chunks).
+        # Extractor: pymupdf (built in) or camelot; documents with more than
+        # TABLE_PAGES_PER_JOB pages are split over up to TABLE_WORKERS processes
+        tbl = os.getenv("ENABLE_TABLE_EXTRACTION", "0").strip().lower()
+        self.ENABLE_TABLE_EXTRACTION = tbl in {"1", "true", "yes", "on"}
+        self.TABLE_EXTRACTOR = os.getenv("TABLE_EXTRACTOR", "pymupdf").strip().lower()
+        self.TABLE_WORKERS = max(1, int(os.getenv("TABLE_WORKERS", "2")))
+        self.TABLE_PAGES_PER_JOB = int(os.getenv("TABLE_PAGES_PER_JOB", "25"))
+
+        # Audio ingest (/upload_audio, /transcribe-audio). Transcriber: an OpenAI
+        # model name, or local:<faster-whisper size or path> for offline use.
+        # Recordings are split in pauses (below AUDIO_SILENCE_DB dBFS for at least
+        # AUDIO_MIN_SILENCE_MS) into ~AUDIO_SEGMENT_SECONDS pieces, hard-capped at
+        # AUDIO_MAX_SEGMENT_SECONDS, transcribed on AUDIO_TRANSCRIBE_WORKERS threads
+        self.AUDIO_TRANSCRIBER = os.getenv("AUDIO_TRANSCRIBER", "whisper-1")
+        self.MAX_AUDIO_MB = int(os.getenv("MAX_AUDIO_MB", "500"))
+        self.AUDIO_SEGMENT_SECONDS = float(os.getenv("AUDIO_SEGMENT_SECONDS", "60"))
+        self.AUDIO_MAX_SEGMENT_SECONDS = float(os.getenv("AUDIO_MAX_SEGMENT_SECONDS", "120"))
+        self.AUDIO_MIN_SILENCE_MS = int(os.getenv("AUDIO_MIN_SILENCE_MS", "400"))
+        self.AUDIO_SILENCE_DB = float(os.getenv("AUDIO_SILENCE_DB", "-40"))
+        self.AUDIO_TRANSCRIBE_WORKERS = int(os.getenv("AUDIO_TRANSCRIBE_WORKERS", "4"))
+
+        # /ask-image and /multimodal-qa content (reused by content_id): inlined whole
+        # up to CONTENT_INLINE_TOKENS, else indexed and the top CONTENT_TOP_K chunks sent
+        self.CONTENT_INLINE_TOKENS = int(os.getenv("CONTENT_INLINE_TOKENS", "3000"))
+        self.CONTENT_TOP_K = int(os.getenv("CONTENT_TOP_K", "6"))
+        # Content ids kept in the vector store (least recently used removed first; 0 = no cap)
+        self.CONTENT_CACHE_MAX = int(os.getenv("CONTENT_CACHE_MAX", "1000"))
+
+        # Server processes (uvicorn --workers, see Dockerfile). Storage is shared
+        # through file locks; per-process budgets below are divided by this.
+        self.WORKERS = max(1, int(os.getenv("WORKERS", "1")))
+
+        # Upstream (OpenAI) scheduling: bounded concurrency and request/token
+        # budgets per model. Defaults are conservative tier-1 style limits.
+        self.UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "8"))
+        self.UPSTREAM_RPM = int(os.getenv("UPSTREAM_RPM", "500"))
+        self.UPSTREAM_TPM = int(os.getenv("UPSTREAM_TPM", "200000"))
+        # Per-model overrides, comma-separated "model=rpm:tpm". Example: "gpt-4o=500:30000"
+        self.UPSTREAM_MODEL_LIMITS: dict[str, tuple[int, int]] = {}
+        for item in os.getenv("UPSTREAM_MODEL_LIMITS", "").split(","):
+            name, _, limits = item.partition("=")
+            rpm, _, tpm = limits.partition(":")
+            if name.strip() and rpm.strip() and tpm.strip():
+                self.UPSTREAM_MODEL_LIMITS[name.strip()] = (int(rpm), int(tpm))
+        # Retries on 429/5xx/timeouts with jittered exponential backoff (seconds)
+        self.UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "4"))
+        self.UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+        self.UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "20"))
+        # Inputs per embeddings request; large documents are sent in batches
+        self.EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+        # Local embedding backends (EMBEDDING_MODEL="st:<name>" or "onnx:<dir>"):
+        # CPU threads (0 = library default) and max tokens per input
+        self.EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+        self.EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "512"))
+
+        # Index compression: none | fp16 | int8 | pq (applies to newly built indexes)
+        self.VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").strip().lower()
+        # Matryoshka truncation for text-embedding-3-* (0 = keep the full dimension)
+        self.VECTOR_DIM = int(os.getenv("VECTOR_DIM", "0"))
+        self.VECTOR_PQ_M = int(os.getenv("VECTOR_PQ_M", "64"))  # PQ sub-quantizers
+        self.VECTOR_PQ_BITS = int(os.getenv("VECTOR_PQ_BITS", "8"))
+        # Also keep the original vectors ({id}.vecs.npy, memory-mapped) to re-rank a
+        # shortlist of k * VECTOR_RERANK_FACTOR candidates exactly. Costs disk, not RAM.
+        self.VECTOR_RERANK = os.getenv("VECTOR_RERANK", "0").strip().lower() in {"1", "true", "yes", "on"}
+        self.VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+        # Indexes at least this large are memory-mapped instead of copied into
+        # each worker (-1 = never, 0 = always); loaded indexes kept per process
+        self.VECTOR_MMAP_MIN_MB = float(os.getenv("VECTOR_MMAP_MIN_MB", "8"))
+        self.VECTOR_INDEX_CACHE = int(os.getenv("VECTOR_INDEX_CACHE", "64"))
+
+        # URL ingestion: concurrent jobs per process, pooled connections per
+        # host, and request timeout (seconds)
+        self.URL_INGEST_WORKERS = int(os.getenv("URL_INGEST_WORKERS", "4"))
+        self.URL_FETCH_PER_HOST = int(os.getenv("URL_FETCH_PER_HOST", "4"))
+        self.URL_FETCH_TIMEOUT = float(os.getenv("URL_FETCH_TIMEOUT", "20"))
+
+        # Batch ingest (POST /ingest/batch): items per request, and threads that
+        # parse/OCR/fetch items (shared by all batches of a worker process)
+        self.MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "500"))
+        self.BATCH_INGEST_WORKERS = int(os.getenv("BATCH_INGEST_WORKERS", "4"))
+
+        # Ingest progress streams (GET /events): seconds between counter updates
+        # per job, between catalog polls (WORKERS > 1 only) and between keep-alives
+        self.PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "0.25"))
+        self.PROGRESS_POLL_SECONDS = float(os.getenv("PROGRESS_POLL_SECONDS", "1"))
+        self.PROGRESS_HEARTBEAT_SECONDS = float(os.getenv("PROGRESS_HEARTBEAT_SECONDS", "15"))
+
+        # Notebook questions search their sources on a shared pool of this many
+        # threads (1 = one after another); sources still running after
+        # NOTEBOOK_SEARCH_TIMEOUT_MS are left out of the answer
+        self.SEARCH_FANOUT_THREADS = int(os.getenv("SEARCH_FANOUT_THREADS", "8"))
+        self.NOTEBOOK_SEARCH_TIMEOUT_MS = float(os.getenv("NOTEBOOK_SEARCH_TIMEOUT_MS", "2000"))
+
+        # Notebook chat history: follow-ups are rewritten into a standalone search
+        # query (CHAT_CONDENSE_MODEL, "" = CHAT_MODEL) from the last CHAT_HISTORY_TURNS
+        # question/answer pairs, each message cut to CHAT_HISTORY_MESSAGE_TOKENS, and a
+        # rolling summary of older turns of at most CHAT_SUMMARY_TOKENS
+        cond = os.getenv("CHAT_CONDENSE", "1").strip().lower()
+        self.CHAT_CONDENSE = cond in {"1", "true", "yes", "on"}
+        self.CHAT_CONDENSE_MODEL = os.getenv("CHAT_CONDENSE_MODEL", "")
+        self.CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "3"))
+        self.CHAT_HISTORY_MESSAGE_TOKENS = int(os.getenv("CHAT_HISTORY_MESSAGE_TOKENS", "250"))
+        self.CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+
+        # Optional cross-encoder rerank of the retrieved shortlist ("" = off):
+        # "st:<name-or-path>" (sentence-transformers CrossEncoder) or "onnx:<dir>",
+        # e.g. "st:cross-encoder/ms-marco-MiniLM-L-6-v2". RERANK_CANDIDATES are
+        # retrieved cheaply, scored in batches within RERANK_BUDGET_MS, and only
+        # the best few go to the LLM.
+        self.RERANK_MODEL = os.getenv("RERANK_MODEL", "").strip()
+        self.RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+        self.RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+        self.RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+
+        # Startup warm-up of tokenizer/FAISS/PDF/embedding libraries after the
+        # server starts: background | blocking (ready only when loaded) | off
+        self.STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background").strip().lower()
+
+        # Tracing/profiling (off by default). Per request, internal callers can
+        # send "x-trace: 1" / "x-profile: 1" together with the x-internal token.
+        self.TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0").strip().lower() in {"1", "true", "yes", "on"}
+        self.TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+        self.TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+        self.PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").strip().lower() in {"1", "true", "yes", "on"}
+        self.PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "1000"))
+        self.PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+        self.PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+        # --- Future: Add more cool features here ---
+        # self.ENABLE_IMAGE_QA = True
 
 
 settings = Settings()
\ No newline at end of file
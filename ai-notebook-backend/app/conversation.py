@@ -0,0 +1,103 @@
+"""Conversation context for notebook questions.
+
+A follow-up such as "what about the second one?" is rewritten, from the
+recent turns and a rolling summary of older ones, into a standalone query,
+and that query is what gets embedded, searched and reranked.
+
+What history costs per question is bounded however long the chat gets:
+
+- the last CHAT_HISTORY_TURNS question/answer pairs are sent as they are,
+  each message cut to CHAT_HISTORY_MESSAGE_TOKENS;
+- older messages live in ``nb["history_summary"]`` (``text`` of at most
+  CHAT_SUMMARY_TOKENS, covering the first ``upto`` history entries). As turns
+  leave the window they are folded into it by one call that extends the
+  previous summary with just those messages, after the answer is sent
+  (a window at a time, catching up on folds that failed). The summary is
+  never rebuilt from the start of the chat.
+"""
+from .config import settings
+from .upstream import truncate_tokens
+
+CONDENSE_SYSTEM = (
+    "Rewrite the user's latest question as a single standalone search query for the course material, "
+    "resolving pronouns and references (\"it\", \"the second one\", \"that formula\") from the conversation. "
+    "Keep the user's wording and language where possible. If the question is already standalone, return it unchanged. "
+    "Reply with the query only."
+)
+SUMMARY_SYSTEM = (
+    "You maintain a running summary of a study conversation. Extend the existing summary with the new messages: "
+    "keep topics, named items and lists the user may refer back to, and drop pleasantries. "
+    "Reply with the updated summary only, at most about {words} words."
+)
+
+
+def window_size() -> int:
+    return 2 * max(0, settings.CHAT_HISTORY_TURNS)
+
+
+def summary(nb: dict) -> tuple[str, int]:
+    """(summary text, number of history entries it covers)."""
+    s = nb.get("history_summary") or {}
+    return s.get("text") or "", int(s.get("upto") or 0)
+
+
+def _clip(text: str) -> str:
+    return truncate_tokens(str(text or "").strip(), settings.CHAT_HISTORY_MESSAGE_TOKENS, settings.CHAT_MODEL)
+
+
+def transcript(messages: list[dict]) -> str:
+    return "\n".join(f"{'User' if m.get('role') == 'user' else 'Assistant'}: {_clip(m.get('content'))}" for m in messages)
+
+
+def context(nb: dict) -> str:
+    """Summary of older turns plus the recent window, or "" for a new chat."""
+    history = nb.get("chat_history") or []
+    text, _ = summary(nb)
+    recent = history[-window_size():] if window_size() else []
+    parts = []
+    if text:
+        parts.append(f"Summary of the earlier conversation:\n{text}")
+    if recent:
+        parts.append(f"Recent messages:\n{transcript(recent)}")
+    return "\n\n".join(parts)
+
+
+def condense_messages(nb: dict, question: str) -> list[dict] | None:
+    """Prompt turning ``question`` into a standalone query; None when there is no history to resolve against."""
+    conversation = context(nb)
+    if not conversation:
+        return None
+    return [
+        {"role": "system", "content": CONDENSE_SYSTEM},
+        {"role": "user", "content": f"{conversation}\n\nLatest question: {question}\n\nStandalone query:"},
+    ]
+
+
+def pending(nb: dict) -> tuple[list[dict], int, int] | None:
+    """(messages to fold, upto before, upto after) while messages outside the window are unsummarized, else None.
+
+    Folds go from ``upto`` in pieces of at most one window, so a backlog left
+    by failed summary calls is caught up piece by piece and nothing is skipped.
+    Only a chat that predates summaries (no ``history_summary`` at all) starts
+    its summary from the turns just before the window.
+    """
+    history = nb.get("chat_history") or []
+    _, upto = summary(nb)
+    end = len(history) - window_size()
+    if end <= upto:
+        return None
+    piece = max(2, window_size())
+    start = upto if "history_summary" in nb else max(upto, end - piece)
+    stop = min(end, start + piece)
+    return history[start:stop], upto, stop
+
+
+def summary_messages(previous: str, messages: list[dict]) -> list[dict]:
+    words = max(30, int(settings.CHAT_SUMMARY_TOKENS * 0.7))
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM.format(words=words)},
+        {
+            "role": "user",
+            "content": f"Existing summary:\n{previous or '(none yet)'}\n\nNew messages:\n{transcript(messages)}\n\nUpdated summary:",
+        },
+    ]
@@ -1,32 +1,106 @@
 import json
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 NOTES_FILE = Path("notes.json")
 NOTEBOOKS_FILE = Path("notebooks.json")
 FILES_META_FILE = Path("files.json")
+BATCHES_FILE = Path("batches.json")
+URLS_FILE = Path("urls.json")
 
-def load_notes():
-    if not NOTES_FILE.exists():
+def _write_atomic(path: Path, data) -> None:
+    # Readers must never see a half-written file: write aside, then rename over
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf8")
+    os.replace(tmp, path)
+
+@contextmanager
+def locked(path: Path):
+    """Exclusive lock shared by threads and worker processes (sidecar .lock file)."""
+    with open(path.with_name(f".{path.name}.lock"), "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10s; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _load(path: Path) -> dict:
+    if not path.exists():
         return {}
-    return json.loads(NOTES_FILE.read_text(encoding="utf8"))
+    return json.loads(path.read_text(encoding="utf8"))
+
+@contextmanager
+def _transaction(path: Path):
+    # Read-modify-write under the lock; nothing is saved if the body raises
+    with locked(path):
+        data = _load(path)
+        yield data
+        _write_atomic(path, data)
+
+def load_notes():
+    return _load(NOTES_FILE)
 
 def save_notes(notes):
-    NOTES_FILE.write_text(json.dumps(notes, indent=2), encoding="utf8")
+    with locked(NOTES_FILE):
+        _write_atomic(NOTES_FILE, notes)
+
+def notes_tx():
+    return _transaction(NOTES_FILE)
 
 # --- Notebooks storage ---
 def load_notebooks():
-    if not NOTEBOOKS_FILE.exists():
-        return {}
-    return json.loads(NOTEBOOKS_FILE.read_text(encoding="utf8"))
+    return _load(NOTEBOOKS_FILE)
 
 def save_notebooks(data: dict):
-    NOTEBOOKS_FILE.write_text(json.dumps(data, indent=2), encoding="utf8")
+    with locked(NOTEBOOKS_FILE):
+        _write_atomic(NOTEBOOKS_FILE, data)
+
+def notebooks_tx():
+    """``with notebooks_tx() as data:`` mutate ``data``; saved atomically on exit."""
+    return _transaction(NOTEBOOKS_FILE)
 
 # --- Files metadata storage ---
 def load_files_meta() -> dict:
-    if not FILES_META_FILE.exists():
-        return {}
-    return json.loads(FILES_META_FILE.read_text(encoding="utf8"))
+    return _load(FILES_META_FILE)
 
 def save_files_meta(data: dict):
-    FILES_META_FILE.write_text(json.dumps(data, indent=2), encoding="utf8")
\ No newline at end of file
+    with locked(FILES_META_FILE):
+        _write_atomic(FILES_META_FILE, data)
+
+def files_meta_tx():
+    return _transaction(FILES_META_FILE)
+
+# --- Batch ingest jobs ---
+def load_batches() -> dict:
+    return _load(BATCHES_FILE)
+
+def batches_tx():
+    return _transaction(BATCHES_FILE)
+
+# --- Ingested URLs (file id, HTTP validators, content hash) ---
+def load_urls() -> dict:
+    return _load(URLS_FILE)
+
+def urls_tx():
+    return _transaction(URLS_FILE)
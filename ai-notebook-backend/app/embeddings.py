@@ -1,12 +1,163 @@
-from openai import OpenAI
+"""Embedding providers, selected by ``EMBEDDING_MODEL``.
+
+- ``text-embedding-3-small`` (any name without a prefix): OpenAI API.
+- ``st:<name-or-path>`` (alias ``local:``): sentence-transformers on CPU,
+  e.g. ``st:sentence-transformers/all-MiniLM-L6-v2``.
+- ``onnx:<dir>``: an exported (optionally quantized) ONNX encoder in ``<dir>``
+  with ``model.onnx`` or ``model_quantized.onnx`` plus ``tokenizer.json``.
+
+Local backends batch by EMBEDDING_BATCH_SIZE, use EMBEDDING_THREADS CPU threads
+and return L2-normalised vectors (inner product == cosine, like OpenAI's).
+"""
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from . import progress
 from .config import settings
+from .tracing import span
+from .upstream import BACKGROUND, estimate_embedding_tokens, scheduler
+
+
+# The OpenAI SDK is slow to import: resolved on first use (benchmarks swap it)
+OpenAI = None
+
+
+def _openai_cls():
+    global OpenAI
+    if OpenAI is None:
+        from openai import OpenAI as cls
+
+        OpenAI = cls
+    return OpenAI
+
+
+class EmbeddingProvider:
+    """Turns texts into vectors. ``model_id`` is recorded with every index."""
+
+    model_id: str = ""
+
+    def embed(self, texts: list[str], priority: int = BACKGROUND) -> list[list[float]]:
+        raise NotImplementedError
+
+
+class OpenAIEmbeddings(EmbeddingProvider):
+    def __init__(self, model: str) -> None:
+        self.model_id = model
+
+    def embed(self, texts: list[str], priority: int = BACKGROUND) -> list[list[float]]:
+        if not settings.OPENAI_API_KEY:
+            raise RuntimeError("Missing OPENAI_API_KEY. Set it in .env or environment.")
+        # Retries are handled by the upstream scheduler
+        client = _openai_cls()(api_key=settings.OPENAI_API_KEY, max_retries=0)
+        model = self.model_id
+        batch = max(1, settings.EMBEDDING_BATCH_SIZE)
+        out: list[list[float]] = []
+        for i in range(0, len(texts), batch):
+            part = texts[i:i + batch]
+            resp = scheduler.run(
+                model,
+                lambda: client.embeddings.create(model=model, input=part),
+                tokens=estimate_embedding_tokens(part, model),
+                priority=priority,
+                usage=lambda r: getattr(getattr(r, "usage", None), "total_tokens", None),
+            )
+            out.extend(d.embedding for d in resp.data)
+            progress.advance(chunks_embedded=len(part))
+        return out
+
+
+class SentenceTransformerEmbeddings(EmbeddingProvider):
+    def __init__(self, model_id: str, name: str) -> None:
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except Exception as e:
+            raise RuntimeError(f"EMBEDDING_MODEL={model_id} needs sentence-transformers installed: {e}")
+        if settings.EMBEDDING_THREADS > 0:
+            torch.set_num_threads(settings.EMBEDDING_THREADS)
+        self.model_id = model_id
+        self._model = SentenceTransformer(name, device="cpu")
+        self._lock = threading.Lock()  # one batch at a time; intra-op threads do the parallel work
+
+    def embed(self, texts: list[str], priority: int = BACKGROUND) -> list[list[float]]:
+        with self._lock:
+            vecs = self._model.encode(
+                texts,
+                batch_size=max(1, settings.EMBEDDING_BATCH_SIZE),
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        progress.advance(chunks_embedded=len(texts))
+        return vecs.tolist()
+
+
+class OnnxEmbeddings(EmbeddingProvider):
+    def __init__(self, model_id: str, model_dir: str) -> None:
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except Exception as e:
+            raise RuntimeError(f"EMBEDDING_MODEL={model_id} needs onnxruntime and tokenizers installed: {e}")
+        d = Path(model_dir)
+        onnx_path = next((p for p in (d / "model_quantized.onnx", d / "model.onnx") if p.exists()), None)
+        if onnx_path is None:
+            raise RuntimeError(f"No model.onnx or model_quantized.onnx in {d}")
+        opts = ort.SessionOptions()
+        if settings.EMBEDDING_THREADS > 0:
+            opts.intra_op_num_threads = settings.EMBEDDING_THREADS
+        self.model_id = model_id
+        self._session = ort.InferenceSession(str(onnx_path), opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = Tokenizer.from_file(str(d / "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=settings.EMBEDDING_MAX_LENGTH)
+        self._tokenizer.enable_padding()
+
+    def embed(self, texts: list[str], priority: int = BACKGROUND) -> list[list[float]]:
+        import numpy as np
+
+        out: list[list[float]] = []
+        batch = max(1, settings.EMBEDDING_BATCH_SIZE)
+        for i in range(0, len(texts), batch):
+            enc = self._tokenizer.encode_batch(texts[i:i + batch])
+            ids = np.array([e.ids for e in enc], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in enc], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self._inputs:
+                feeds["token_type_ids"] = np.zeros_like(ids)
+            hidden = self._session.run(None, feeds)[0]  # (batch, seq, dim)
+            # Mean pooling over real tokens, then L2 normalise
+            m = mask[..., None].astype(np.float32)
+            pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.extend(pooled.astype(np.float32).tolist())
+            progress.advance(chunks_embedded=len(enc))
+        return out
+
+
+@lru_cache(maxsize=4)
+def _provider(model: str) -> EmbeddingProvider:
+    prefix, sep, rest = model.partition(":")
+    if sep and prefix in {"st", "local"}:
+        return SentenceTransformerEmbeddings(model, rest)
+    if sep and prefix == "onnx":
+        return OnnxEmbeddings(model, rest)
+    return OpenAIEmbeddings(model)
+
+
+def warm_up() -> None:
+    """Import the SDK / load the local model before the first request."""
+    provider = get_provider()
+    if isinstance(provider, OpenAIEmbeddings):
+        _openai_cls()
+
+
+def get_provider() -> EmbeddingProvider:
+    return _provider(settings.EMBEDDING_MODEL)
+
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
-    if not settings.OPENAI_API_KEY:
-        raise RuntimeError("Missing OPENAI_API_KEY. Set it in .env or environment.")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    resp = client.embeddings.create(
-        model=settings.EMBEDDING_MODEL,
-        input=texts,
-    )
-    return [d.embedding for d in resp.data]
+def embed_texts(texts: list[str], priority: int = BACKGROUND) -> list[list[float]]:
+    provider = get_provider()
+    with span("embeddings.embed_texts", model=provider.model_id, count=len(texts)):
+        return provider.embed(texts, priority=priority)
@@ -0,0 +1,209 @@
+"""Minimal in-process Prometheus metrics (text exposition format 0.0.4).
+
+Counters, gauges and histograms with labels, plus callback gauges that are
+evaluated at scrape time. Values are per process; with several workers each
+one reports its own series.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+_LOCK = threading.Lock()
+_REGISTRY: list["_Metric"] = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values: dict[tuple, float] = {}
+        with _LOCK:
+            _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        with _LOCK:
+            items = list(self._values.items())
+        return [(self.name, _fmt_labels(self.labelnames, k), v) for k, v in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        k = self._key(labels)
+        with _LOCK:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Settable gauge, or a callback gauge when ``fn`` is given.
+
+    ``fn`` returns either a number or a mapping of label-value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), fn: Callable | None = None) -> None:
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value: float, **labels) -> None:
+        with _LOCK:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        k = self._key(labels)
+        with _LOCK:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        if self.fn is None:
+            return super().samples()
+        try:
+            got = self.fn()
+        except Exception:
+            return []
+        if isinstance(got, dict):
+            return [
+                (self.name, _fmt_labels(self.labelnames, k if isinstance(k, tuple) else (k,)), float(v))
+                for k, v in got.items()
+            ]
+        return [(self.name, "", float(got))]
+
+
+def cached(fn: Callable, seconds: float) -> Callable:
+    """``fn`` for a callback gauge, evaluated at most once per ``seconds`` (for directory scans and the like)."""
+    lock = threading.Lock()
+    last = [0.0, None]
+
+    def wrapper():
+        with lock:
+            if last[1] is None or time.monotonic() - last[0] >= seconds:
+                last[:] = [time.monotonic(), fn()]
+            return last[1]
+
+    return wrapper
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        k = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with _LOCK:
+            s = self._series.get(k)
+            if s is None:
+                s = self._series[k] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        with _LOCK:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        out = []
+        for k, s in items:
+            acc = 0
+            for b, c in zip(self.buckets, s):
+                acc += c
+                out.append((f"{self.name}_bucket", _fmt_labels(self.labelnames, k, f'le="{_fmt_value(b)}"'), acc))
+            out.append((f"{self.name}_bucket", _fmt_labels(self.labelnames, k, 'le="+Inf"'), s[-1]))
+            out.append((f"{self.name}_sum", _fmt_labels(self.labelnames, k), s[-2]))
+            out.append((f"{self.name}_count", _fmt_labels(self.labelnames, k), s[-1]))
+        return out
+
+
+def render() -> str:
+    with _LOCK:
+        metrics = list(_REGISTRY)
+    lines = []
+    for m in metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        for name, labels, value in m.samples():
+            lines.append(f"{name}{labels} {_fmt_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics shared across the app ---
+HTTP_LATENCY = Histogram(
+    "studylm_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+INGEST_STAGE = Histogram(
+    "studylm_ingest_stage_duration_seconds",
+    "Ingest stage duration (parse, ocr_page, ocr_region, tables, chunk, embed, index_write)",
+    ("stage",),
+)
+OCR_PAGES = Counter(
+    "studylm_ocr_pages_total", "Pages sent to OCR (source: tesseract | cache | blank | error | regions)", ("source",)
+)
+SEARCH_LATENCY = Histogram(
+    "studylm_vector_search_duration_seconds",
+    "FAISS search time per index",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+SOURCES_SKIPPED = Counter(
+    "studylm_notebook_sources_skipped_total", "Notebook sources left out of a search (timeout | error | busy)", ("reason",)
+)
+RERANK_LATENCY = Histogram(
+    "studylm_rerank_duration_seconds",
+    "Cross-encoder rerank time per query (outcome: complete | budget)",
+    ("outcome",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+UPSTREAM_LATENCY = Histogram(
+    "studylm_upstream_request_duration_seconds", "Upstream (OpenAI) call latency", ("model",)
+)
+UPSTREAM_WAIT = Histogram(
+    "studylm_upstream_queue_wait_seconds", "Time spent waiting for an upstream slot/budget", ("model",)
+)
+UPSTREAM_TOKENS = Counter("studylm_upstream_tokens_total", "Tokens reported by upstream usage", ("model",))
+UPSTREAM_ERRORS = Counter("studylm_upstream_errors_total", "Failed upstream attempts", ("model", "retried"))
@@ -0,0 +1,361 @@
+"""OCR for scanned PDF pages and uploaded images.
+
+Image-only pages (``page_text``):
+- Skip blank pages cheaply: no content at all, or a near-white thumbnail.
+- Look up the OCR cache, keyed by a hash of the page content (content stream
+  plus raw image streams) and the OCR settings.
+- Render in grayscale at a DPI picked for the page (see ``choose_dpi``).
+- Hand the raw samples to Tesseract: through tesserocr's C API when it is
+  installed, else through pytesseract with an uncompressed PGM file (no PNG
+  encode/decode round trip).
+
+Pages that have a text layer can still carry text in pictures (slides with a
+screenshot). ``region_texts`` OCRs just those embedded images: regions above
+OCR_REGION_MIN_AREA are rendered one by one and recognised in parallel on
+OCR_THREADS threads, cached the same way. Images the text layer already
+covers are left out: searchable scans (a page image under invisible OCR
+text) and pictures overlaid with native text.
+"""
+import hashlib
+import os
+import shlex
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from .config import settings
+from .metrics import INGEST_STAGE, OCR_PAGES
+from .tracing import span
+
+_local = threading.local()  # one tesserocr API per thread
+
+
+def _lang() -> str:
+    return settings.OCR_LANGUAGE or "eng"
+
+
+def _tesserocr_api():
+    api = getattr(_local, "api", None)
+    if api is None:
+        import tesserocr
+
+        args = shlex.split(settings.OCR_TESSERACT_CONFIG or "")
+        variables = {}
+        psm = None
+        for i, a in enumerate(args[:-1]):
+            if a == "--psm":
+                psm = int(args[i + 1])
+            elif a == "-c" and "=" in args[i + 1]:
+                k, _, v = args[i + 1].partition("=")
+                variables[k] = v
+        api = tesserocr.PyTessBaseAPI(lang=_lang(), variables=variables)
+        if psm is not None:
+            api.SetPageSegMode(psm)
+        _local.api = api
+    return api
+
+
+def preload() -> None:
+    """Import tesserocr now, from the main thread.
+
+    Its import installs signal handlers (cysignals), which raises on any other
+    thread, so a first import from the warm-up thread or a request worker would
+    leave OCR unavailable.
+    """
+    try:
+        import tesserocr  # noqa: F401
+    except Exception:
+        pass
+
+
+@lru_cache(maxsize=1)
+def engine() -> str | None:
+    """"tesserocr", "tesseract" (pytesseract + CLI) or None when OCR is unavailable."""
+    try:
+        _tesserocr_api()
+        return "tesserocr"
+    except Exception:
+        pass
+    try:
+        import pytesseract
+
+        if shutil.which(pytesseract.pytesseract.tesseract_cmd):
+            return "tesseract"
+    except Exception:
+        pass
+    return None
+
+
+def available() -> bool:
+    return engine() is not None
+
+
+def _tesseract_raw(samples: bytes, width: int, height: int, stride: int, min_conf: int = 0) -> str:
+    """OCR an 8-bit grayscale image given as raw samples.
+
+    With tesserocr, text whose mean word confidence is below ``min_conf`` is
+    dropped (photos and diagrams otherwise turn into noise).
+    """
+    if engine() == "tesserocr":
+        api = _tesserocr_api()
+        api.SetImageBytes(samples, width, height, 1, stride)
+        text = api.GetUTF8Text()
+        return text if api.MeanTextConf() >= min_conf else ""
+    import pytesseract
+
+    # Binary PGM: a short header plus the samples, nothing to compress/decompress
+    with tempfile.NamedTemporaryFile(suffix=".pgm", delete=False) as f:
+        f.write(f"P5\n{width} {height}\n255\n".encode("ascii"))
+        if stride == width:
+            f.write(samples)
+        else:
+            for y in range(height):
+                f.write(samples[y * stride:y * stride + width])
+    try:
+        return pytesseract.image_to_string(f.name, lang=_lang(), config=settings.OCR_TESSERACT_CONFIG or "")
+    finally:
+        os.unlink(f.name)
+
+
+def image_text(path: Path) -> str:
+    """OCR an image file (PNG/JPEG)."""
+    with INGEST_STAGE.time(stage="ocr_page"):
+        if engine() == "tesserocr":
+            api = _tesserocr_api()
+            api.SetImageFile(str(path))
+            return api.GetUTF8Text().strip()
+        import pytesseract
+
+        return pytesseract.image_to_string(str(path), lang=_lang(), config=settings.OCR_TESSERACT_CONFIG or "").strip()
+
+
+def choose_dpi(page) -> int:
+    """Render resolution for OCR of one page.
+
+    Starts at OCR_DPI and lowers it when more pixels cannot help: never above
+    the native resolution of the page's scanned images, lower for large glyphs
+    (aiming at OCR_GLYPH_PX pixels per em), and within OCR_MAX_MEGAPIXELS for
+    oversized pages. Never below OCR_MIN_DPI unless the pixel cap requires it.
+    """
+    dpi = float(max(72, settings.OCR_DPI))
+    native = []
+    for info in page.get_image_info():
+        bbox = info["bbox"]
+        w_in, h_in = (bbox[2] - bbox[0]) / 72.0, (bbox[3] - bbox[1]) / 72.0
+        if w_in > 0.5 and h_in > 0.5:
+            native.append(min(info["width"] / w_in, info["height"] / h_in))
+    if native:
+        dpi = min(dpi, max(native))
+    sizes = [
+        s["size"]
+        for b in page.get_text("dict").get("blocks", [])
+        for line in b.get("lines", [])
+        for s in line.get("spans", [])
+        if s.get("text", "").strip() and s.get("size")
+    ]
+    if sizes:
+        dpi = min(dpi, 72.0 * settings.OCR_GLYPH_PX / statistics.median(sizes))
+    return _clamp_dpi(dpi, page.rect)
+
+
+def _clamp_dpi(dpi: float, rect) -> int:
+    dpi = max(min(dpi, float(settings.OCR_DPI)), float(min(settings.OCR_MIN_DPI, settings.OCR_DPI)))
+    area_in = (rect.width / 72.0) * (rect.height / 72.0)
+    if area_in > 0:
+        dpi = min(dpi, (settings.OCR_MAX_MEGAPIXELS * 1e6 / area_in) ** 0.5)
+    return max(36, int(dpi))
+
+
+def is_blank(page) -> bool:
+    """True for pages without ink: no content at all, or a near-white thumbnail."""
+    import fitz
+
+    if not page.get_images() and not page.get_drawings() and not page.get_text().strip():
+        return True
+    thumb = page.get_pixmap(dpi=24, colorspace=fitz.csGRAY, alpha=False)
+    dark = sum(1 for b in thumb.samples if b < 160)
+    return dark <= settings.OCR_BLANK_INK * thumb.width * thumb.height
+
+
+def _content_key(page, dpi: int) -> str:
+    h = hashlib.sha1()
+    h.update(f"{_lang()}|{settings.OCR_TESSERACT_CONFIG}|{dpi}|{tuple(page.rect)}|{page.rotation}".encode("utf8"))
+    h.update(page.read_contents())
+    for img in page.get_images(full=True):
+        h.update(page.parent.xref_stream_raw(img[0]) or b"")
+    return h.hexdigest()
+
+
+def _cache_path(key: str) -> Path | None:
+    if not settings.OCR_CACHE_DIR:
+        return None
+    return Path(settings.OCR_CACHE_DIR) / key[:2] / f"{key}.txt"
+
+
+def _cache_put(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(text, encoding="utf8")
+    os.replace(tmp, path)
+
+
+def page_text(page) -> tuple[str | None, dict]:
+    """OCR one PDF page: (text, or None on failure; stats for the status endpoint)."""
+    start = time.perf_counter()
+    stats = {"page": page.number + 1}
+    with span("ocr.page", page=page.number + 1) as sp:
+        try:
+            text = _page_text(page, stats)
+        except Exception:
+            text, stats["source"] = None, "error"
+        stats["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if sp is not None:
+            sp.set(**stats)
+    OCR_PAGES.inc(source=stats["source"])
+    return text, stats
+
+
+def _page_text(page, stats: dict) -> str:
+    import fitz
+
+    if is_blank(page):
+        stats["source"] = "blank"
+        return ""
+    dpi = choose_dpi(page)
+    stats["dpi"] = dpi
+    cache = _cache_path(_content_key(page, dpi))
+    if cache is not None and cache.exists():
+        stats["source"] = "cache"
+        return cache.read_text(encoding="utf8")
+    with INGEST_STAGE.time(stage="ocr_page"):
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72.0, dpi / 72.0), colorspace=fitz.csGRAY, alpha=False)
+        text = (_tesseract_raw(pix.samples, pix.width, pix.height, pix.stride) or "").strip()
+    stats["source"] = "tesseract"
+    if cache is not None:
+        _cache_put(cache, text)
+    return text
+
+
+# An image counts as already transcribed when native text blocks cover this
+# share of it, or when it fills most of a page with substantial native text
+_TEXT_COVERED = 0.25
+_FULL_PAGE = 0.9
+_SUBSTANTIAL_TEXT = 200  # characters
+
+
+def _covered(rect, invisible: list, blocks: list, page_chars: int, page_area: float) -> bool:
+    # Invisible (render mode 3) text over an image is an earlier OCR pass
+    if any(rect.contains(r.tl + (r.br - r.tl) * 0.5) for r in invisible):
+        return True
+    if abs(rect) >= _FULL_PAGE * page_area and page_chars >= _SUBSTANTIAL_TEXT:
+        return True
+    return sum(abs(rect & b) for b in blocks) >= _TEXT_COVERED * abs(rect)
+
+
+def image_regions(page) -> list[tuple]:
+    """(clip rect, image info) of embedded images to OCR, top to bottom.
+
+    Only images of at least OCR_REGION_MIN_AREA that the page's text layer
+    does not already cover.
+    """
+    import fitz
+
+    min_area = settings.OCR_REGION_MIN_AREA * abs(page.rect)
+    seen, out = set(), []
+    for info in page.get_image_info(xrefs=True):
+        rect = fitz.Rect(info["bbox"]) & page.rect
+        if rect.is_empty or abs(rect) < min_area or tuple(rect) in seen:
+            continue
+        seen.add(tuple(rect))
+        out.append((rect, info))
+    if out:
+        blocks = [b for b in page.get_text("blocks") if b[6] == 0 and b[4].strip()]
+        invisible = [fitz.Rect(s["bbox"]) for s in page.get_texttrace() if s.get("type") == 3 and s.get("chars")]
+        page_chars = sum(len(b[4].strip()) for b in blocks)
+        rects = [fitz.Rect(b[:4]) for b in blocks]
+        out = [r for r in out if not _covered(r[0], invisible, rects, page_chars, abs(page.rect))]
+    out.sort(key=lambda r: (r[0].y0, r[0].x0))
+    return out
+
+
+@lru_cache(maxsize=1)
+def _executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max(1, settings.OCR_THREADS), thread_name_prefix="ocr")
+
+
+def _region_key(page, rect, info: dict, dpi: int, samples: bytes | None) -> str:
+    h = hashlib.sha1()
+    h.update(f"region|{_lang()}|{settings.OCR_TESSERACT_CONFIG}|{settings.OCR_REGION_MIN_CONF}|{dpi}".encode("utf8"))
+    h.update(f"{rect.width:.1f}x{rect.height:.1f}|{info.get('transform')}".encode("utf8"))
+    if samples is None:
+        h.update(page.parent.xref_stream_raw(info["xref"]) or b"")
+    else:  # inline image: no stream of its own, hash the pixels
+        h.update(samples)
+    return h.hexdigest()
+
+
+def _ocr_region(samples: bytes, width: int, height: int, stride: int) -> str:
+    with INGEST_STAGE.time(stage="ocr_region"):
+        return (_tesseract_raw(samples, width, height, stride, settings.OCR_REGION_MIN_CONF) or "").strip()
+
+
+def region_texts(page) -> tuple[list[tuple], dict | None]:
+    """OCR the large images of a page that has a text layer.
+
+    Returns ([(clip rect, text), ...], stats) with empty-text regions left
+    out; stats is None when the page has no such images. Rendering happens
+    on the calling thread (a PyMuPDF document is not thread-safe), Tesseract
+    runs on the OCR pool.
+    """
+    import fitz
+
+    regions = image_regions(page)
+    if not regions:
+        return [], None
+    start = time.perf_counter()
+    stats = {"page": page.number + 1, "source": "regions", "regions": len(regions), "cached": 0, "errors": 0}
+    jobs = []
+    with span("ocr.regions", page=page.number + 1, regions=len(regions)) as sp:
+        for rect, info in regions:
+            w_in = rect.width / 72.0
+            dpi = _clamp_dpi(info["width"] / w_in if w_in > 0 else settings.OCR_DPI, rect)
+            pix = None
+            if not info.get("xref"):
+                pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72.0, dpi / 72.0), clip=rect, colorspace=fitz.csGRAY, alpha=False)
+            cache = _cache_path(_region_key(page, rect, info, dpi, pix.samples if pix else None))
+            if cache is not None and cache.exists():
+                stats["cached"] += 1
+                jobs.append((rect, cache, cache.read_text(encoding="utf8")))
+                continue
+            if pix is None:
+                pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72.0, dpi / 72.0), clip=rect, colorspace=fitz.csGRAY, alpha=False)
+            job = _executor().submit(_ocr_region, pix.samples, pix.width, pix.height, pix.stride)
+            jobs.append((rect, cache, job))
+        out = []
+        for rect, cache, job in jobs:
+            if isinstance(job, str):
+                text = job
+            else:
+                try:
+                    text = job.result()
+                except Exception:
+                    stats["errors"] += 1
+                    continue
+                if cache is not None:
+                    _cache_put(cache, text)
+            if text:
+                out.append((rect, text))
+        stats["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if sp is not None:
+            sp.set(**stats)
+    OCR_PAGES.inc(source="regions")
+    return out, stats
+
+
+def warm_up() -> None:
+    engine()
@@ -1,17 +1,30 @@
-import fitz
-import tiktoken
+from functools import lru_cache
+from . import ocr, progress
 from .config import settings
-from typing import Optional
+from .tracing import span
 
-# Optional OCR deps (available when Tesseract is installed)
-try:
-    import pytesseract  # type: ignore
-    from PIL import Image  # type: ignore
-    _OCR_AVAILABLE = True
-except Exception:
-    _OCR_AVAILABLE = False
+# fitz, tiktoken and the OCR libraries are imported on first use (or by
+# warm_up() at startup) so importing the app stays fast
+
+
+@lru_cache(maxsize=1)
+def get_encoder():
+    import tiktoken
+
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def ocr_available() -> bool:
+    """True when an OCR engine (tesserocr, or pytesseract + tesseract) is installed."""
+    return ocr.available()
+
+
+def warm_up() -> None:
+    import fitz  # noqa: F401
+
+    get_encoder()
+    ocr.warm_up()
 
-encoder = tiktoken.get_encoding("cl100k_base")
 
 def extract_text(pdf_path: str) -> list[dict]:
     """Return a list of pages with their text; enforces size/page limits.
@@ -27,23 +40,46 @@ def extract_text(pdf_path: str) -> list[dict]:
     except OSError:
         pass
 
+    import fitz
+
     doc = fitz.open(pdf_path)
     if doc.page_count > settings.MAX_PDF_PAGES:
         raise ValueError(
             f"PDF has {doc.page_count} pages; limit is {settings.MAX_PDF_PAGES}."
         )
     pages = []
-    for i, page in enumerate(doc, start=1):
-        txt = page.get_text() or ""
-        # If page seems to contain no text and OCR is enabled/available, try OCR as fallback
-        if settings.OCR_ENABLED and _looks_like_no_text(txt):
-            ocr_txt = _ocr_page_text(page)
-            if ocr_txt:
-                txt = ocr_txt
-        pages.append({"page": i, "text": txt})
+    progress.expect(pages_total=doc.page_count)
+    with span("pdf_parser.extract_text", pages=doc.page_count):
+        for i, page in enumerate(doc, start=1):
+            txt = page.get_text() or ""
+            # If page seems to contain no text and OCR is enabled/available, try OCR as fallback
+            entry = {"page": i}
+            if settings.OCR_ENABLED and _looks_like_no_text(txt) and ocr_available():
+                ocr_txt, entry["ocr"] = ocr.page_text(page)
+                if ocr_txt:
+                    txt = ocr_txt
+            elif settings.OCR_ENABLED and settings.OCR_REGIONS and ocr_available():
+                regions, stats = ocr.region_texts(page)
+                if stats is not None:
+                    entry["ocr"] = stats
+                if regions:
+                    txt = _merge_regions(page, regions)
+            entry["text"] = txt
+            pages.append(entry)
+            progress.advance(pages_done=1, ocr_pages=int(entry.get("ocr", {}).get("source") in ("tesseract", "cache", "regions")))
     return pages
 
 
+def _merge_regions(page, regions: list[tuple]) -> str:
+    """Native text blocks and OCR'd image regions in reading order (top to bottom, then left to right)."""
+    import fitz
+
+    items = [(fitz.Rect(b[:4]), b[4]) for b in page.get_text("blocks") if b[6] == 0]
+    items += regions
+    items.sort(key=lambda it: (round(it[0].y0), it[0].x0))
+    return "\n".join(t.strip() for _, t in items if t.strip())
+
+
 def _looks_like_no_text(text: str) -> bool:
     """Heuristic: decide when to attempt OCR fallback.
     Consider 'no text' if stripped length is very small or whitespace-heavy.
@@ -55,28 +91,8 @@ def _looks_like_no_text(text: str) -> bool:
     return len(s) < 30
 
 
-def _ocr_page_text(page: "fitz.Page") -> Optional[str]:
-    if not _OCR_AVAILABLE:
-        return None
-    try:
-        # Render to image at configured DPI
-        dpi = max(72, int(getattr(settings, "OCR_DPI", 200)))
-        scale = dpi / 72.0
-        mat = fitz.Matrix(scale, scale)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        import io
-
-        png_bytes = pix.tobytes("png")
-        img = Image.open(io.BytesIO(png_bytes))
-        # Allow custom Tesseract lang via settings
-        lang = getattr(settings, "OCR_LANGUAGE", "eng") or "eng"
-        cfg = getattr(settings, "OCR_TESSERACT_CONFIG", None)
-        text = pytesseract.image_to_string(img, lang=lang, config=cfg)
-        return (text or "").strip()
-    except Exception:
-        return None
-
 def _split_by_tokens(text: str, max_tokens: int) -> list[str]:
+    encoder = get_encoder()
     toks = encoder.encode(text)
     out = []
     for i in range(0, len(toks), max_tokens):
@@ -89,6 +105,15 @@ def chunk_text(pages: list[dict]) -> list[dict]:
     Input: list of {page:int, text:str}
     Output: list of {text:str, page_start:int, page_end:int}
     """
+    with span("pdf_parser.chunk_text", pages=len(pages)) as sp:
+        chunks = _chunk_pages(pages)
+        if sp is not None:
+            sp.set(chunks=len(chunks))
+    return chunks
+
+
+def _chunk_pages(pages: list[dict]) -> list[dict]:
+    encoder = get_encoder()
     chunks: list[dict] = []
     current = ""
     page_start = None
@@ -0,0 +1,202 @@
+"""Ingest progress events behind ``GET /events``.
+
+Every ingest job reports its stage (through ``_write_stage``) and counters:
+pages parsed and OCR'd, audio segments transcribed, chunks embedded. Code
+deep in the pipeline (the PDF parser, embedding providers) calls
+``advance()``, which counts for the job bound to the current context with
+``bound(file_id)``, the same way tracing spans find their trace. Each update
+is pushed to the asyncio queues of the open event streams; counter updates
+are throttled to one per PROGRESS_INTERVAL per job, stage changes are sent
+at once.
+
+Each stream's queue holds at most the latest pending event per job (events
+are full snapshots), so a slow or stalled client cannot make it grow.
+
+With several workers a stream only hears its own process directly, so the
+state is also written to the file catalog and streams poll that.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .config import settings
+
+FINAL = ("done", "error")
+# stage -> (done counter, total counter) used for its ETA
+_RATES = {
+    "parsing": ("pages_done", "pages_total"),
+    "transcribing": ("segments_done", "segments_total"),
+    "embedding": ("chunks_embedded", "chunks_total"),
+}
+
+_lock = threading.Lock()
+_jobs: dict[str, dict] = {}
+_subscribers: list[tuple] = []  # (loop, queue, file_ids or None for all)
+_seq = 0
+_bound: ContextVar[str | None] = ContextVar("studylm_progress_job", default=None)
+
+
+def _eta(job: dict, now: float) -> float | None:
+    counters = _RATES.get(job["stage"])
+    if not counters:
+        return None
+    done, total = job.get(counters[0], 0), job.get(counters[1])
+    if not done or not total or done >= total:
+        return None
+    return round((now - job["_stage_at"]) * (total - done) / done, 1)
+
+
+def _event(job: dict, now: float) -> dict:
+    ev = {k: v for k, v in job.items() if not k.startswith("_")}
+    ev["elapsed_s"] = round(now - job["_started_at"], 1)
+    ev["eta_s"] = _eta(job, now)
+    ev["ready"] = job["stage"] == "done"
+    return ev
+
+
+def _publish(job: dict, now: float) -> tuple[dict, list]:
+    # called under _lock; _send() the result after releasing it
+    global _seq
+    _seq += 1
+    job["_published_at"] = now
+    ev = dict(_event(job, now), seq=_seq)
+    return ev, [(loop, queue) for loop, queue, ids in _subscribers if ids is None or ev["file_id"] in ids]
+
+
+def _send(ev: dict, targets: list) -> None:
+    for loop, queue in targets:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, ev)
+        except RuntimeError:
+            pass  # the stream's event loop is gone
+    if settings.WORKERS > 1:
+        from . import catalog
+
+        try:
+            catalog.update(ev["file_id"], progress=json.dumps(ev))
+        except Exception:
+            pass  # progress is best effort; the stage is in the catalog already
+
+
+def _job(file_id: str, now: float) -> dict:
+    job = _jobs.get(file_id)
+    if job is None:
+        job = _jobs[file_id] = {"file_id": file_id, "stage": None, "_started_at": now, "_stage_at": now, "_published_at": 0.0}
+    return job
+
+
+def report(file_id: str, stage: str | None = None, **fields) -> None:
+    """Set the stage and/or counters of ``file_id``; stage changes are published immediately."""
+    now = time.time()
+    out = None
+    with _lock:
+        job = _job(file_id, now)
+        job.update(fields)
+        changed = stage is not None and stage != job["stage"]
+        if changed:
+            job["stage"], job["_stage_at"] = stage, now
+        if changed or now - job["_published_at"] >= settings.PROGRESS_INTERVAL:
+            out = _publish(job, now)
+        if stage in FINAL:
+            # keep finished jobs for late subscribers, but not forever
+            for fid in [f for f, j in _jobs.items() if j["stage"] in FINAL and now - j["_stage_at"] > 300]:
+                _jobs.pop(fid, None)
+    if out:
+        _send(*out)
+
+
+def _bump(totals: dict, deltas: dict) -> None:
+    file_id = _bound.get()
+    if file_id is None:
+        return
+    now = time.time()
+    out = None
+    with _lock:
+        job = _job(file_id, now)
+        job.update(totals)
+        for k, v in deltas.items():
+            job[k] = job.get(k, 0) + v
+        if now - job["_published_at"] >= settings.PROGRESS_INTERVAL:
+            out = _publish(job, now)
+    if out:
+        _send(*out)
+
+
+def expect(**totals) -> None:
+    """Set totals (``pages_total=...``) of the job bound to this context (no-op outside a job)."""
+    _bump(totals, {})
+
+
+def advance(**deltas) -> None:
+    """Add to the counters of the job bound to this context (no-op outside a job)."""
+    _bump({}, deltas)
+
+
+@contextmanager
+def bound(file_id: str):
+    """Count ``advance()`` calls in this context towards a fresh job for ``file_id``."""
+    now = time.time()
+    with _lock:
+        old = _jobs.get(file_id)
+        _jobs[file_id] = {
+            "file_id": file_id, "stage": old["stage"] if old else None,
+            "_started_at": now, "_stage_at": now, "_published_at": 0.0,
+        }
+    token = _bound.set(file_id)
+    try:
+        yield
+    finally:
+        _bound.reset(token)
+
+
+def get(file_id: str) -> dict | None:
+    """Latest event of a job this process has seen."""
+    with _lock:
+        job = _jobs.get(file_id)
+        return _event(job, time.time()) if job and job["stage"] else None
+
+
+class LatestQueue:
+    """Asyncio queue of events keeping only the newest pending one per file_id (loop thread only)."""
+
+    def __init__(self) -> None:
+        import asyncio
+
+        self._pending: dict[str, dict] = {}
+        self._ready = asyncio.Event()
+
+    def put_nowait(self, ev: dict) -> None:
+        self._pending.pop(ev["file_id"], None)  # re-queue at the end, like a fresh event
+        self._pending[ev["file_id"]] = ev
+        self._ready.set()
+
+    async def get(self) -> dict:
+        while not self._pending:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._pending.pop(next(iter(self._pending)))
+
+    def qsize(self) -> int:
+        return len(self._pending)
+
+
+def subscribe(file_ids: set[str] | None):
+    """A queue (``await queue.get()``) receiving the events of ``file_ids`` (all jobs when None)."""
+    import asyncio
+
+    queue = LatestQueue()
+    with _lock:
+        _subscribers.append((asyncio.get_running_loop(), queue, file_ids))
+    return queue
+
+
+def unsubscribe(queue) -> None:
+    with _lock:
+        _subscribers[:] = [s for s in _subscribers if s[1] is not queue]
+
+
+def subscribers() -> int:
+    with _lock:
+        return len(_subscribers)
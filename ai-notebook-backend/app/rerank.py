@@ -0,0 +1,137 @@
+"""Optional cross-encoder rerank of a retrieved shortlist, selected by ``RERANK_MODEL``.
+
+- ``""`` (default): off; retrieval order is kept.
+- ``st:<name-or-path>``: sentence-transformers ``CrossEncoder`` on CPU,
+  e.g. ``st:cross-encoder/ms-marco-MiniLM-L-6-v2``.
+- ``onnx:<dir>``: an exported cross-encoder in ``<dir>`` with ``model.onnx`` or
+  ``model_quantized.onnx`` plus ``tokenizer.json``.
+
+Candidates are scored in RERANK_BATCH_SIZE batches in retrieval order until
+RERANK_BUDGET_MS is spent; candidates left unscored rank after the scored ones
+in their retrieval order.
+"""
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Sequence, TypeVar
+
+from .config import settings
+from .metrics import RERANK_LATENCY
+from .tracing import span
+
+T = TypeVar("T")
+
+
+class Reranker:
+    """Scores (query, passage) pairs; higher is more relevant."""
+
+    model_id: str = ""
+
+    def score(self, query: str, passages: list[str]) -> list[float]:
+        raise NotImplementedError
+
+
+class SentenceTransformerReranker(Reranker):
+    def __init__(self, model_id: str, name: str) -> None:
+        try:
+            import torch
+            from sentence_transformers import CrossEncoder
+        except Exception as e:
+            raise RuntimeError(f"RERANK_MODEL={model_id} needs sentence-transformers installed: {e}")
+        if settings.EMBEDDING_THREADS > 0:
+            torch.set_num_threads(settings.EMBEDDING_THREADS)
+        self.model_id = model_id
+        self._model = CrossEncoder(name, device="cpu", max_length=settings.EMBEDDING_MAX_LENGTH)
+        self._lock = threading.Lock()
+
+    def score(self, query: str, passages: list[str]) -> list[float]:
+        with self._lock:
+            scores = self._model.predict(
+                [(query, p) for p in passages],
+                batch_size=len(passages),
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return [float(s) for s in scores]
+
+
+class OnnxReranker(Reranker):
+    def __init__(self, model_id: str, model_dir: str) -> None:
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except Exception as e:
+            raise RuntimeError(f"RERANK_MODEL={model_id} needs onnxruntime and tokenizers installed: {e}")
+        d = Path(model_dir)
+        onnx_path = next((p for p in (d / "model_quantized.onnx", d / "model.onnx") if p.exists()), None)
+        if onnx_path is None:
+            raise RuntimeError(f"No model.onnx or model_quantized.onnx in {d}")
+        opts = ort.SessionOptions()
+        if settings.EMBEDDING_THREADS > 0:
+            opts.intra_op_num_threads = settings.EMBEDDING_THREADS
+        self.model_id = model_id
+        self._session = ort.InferenceSession(str(onnx_path), opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = Tokenizer.from_file(str(d / "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=settings.EMBEDDING_MAX_LENGTH)
+        self._tokenizer.enable_padding()
+
+    def score(self, query: str, passages: list[str]) -> list[float]:
+        import numpy as np
+
+        enc = self._tokenizer.encode_batch([(query, p) for p in passages])
+        ids = np.array([e.ids for e in enc], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": np.array([e.attention_mask for e in enc], dtype=np.int64)}
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in enc], dtype=np.int64)
+        logits = self._session.run(None, feeds)[0]  # (batch, 1) or (batch, 2)
+        return logits[:, -1].astype(float).tolist()
+
+
+@lru_cache(maxsize=2)
+def _reranker(model: str) -> Reranker:
+    prefix, sep, rest = model.partition(":")
+    if sep and prefix in {"st", "local"}:
+        return SentenceTransformerReranker(model, rest)
+    if sep and prefix == "onnx":
+        return OnnxReranker(model, rest)
+    raise RuntimeError(f"Unsupported RERANK_MODEL={model!r}; use st:<name> or onnx:<dir>")
+
+
+def enabled() -> bool:
+    return bool(settings.RERANK_MODEL)
+
+
+def candidates(k: int) -> int:
+    """How many results to retrieve for a final top ``k``."""
+    return max(k, settings.RERANK_CANDIDATES) if enabled() else k
+
+
+def warm_up() -> None:
+    if enabled():
+        _reranker(settings.RERANK_MODEL)
+
+
+def rerank(query: str, items: Sequence[T], k: int, text: Callable[[T], str]) -> list[T]:
+    """Best ``k`` of ``items`` (given in retrieval order) for ``query``."""
+    if not enabled() or len(items) <= 1:
+        return list(items[:k])
+    model = _reranker(settings.RERANK_MODEL)
+    batch = max(1, settings.RERANK_BATCH_SIZE)
+    start = time.perf_counter()
+    deadline = start + settings.RERANK_BUDGET_MS / 1000.0
+    scores: list[float] = []
+    with span("rerank", model=model.model_id, candidates=len(items)) as sp:
+        while len(scores) < len(items):
+            # The first batch always runs; later ones only while within budget
+            if scores and time.perf_counter() >= deadline:
+                break
+            part = items[len(scores):len(scores) + batch]
+            scores.extend(model.score(query, [text(it) for it in part]))
+        if sp is not None:
+            sp.set(scored=len(scores))
+    RERANK_LATENCY.observe(time.perf_counter() - start, outcome="complete" if len(scores) == len(items) else "budget")
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    ranked = [items[i] for i in order] + list(items[len(scores):])
+    return ranked[:k]
@@ -0,0 +1,117 @@
+"""JSON rendering and negotiated response compression.
+
+- ``JSONResponse`` renders with orjson when it is installed (stdlib ``json``
+  otherwise) and is the app's default response class. Endpoints that return
+  large plain-JSON documents (notebooks, file metadata) return it directly,
+  which also skips FastAPI's ``jsonable_encoder`` walk over the whole tree.
+- ``CompressionMiddleware`` compresses responses of at least
+  COMPRESS_MIN_BYTES with brotli (when ``brotli`` is installed and the client
+  accepts ``br``) or gzip. Event streams, media, partial (206) and already
+  encoded responses (precompressed ``/uploads`` text) pass through untouched.
+"""
+import json
+from functools import lru_cache
+from typing import Any
+
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipResponder, IdentityResponder
+from starlette.responses import JSONResponse as _JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# PDFs are already deflate-compressed inside; compressing them again costs CPU for ~nothing
+EXCLUDED_CONTENT_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/pdf", "application/octet-stream")
+# Bodies at least this large are compressed on a worker thread instead of the event loop
+THREAD_MIN_BYTES = 128 * 1024
+
+
+def _default(obj: Any):
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON; orjson when available, stdlib for anything it rejects (e.g. huge ints)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass
+    return json.dumps(obj, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class JSONResponse(_JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def accepts(headers: Headers, coding: str) -> bool:
+    """Whether ``Accept-Encoding`` lists ``coding`` with a non-zero q-value."""
+    for part in headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == coding and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            return True
+    return False
+
+
+@lru_cache(maxsize=1)
+def brotli_module():
+    """The ``brotli`` module, or None when it is not installed (imported on first use)."""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int, *, exclude_content_types=EXCLUDED_CONTENT_TYPES) -> None:
+        super().__init__(app, minimum_size, exclude_content_types=exclude_content_types)
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if len(body) >= THREAD_MIN_BYTES:
+            return await anyio.to_thread.run_sync(self._compress_body, body, more_body)
+        return self._compress_body(body, more_body)
+
+    def _compress_body(self, body: bytes, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli_module().Compressor(quality=self.quality)
+        out = self._compressor.process(body)
+        return out + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware (bodies are streamed, not buffered) choosing br > gzip > identity per request."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 5, brotli_quality: int = 4) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or self.minimum_size < 0:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if accepts(headers, "br") and brotli_module() is not None:
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif accepts(headers, "gzip"):
+            responder = GZipResponder(
+                self.app, self.minimum_size, compresslevel=self.gzip_level,
+                thread_minimum_size=THREAD_MIN_BYTES, exclude_content_types=EXCLUDED_CONTENT_TYPES,
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=EXCLUDED_CONTENT_TYPES)
+        await responder(scope, receive, send)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import threading
+from typing import Any, Callable
+
+from .metrics import Counter, Gauge
+
+_CALLS = Counter("studylm_singleflight_calls_total", "Upstream calls made through single-flight", ("kind",))
+_MERGED = Counter("studylm_singleflight_merged_total", "Callers served by an identical in-flight call", ("kind",))
+_GROUPS: list["SingleFlight"] = []
+Gauge(
+    "studylm_singleflight_in_flight",
+    "Distinct keys currently in flight",
+    ("kind",),
+    fn=lambda: {(g.name,): g.stats()["in_flight"] for g in _GROUPS},
+)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse identical concurrent calls into one upstream call.
+
+    The first caller for a key runs ``fn``; callers arriving while it is in
+    flight wait and share its result (or its exception). Nothing is cached once
+    the call completes.
+    """
+
+    def __init__(self, name: str = "default") -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self.calls = 0  # upstream calls actually made
+        self.merged = 0  # callers served by someone else's call
+        _GROUPS.append(self)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.merged += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            _MERGED.inc(kind=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        _CALLS.inc(kind=self.name)
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "merged": self.merged,
+                "in_flight": len(self._calls),
+            }
+
+
+def flight_key(kind: str, model: str, payload: Any, **params: Any) -> str:
+    """Stable key from model, a hash of the payload (messages/texts) and params.
+
+    Pass the scheduler priority as a param: calls only merge with calls of the
+    same priority, so an interactive caller never waits on a background call.
+    """
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha256(blob.encode("utf8")).hexdigest()
+    extra = json.dumps(params, sort_keys=True, default=str)
+    return f"{kind}:{model}:{digest}:{extra}"
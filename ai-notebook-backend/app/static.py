@@ -0,0 +1,117 @@
+"""Serving ``uploads/``: strong ETags, cache headers, ranges, precompressed text.
+
+- ETag: SHA-256 of the file content, hashed once per file version per process
+  (keyed by inode, mtime and size) on a worker thread.
+- Cache-Control: ``/uploads/<name>?v=<hash prefix>`` (what citations link to)
+  is immutable for a year; a plain ``/uploads/<name>`` must be revalidated,
+  which costs a 304 since PDFs can be replaced in place under the same name.
+- Ranges are served by Starlette's FileResponse (``If-Range`` checks the
+  strong ETag), in 1 MB reads, or with zero-copy ``http.response.pathsend``
+  on servers that offer it. With UPLOADS_ACCEL_REDIRECT set, the body is
+  left to nginx (``X-Accel-Redirect``), which sends it with sendfile.
+- ``.txt`` sources get ``.gz`` (and ``.br`` with ``brotli`` installed)
+  siblings at ingest, served to clients that accept them.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from .config import settings
+from .responses import accepts, brotli_module
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+PRECOMPRESSED = (".txt",)
+
+_hashes: OrderedDict = OrderedDict()
+_hashes_lock = threading.Lock()
+
+
+def content_hash(path: str | Path, st: os.stat_result | None = None) -> str:
+    """Hex SHA-256 of a file, remembered for its current inode/mtime/size."""
+    st = st or os.stat(path)
+    key = (str(path), st.st_ino, st.st_mtime_ns, st.st_size)
+    with _hashes_lock:
+        if key in _hashes:
+            _hashes.move_to_end(key)
+            return _hashes[key]
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    with _hashes_lock:
+        _hashes[key] = digest
+        while len(_hashes) > 4096:
+            _hashes.popitem(last=False)
+    return digest
+
+
+def version(path: str | Path) -> str:
+    """Short content version for ``?v=`` cache-busting URLs."""
+    return content_hash(path)[:16]
+
+
+def precompress(path: str | Path) -> None:
+    """Write ``.gz`` (and ``.br``) siblings of a text source next to it."""
+    path = Path(path)
+    data = path.read_bytes()
+    variants = [(".gz", lambda b: gzip.compress(b, compresslevel=9, mtime=0))]
+    brotli = brotli_module()
+    if brotli is not None:
+        variants.append((".br", lambda b: brotli.compress(b, quality=11)))
+    for suffix, compress in variants:
+        out = path.with_name(path.name + suffix)
+        tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(compress(data))
+        os.replace(tmp, out)
+
+
+class _LargeReads(FileResponse):
+    chunk_size = 1 << 20
+
+
+class UploadFiles(StaticFiles):
+    def lookup_path(self, path: str):
+        # Runs on a worker thread: hash here so file_response() finds it cached
+        full_path, st = super().lookup_path(path)
+        if st is not None and os.path.isfile(full_path):
+            content_hash(full_path, st)
+        return full_path, st
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        digest = content_hash(full_path, stat_result)
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        pinned = any(len(v) >= 8 and digest.startswith(v) for v in query.get("v", []))
+        headers = {"cache-control": IMMUTABLE if pinned else REVALIDATE}
+        etag = digest
+        served, media_type = Path(full_path), None
+
+        if served.suffix in PRECOMPRESSED:
+            headers["vary"] = "Accept-Encoding"
+            for coding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                sibling = served.with_name(served.name + suffix)
+                if accepts(request_headers, coding) and sibling.exists() and sibling.stat().st_mtime_ns >= stat_result.st_mtime_ns:
+                    media_type = "text/plain; charset=utf-8"
+                    headers["content-encoding"] = coding
+                    etag = f"{digest}-{coding}"
+                    served, stat_result = sibling, sibling.stat()
+                    break
+        headers["etag"] = f'"{etag}"'
+
+        if settings.UPLOADS_ACCEL_REDIRECT and "content-encoding" not in headers:
+            rel = os.path.relpath(served, self.directory)
+            headers["x-accel-redirect"] = settings.UPLOADS_ACCEL_REDIRECT.rstrip("/") + "/" + rel.replace(os.sep, "/")
+            response = Response(status_code=status_code, headers=headers, media_type=mimetypes.guess_type(served.name)[0] or "application/octet-stream")
+        else:
+            response = _LargeReads(served, status_code=status_code, stat_result=stat_result, headers=headers, media_type=media_type)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,158 @@
+"""Table detection for PDF ingest and ``/extract-table``.
+
+Tables are found with PyMuPDF's ``Page.find_tables`` (no extra dependency) or
+with camelot's stream flavor (``TABLE_EXTRACTOR=camelot``). Both are CPU-bound
+Python, so large documents are split into contiguous page ranges that run in
+TABLE_WORKERS processes, each opening the PDF itself. Every detected table
+becomes one or more chunks: a markdown rendering (what gets embedded and sent
+to the LLM) plus the CSV and page, split by rows to fit MAX_CHUNK_TOKENS with
+the header repeated. A row too wide for a chunk on its own is split into
+column groups, and a single cell that is still too long into token windows.
+"""
+import csv
+import io
+from functools import lru_cache
+
+from .config import settings
+from .tracing import span
+
+
+def _clean(cell) -> str:
+    return " ".join(str(cell if cell is not None else "").split())
+
+
+def _pymupdf_tables(path: str, pages: list[int]) -> list[dict]:
+    import fitz
+
+    out = []
+    with fitz.open(path) as doc:
+        for no in pages:
+            for tab in doc[no - 1].find_tables():
+                rows = [[_clean(c) for c in row] for row in tab.extract()]
+                out.append({"page": no, "rows": rows})
+    return out
+
+
+def _camelot_tables(path: str, pages: list[int]) -> list[dict]:
+    import camelot
+
+    tables = camelot.read_pdf(path, pages=",".join(str(p) for p in pages), flavor="stream")
+    return [{"page": int(t.page), "rows": [[_clean(c) for c in row] for row in t.df.values.tolist()]} for t in tables]
+
+
+def find_tables(path: str, pages: list[int]) -> list[dict]:
+    """[{page, rows}] for the given 1-based pages of one PDF, in page order."""
+    extract = _camelot_tables if settings.TABLE_EXTRACTOR == "camelot" else _pymupdf_tables
+    tables = []
+    for t in extract(path, pages):
+        # drop empty rows/columns left by merged cells and ruling lines
+        rows = [r for r in t["rows"] if any(r)]
+        width = max((len(r) for r in rows), default=0)
+        keep = [i for i in range(width) if any(i < len(r) and r[i] for r in rows)]
+        if len(rows) >= 2 and len(keep) >= 2:
+            tables.append({"page": t["page"], "rows": [[r[i] if i < len(r) else "" for i in keep] for r in rows]})
+    return tables
+
+
+@lru_cache(maxsize=1)
+def _pool():
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    # spawn: never fork a server process that is running threads
+    return ProcessPoolExecutor(max_workers=settings.TABLE_WORKERS, mp_context=mp.get_context("spawn"))
+
+
+def extract(path: str, page_count: int) -> list[dict]:
+    """Tables of a whole PDF, split over TABLE_WORKERS processes when it is large enough."""
+    pages = list(range(1, page_count + 1))
+    workers = min(settings.TABLE_WORKERS, page_count // max(1, settings.TABLE_PAGES_PER_JOB))
+    with span("tables.extract", pages=page_count, workers=max(1, workers)) as sp:
+        if workers <= 1:
+            tables = find_tables(path, pages)
+        else:
+            step = -(-page_count // workers)
+            jobs = [_pool().submit(find_tables, path, pages[i:i + step]) for i in range(0, page_count, step)]
+            tables = [t for job in jobs for t in job.result()]
+        if sp is not None:
+            sp.set(tables=len(tables))
+    return tables
+
+
+def to_csv(rows: list[list[str]]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue()
+
+
+def _md_row(row: list[str]) -> str:
+    return "| " + " | ".join(c.replace("|", "\\|") for c in row) + " |"
+
+
+def to_markdown(rows: list[list[str]]) -> str:
+    return "\n".join([_md_row(rows[0]), "|" + " --- |" * len(rows[0])] + [_md_row(r) for r in rows[1:]])
+
+
+def _chunk(title: str, page: int, rows: list[list[str]]) -> dict:
+    return {
+        "text": f"{title}:\n{to_markdown(rows)}",
+        "page_start": page,
+        "page_end": page,
+        "kind": "table",
+        "csv": to_csv(rows),
+    }
+
+
+def _split_row(title: str, header: list[str], row: list[str], encoder) -> list[list[list[str]]]:
+    """[header, row] pieces of one row over MAX_CHUNK_TOKENS: column groups, long cells cut into token windows."""
+    limit = settings.MAX_CHUNK_TOKENS - 8
+    names = [header[i] if i < len(header) else "" for i in range(len(row))]
+
+    def piece(cols: list[int]) -> list[list[str]]:
+        return [[names[i] for i in cols], [row[i] for i in cols]]
+
+    def cost(rows: list[list[str]]) -> int:
+        return len(encoder.encode(f"{title}:\n{to_markdown(rows)}"))
+
+    pieces, cols = [], []
+    for i in range(len(row)):
+        if cost(piece(cols + [i])) <= limit:
+            cols.append(i)
+            continue
+        if cols:
+            pieces.append(piece(cols))
+        cols = [i]
+        if cost(piece(cols)) > limit:
+            # One cell over the budget by itself: token windows of it under its (shortened) header
+            name = encoder.decode(encoder.encode(names[i])[: limit // 4])
+            room = max(16, limit - cost([[name], [""]]) - 8)
+            toks = encoder.encode(row[i])
+            pieces += [[[name], [encoder.decode(toks[j:j + room])]] for j in range(0, len(toks), room)]
+            cols = []
+    if cols:
+        pieces.append(piece(cols))
+    return pieces
+
+
+def to_chunks(tables: list[dict]) -> list[dict]:
+    """Chunk dicts ({text, page_start, page_end, kind, csv}) for the index."""
+    from .pdf_parser import get_encoder
+
+    encoder = get_encoder()
+    chunks = []
+    for n, t in enumerate(tables, start=1):
+        header, body = t["rows"][0], t["rows"][1:]
+        title = f"Table {n} (page {t['page']})"
+        budget = settings.MAX_CHUNK_TOKENS - len(encoder.encode(title + to_markdown([header]))) - 8
+        part, used = [], 0
+        for row in body + [None]:
+            cost = len(encoder.encode(_md_row(row))) + 1 if row is not None else 0
+            if part and (row is None or used + cost > budget):
+                chunks.append(_chunk(title, t["page"], [header] + part))
+                part, used = [], 0
+            if row is not None and cost > budget:
+                chunks += [_chunk(title, t["page"], rows) for rows in _split_row(title, header, row, encoder)]
+            elif row is not None:
+                part.append(row)
+                used += cost
+    return chunks
@@ -0,0 +1,232 @@
+"""Opt-in request tracing and sampling profiler.
+
+Spans are cheap no-ops unless a trace is active. A trace is started per request
+(globally via TRACING_ENABLED, or per request with the ``x-trace: 1`` header)
+and per background ingest job. Finished traces are appended to
+TRACE_EXPORT_PATH as OTLP/JSON (one ``{"resourceSpans": [...]}`` object per
+line), which OpenTelemetry collectors and most trace viewers can import.
+
+The profiler (PROFILING_ENABLED, or ``x-profile: 1``) samples the stacks of the
+threads currently inside a span of the trace and, for requests slower than
+PROFILE_SLOW_MS, writes folded stacks (``a;b;c 12``) to PROFILE_DIR for
+flamegraph.pl / speedscope.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from .config import settings
+
+_trace_var: ContextVar["_Trace | None"] = ContextVar("studylm_trace", default=None)
+_span_var: ContextVar["_Span | None"] = ContextVar("studylm_span", default=None)
+_export_lock = threading.Lock()
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+
+def _hex_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+def _attr_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+class _Span:
+    __slots__ = ("name", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, name: str, parent_id: str | None, kind: int, attrs: dict) -> None:
+        self.name = name
+        self.span_id = _hex_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attrs = attrs
+        self.error: str | None = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_otlp(self, trace_id: str) -> dict:
+        out = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [{"key": k, "value": _attr_value(v)} for k, v in self.attrs.items() if v is not None],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        return out
+
+
+class _Trace:
+    def __init__(self, profile: bool) -> None:
+        self.trace_id = _hex_id(16)
+        self.spans: list[_Span] = []
+        self.lock = threading.Lock()
+        self.threads: dict[int, int] = {}  # thread ident -> open span depth
+        self.profiler = _Sampler(self) if profile else None
+
+    def enter_thread(self) -> None:
+        tid = threading.get_ident()
+        with self.lock:
+            self.threads[tid] = self.threads.get(tid, 0) + 1
+
+    def exit_thread(self) -> None:
+        tid = threading.get_ident()
+        with self.lock:
+            n = self.threads.get(tid, 0) - 1
+            if n > 0:
+                self.threads[tid] = n
+            else:
+                self.threads.pop(tid, None)
+
+    def active_threads(self) -> list[int]:
+        with self.lock:
+            return list(self.threads)
+
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of a trace's active threads at a fixed interval."""
+
+    def __init__(self, trace: _Trace) -> None:
+        super().__init__(name="studylm-profiler", daemon=True)
+        self.trace = trace
+        self.interval = max(0.001, settings.PROFILE_INTERVAL_MS / 1000.0)
+        self.stacks: Counter[str] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for tid in self.trace.active_threads():
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(parts))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join(timeout=1.0)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Record a child span of the current trace; no-op when tracing is off."""
+    trace = _trace_var.get()
+    if trace is None:
+        yield None
+        return
+    parent = _span_var.get()
+    s = _Span(name, parent.span_id if parent else None, SPAN_KIND_INTERNAL, attrs)
+    token = _span_var.set(s)
+    trace.enter_thread()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        trace.exit_thread()
+        _span_var.reset(token)
+        with trace.lock:
+            trace.spans.append(s)
+
+
+@contextmanager
+def trace(name: str, force: bool = False, profile: bool = False, kind: int = SPAN_KIND_INTERNAL, **attrs):
+    """Start a new root trace (request or background job) if enabled.
+
+    Yields the root span, or None when neither the global toggle nor ``force``
+    enables tracing.
+    """
+    profile = profile or settings.PROFILING_ENABLED
+    enabled = force or profile or (
+        settings.TRACING_ENABLED and random.random() < settings.TRACE_SAMPLE_RATE
+    )
+    if not enabled:
+        yield None
+        return
+    t = _Trace(profile)
+    root = _Span(name, None, kind, attrs)
+    t_token = _trace_var.set(t)
+    s_token = _span_var.set(root)
+    t.enter_thread()
+    if t.profiler:
+        t.profiler.start()
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        root.end_ns = time.time_ns()
+        t.exit_thread()
+        _span_var.reset(s_token)
+        _trace_var.reset(t_token)
+        if t.profiler:
+            t.profiler.stop()
+        with t.lock:
+            t.spans.append(root)
+        _finish(t, root)
+
+
+def current_trace_id() -> str | None:
+    t = _trace_var.get()
+    return t.trace_id if t else None
+
+
+def _finish(t: _Trace, root: _Span) -> None:
+    try:
+        if t.profiler and t.profiler.stacks:
+            elapsed_ms = (root.end_ns - root.start_ns) / 1e6
+            if elapsed_ms >= settings.PROFILE_SLOW_MS:
+                d = Path(settings.PROFILE_DIR)
+                d.mkdir(parents=True, exist_ok=True)
+                lines = [f"{stack} {n}" for stack, n in t.profiler.stacks.most_common()]
+                (d / f"{t.trace_id}.folded").write_text("\n".join(lines) + "\n", encoding="utf8")
+                root.set(**{"profile.file": f"{t.trace_id}.folded"})
+        doc = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "studylm-backend"}}]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "app.tracing"},
+                            "spans": [s.to_otlp(t.trace_id) for s in t.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        line = json.dumps(doc, separators=(",", ":"))
+        with _export_lock:
+            with open(settings.TRACE_EXPORT_PATH, "a", encoding="utf8") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        print(f"Trace export failed: {e}")
@@ -0,0 +1,280 @@
+"""Central scheduler for upstream (OpenAI) calls.
+
+Every chat/embedding/transcription request goes through ``scheduler.run`` which
+enforces, per model:
+- bounded concurrency,
+- request-per-minute and token-per-minute token buckets,
+- priority ordering (interactive questions ahead of background ingest),
+- jittered exponential backoff on 429/5xx/timeouts, shared by all callers of
+  the model so a burst backs off together instead of hammering the API.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable
+
+from .config import settings
+from .metrics import UPSTREAM_ERRORS, UPSTREAM_LATENCY, UPSTREAM_TOKENS, UPSTREAM_WAIT, Gauge
+from .tracing import span
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, n: float, now: float) -> float:
+        """Seconds until ``n`` tokens are available (0 if available now)."""
+        self._refill(now)
+        n = min(n, self.capacity)
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+    def take(self, n: float) -> None:
+        # May go negative when a request's actual usage exceeds its estimate
+        self.tokens -= min(n, self.capacity)
+
+
+class _Model:
+    def __init__(self, name: str) -> None:
+        rpm, tpm = settings.UPSTREAM_MODEL_LIMITS.get(name, (settings.UPSTREAM_RPM, settings.UPSTREAM_TPM))
+        # Limits are account-wide; each worker process gets its share
+        workers = settings.WORKERS
+        self.name = name
+        self.rpm = TokenBucket(max(1, rpm // workers))
+        self.tpm = TokenBucket(max(1, tpm // workers))
+        self.max_active = max(1, -(-settings.UPSTREAM_MAX_CONCURRENCY // workers))
+        self.active = 0
+        self.queue: list[tuple[int, int]] = []  # (priority, seq)
+        self.paused_until = 0.0
+        # stats
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class RetryableError(Exception):
+    """Raised by callers to force a retry of an otherwise unrecognised failure."""
+
+
+def _retry_after(e: BaseException) -> float | None:
+    resp = getattr(e, "response", None)
+    headers = getattr(resp, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(e: BaseException) -> bool:
+    if isinstance(e, RetryableError):
+        return True
+    status = getattr(e, "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409, 429) or status >= 500
+    try:
+        import openai
+
+        return isinstance(e, openai.APIConnectionError)  # includes APITimeoutError
+    except Exception:
+        return False
+
+
+class UpstreamScheduler:
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._models: dict[str, _Model] = {}
+        self._seq = itertools.count()
+
+    def _model(self, name: str) -> _Model:
+        m = self._models.get(name)
+        if m is None:
+            m = self._models[name] = _Model(name)
+        return m
+
+    def _acquire(self, model: str, tokens: int, priority: int) -> float:
+        start = time.monotonic()
+        with self._cond:
+            m = self._model(model)
+            entry = (priority, next(self._seq))
+            heapq.heappush(m.queue, entry)
+            try:
+                while True:
+                    timeout = None
+                    if m.queue[0] == entry and m.active < m.max_active:
+                        now = time.monotonic()
+                        wait = max(m.paused_until - now, m.rpm.delay(1, now), m.tpm.delay(tokens, now))
+                        if wait <= 0:
+                            m.rpm.take(1)
+                            m.tpm.take(tokens)
+                            m.active += 1
+                            break
+                        m.throttled += 1
+                        timeout = wait
+                    self._cond.wait(timeout)
+            finally:
+                m.queue.remove(entry)
+                heapq.heapify(m.queue)
+                self._cond.notify_all()
+            waited = time.monotonic() - start
+            UPSTREAM_WAIT.observe(waited, model=model)
+            m.requests += 1
+            m.wait_total += waited
+            m.wait_max = max(m.wait_max, waited)
+            return waited
+
+    def _release(self, model: str, estimated: int, actual: int | None) -> None:
+        with self._cond:
+            m = self._model(model)
+            m.active -= 1
+            if actual is not None and actual > estimated:
+                m.tpm.take(actual - estimated)
+            self._cond.notify_all()
+
+    def _backoff(self, model: str, attempt: int, e: BaseException) -> float:
+        cap = min(settings.UPSTREAM_BACKOFF_MAX, settings.UPSTREAM_BACKOFF_BASE * (2 ** attempt))
+        delay = random.uniform(cap / 2, cap)  # jitter so a burst doesn't retry in lockstep
+        hinted = _retry_after(e)
+        if hinted is not None:
+            delay = max(delay, min(hinted, settings.UPSTREAM_BACKOFF_MAX))
+        with self._cond:
+            m = self._model(model)
+            m.retries += 1
+            if getattr(e, "status_code", None) == 429:
+                # Adaptive: hold back every queued caller of this model, not just us
+                m.paused_until = max(m.paused_until, time.monotonic() + delay)
+        return delay
+
+    def run(
+        self,
+        model: str,
+        fn: Callable[[], Any],
+        tokens: int = 0,
+        priority: int = INTERACTIVE,
+        usage: Callable[[Any], int | None] | None = None,
+    ) -> Any:
+        """Run ``fn`` once a slot and budget for ``model`` are available.
+
+        ``tokens`` is the estimated token cost; ``usage`` may extract the actual
+        count from the result so the TPM bucket stays honest.
+        """
+        attempt = 0
+        while True:
+            with span("upstream.wait", model=model, priority=priority, attempt=attempt):
+                self._acquire(model, tokens, priority)
+            actual = None
+            started = time.perf_counter()
+            try:
+                with span("upstream.call", model=model, est_tokens=tokens) as sp:
+                    result = fn()
+                UPSTREAM_LATENCY.observe(time.perf_counter() - started, model=model)
+                if usage is not None:
+                    try:
+                        actual = usage(result)
+                    except Exception:
+                        actual = None
+                if actual:
+                    UPSTREAM_TOKENS.inc(actual, model=model)
+                    if sp is not None:
+                        sp.set(tokens=actual)
+                return result
+            except Exception as e:
+                if attempt >= settings.UPSTREAM_MAX_RETRIES or not _is_retryable(e):
+                    UPSTREAM_ERRORS.inc(model=model, retried="false")
+                    raise
+                UPSTREAM_ERRORS.inc(model=model, retried="true")
+                delay = self._backoff(model, attempt, e)
+            finally:
+                self._release(model, tokens, actual)
+            attempt += 1
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                name: {
+                    "queue_depth": len(m.queue),
+                    "active": m.active,
+                    "requests": m.requests,
+                    "retries": m.retries,
+                    "throttled": m.throttled,
+                    "wait_avg_s": round(m.wait_total / m.requests, 4) if m.requests else 0.0,
+                    "wait_max_s": round(m.wait_max, 4),
+                }
+                for name, m in self._models.items()
+            }
+
+
+scheduler = UpstreamScheduler()
+
+Gauge(
+    "studylm_upstream_queue_depth",
+    "Callers waiting for an upstream slot/budget",
+    ("model",),
+    fn=lambda: {(name,): s["queue_depth"] for name, s in scheduler.stats().items()},
+)
+Gauge(
+    "studylm_upstream_active",
+    "Upstream calls in flight",
+    ("model",),
+    fn=lambda: {(name,): s["active"] for name, s in scheduler.stats().items()},
+)
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    """The model's tiktoken encoding, or None when it cannot be loaded (remembered, so
+    offline hosts do not retry the encoding download on every call)."""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    enc = _encoding(model)
+    if enc is None:
+        # Encoding files unavailable (offline); ~4 chars per token is close enough
+        return len(text or "") // 4 + 1
+    return len(enc.encode(text or "", disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """``text`` cut to its first ``max_tokens`` tokens."""
+    enc = _encoding(model)
+    if enc is None:
+        return (text or "")[: max_tokens * 4]
+    ids = enc.encode(text or "", disallowed_special=())
+    return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
+
+
+def estimate_chat_tokens(messages: list[dict], model: str, max_tokens: int) -> int:
+    """Prompt tokens plus the completion budget (what OpenAI charges against TPM)."""
+    prompt = sum(count_tokens(str(m.get("content") or ""), model) + 4 for m in messages)
+    return prompt + 2 + int(max_tokens or 0)
+
+
+def estimate_embedding_tokens(texts: list[str], model: str) -> int:
+    return sum(count_tokens(t, model) for t in texts)
@@ -1,28 +1,364 @@
-import os 
-import faiss 
+import json
+import os
+import threading
+from collections import OrderedDict
 import numpy as np
 from pathlib import Path
 from .config import settings
+from .metrics import SEARCH_LATENCY, Gauge, cached
+from .tracing import span
 
+# faiss is imported on first use; the directory is created on first save
 Dir = Path(settings.VECTOR_STORE_DIR)
-Dir.mkdir(parents=True, exist_ok=True)
 
-def build_index(embeddings:list[list[float]]) -> faiss.IndexFlatIP:
-    dim = len(embeddings[0])
-    index = faiss.IndexFlatIP(dim)
-    index.add(np.array(embeddings, dtype=np.float32))
-    return index
+QUANTIZATIONS = ("none", "fp16", "int8", "pq")
 
-def save_index(index, file_id:str):
+
+class IndexMismatchError(RuntimeError):
+    """The index was built with a different embedding model than the current one."""
+
+
+class VectorIndex:
+    """A FAISS index plus what is needed to query it correctly.
+
+    ``full_dim`` is the embedding model's dimension; ``index.d`` is smaller when
+    vectors were truncated (Matryoshka). ``vectors`` holds the original
+    full-precision vectors (memory-mapped once saved) for exact re-ranking.
+    """
+
+    def __init__(self, index, full_dim: int, quantization: str = "none", vectors=None) -> None:
+        self.index = index
+        self.full_dim = full_dim
+        self.quantization = quantization
+        self.vectors = vectors
+
+    @property
+    def d(self) -> int:
+        return self.index.d
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.clip(np.linalg.norm(x, axis=1, keepdims=True), 1e-12, None)
+
+
+def _pq_m(dim: int, m: int) -> int:
+    # Sub-quantizers must divide the dimension
+    m = max(1, min(m, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def _make_faiss(x: np.ndarray, quantization: str):
+    import faiss
+
+    n, dim = x.shape
+    if quantization == "fp16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT), "fp16"
+    if quantization == "int8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT), "int8"
+    if quantization == "pq":
+        # Codebooks are trained on the document itself: keep ~8 points per
+        # centroid and fall back to flat for documents too small to benefit
+        nbits = min(settings.VECTOR_PQ_BITS, int(np.log2(max(n, 1) / 8)) if n >= 8 else 0)
+        if nbits >= 4:
+            index = faiss.IndexPQ(dim, _pq_m(dim, settings.VECTOR_PQ_M), nbits, faiss.METRIC_INNER_PRODUCT)
+            index.pq.cp.min_points_per_centroid = 8
+            return index, "pq"
+    return faiss.IndexFlatIP(dim), "none"
+
+
+def _truncate(x: np.ndarray, dim: int) -> np.ndarray:
+    if 0 < dim < x.shape[1]:
+        # Matryoshka truncation (text-embedding-3-*): keep the leading dims, renormalise
+        return _normalize(np.ascontiguousarray(x[:, :dim]))
+    return x
+
+
+def _rows_by_id(vectors: np.ndarray, ids: np.ndarray, base=None) -> np.ndarray:
+    """Re-rank vectors are stored by chunk id (row i = id i; freed ids are zero)."""
+    size = max(len(base) if base is not None else 0, int(ids.max()) + 1 if len(ids) else 0)
+    out = np.zeros((size, vectors.shape[1]), dtype=np.float32)
+    if base is not None:
+        out[: len(base)] = base
+    out[ids] = vectors
+    return out
+
+
+def build_index(
+    embeddings: list[list[float]],
+    quantization: str | None = None,
+    dim: int | None = None,
+    rerank: bool | None = None,
+    ids: list[int] | None = None,
+) -> VectorIndex:
+    """Build an inner-product index, compressed per VECTOR_QUANTIZATION / VECTOR_DIM.
+
+    Vectors are stored under stable chunk ids (default 0..n-1), so searches
+    return ids and the index can later be updated in place (update_index).
+    """
+    import faiss
+
+    quantization = (quantization or settings.VECTOR_QUANTIZATION).lower()
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown VECTOR_QUANTIZATION {quantization!r}; use one of {', '.join(QUANTIZATIONS)}")
+    dim = settings.VECTOR_DIM if dim is None else dim
+    full = np.asarray(embeddings, dtype=np.float32)
+    full_dim = full.shape[1]
+    x = _truncate(full, dim)
+    base, quantization = _make_faiss(x, quantization)
+    if not base.is_trained:
+        base.train(x)
+    index = faiss.IndexIDMap2(base)
+    ids = np.arange(len(x), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    index.add_with_ids(x, ids)
+    compressed = quantization != "none" or x.shape[1] < full_dim
+    rerank = settings.VECTOR_RERANK if rerank is None else rerank
+    return VectorIndex(index, full_dim, quantization, _rows_by_id(full, ids) if (compressed and rerank) else None)
+
+
+def _meta_path(file_id: str) -> Path:
+    return Dir / f"{file_id}.meta.json"
+
+def _vectors_path(file_id: str) -> Path:
+    return Dir / f"{file_id}.vecs.npy"
+
+def _read_meta(file_id: str) -> dict:
+    try:
+        return json.loads(_meta_path(file_id).read_text(encoding="utf8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def index_model(file_id: str) -> str | None:
+    """Embedding model recorded for an index (None for indexes built before metadata)."""
+    return _read_meta(file_id).get("embedding_model")
+
+def _replace_atomic(path: Path, write) -> None:
+    # Readers may have the old file memory-mapped: never truncate it in place
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+def save_index(index: VectorIndex, file_id:str, model: str | None = None):
+    import faiss
+
+    Dir.mkdir(parents=True, exist_ok=True)
+    if index.vectors is not None:
+        def _save_vectors(tmp: Path) -> None:
+            with open(tmp, "wb") as f:
+                np.save(f, index.vectors)
+        _replace_atomic(_vectors_path(file_id), _save_vectors)
+    # Metadata before the .faiss so a visible index always has its model recorded
+    meta = {
+        "embedding_model": model or settings.EMBEDDING_MODEL,
+        "dim": index.d,
+        "full_dim": index.full_dim,
+        "quantization": index.quantization,
+        "rerank": index.vectors is not None,
+    }
+    _replace_atomic(_meta_path(file_id), lambda tmp: tmp.write_text(json.dumps(meta), encoding="utf8"))
     idx_path = Dir / f"{file_id}.faiss"
-    faiss.write_index(index, str(idx_path))
+    _replace_atomic(idx_path, lambda tmp: faiss.write_index(index.index, str(tmp)))
+
+
+# Loaded indexes per process, validated against the file's identity on every use
+_cache: "OrderedDict[str, tuple[tuple, str | None, VectorIndex]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _read_faiss(path: Path, size: int, writable: bool = False):
+    import faiss
+
+    flags = 0
+    if not writable and 0 <= settings.VECTOR_MMAP_MIN_MB * 1024 * 1024 <= size:
+        # Zero-copy mmap of the codes: workers share page cache and a cold
+        # load only reads the pages a search touches
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    return faiss.read_index(str(path), flags)
+
+def forget_index(file_id: str) -> None:
+    with _cache_lock:
+        _cache.pop(file_id, None)
+        _chunk_cache.pop(file_id, None)
+
+def _read(file_id: str, idx_path: Path, size: int, writable: bool) -> tuple[str | None, VectorIndex]:
+    meta = _read_meta(file_id)
+    with span("vector_store.load_index", file_id=file_id, bytes=size):
+        index = _read_faiss(idx_path, size, writable)
+        vectors = None
+        if meta.get("rerank") and _vectors_path(file_id).exists():
+            # Memory-mapped: re-ranking only touches the shortlisted rows
+            vectors = np.load(_vectors_path(file_id), mmap_mode=None if writable else "r")
+        vi = VectorIndex(index, meta.get("full_dim", index.d), meta.get("quantization", "none"), vectors)
+    return meta.get("embedding_model"), vi
 
-def load_index(file_id: str):
+def _check_model(file_id: str, built_with: str | None, model: str | None) -> None:
+    expected = model or settings.EMBEDDING_MODEL
+    if built_with and built_with != expected:
+        raise IndexMismatchError(f"Index {file_id} was built with {built_with}, current embedding model is {expected}")
+
+def load_index(file_id: str, model: str | None = None, writable: bool = False) -> VectorIndex:
+    """Load (or reuse) an index. ``writable`` returns a private, fully read copy to modify."""
     idx_path = Dir / f"{file_id}.faiss"
-    if not idx_path.exists():
+    try:
+        st = idx_path.stat()
+    except FileNotFoundError:
+        forget_index(file_id)
         raise FileNotFoundError(f"No index for {file_id}")
-    return faiss.read_index(str(idx_path))
+    if writable:
+        built_with, vi = _read(file_id, idx_path, st.st_size, writable=True)
+        _check_model(file_id, built_with, model)
+        return vi
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        hit = _cache.get(file_id)
+        if hit and hit[0] == stamp:
+            _cache.move_to_end(file_id)
+    if not (hit and hit[0] == stamp):
+        hit = (stamp, *_read(file_id, idx_path, st.st_size, writable=False))
+        if settings.VECTOR_INDEX_CACHE > 0:
+            with _cache_lock:
+                _cache[file_id] = hit
+                _cache.move_to_end(file_id)
+                while len(_cache) > settings.VECTOR_INDEX_CACHE:
+                    _cache.popitem(last=False)
+    _check_model(file_id, hit[1], model)
+    return hit[2]
+
+# Parsed {file_id}_chunks.json mappings (chunk id -> chunk), kept next to the
+# loaded indexes so searches don't re-parse the JSON (holding the GIL) per question
+_chunk_cache: "OrderedDict[str, tuple[tuple, dict[int, dict]]]" = OrderedDict()
+
+
+def chunks_by_id(chunks: list[dict]) -> dict[int, dict]:
+    # Older mappings have no ids: their vectors were added in list order
+    return {int(c.get("id", pos)): c for pos, c in enumerate(chunks)}
+
+
+def load_chunks(file_id: str) -> dict[int, dict]:
+    """Chunks of ``file_id`` by vector id, parsed once per version of the mapping file.
+
+    The dicts are shared between requests and must not be modified.
+    """
+    path = Dir / f"{file_id}_chunks.json"
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        with _cache_lock:
+            _chunk_cache.pop(file_id, None)
+        raise FileNotFoundError(f"No chunks for {file_id}")
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        hit = _chunk_cache.get(file_id)
+        if hit and hit[0] == stamp:
+            _chunk_cache.move_to_end(file_id)
+            return hit[1]
+    with span("chunks.read", file=path.name):
+        by_id = chunks_by_id(json.loads(path.read_text()))
+    if settings.VECTOR_INDEX_CACHE > 0:
+        with _cache_lock:
+            _chunk_cache[file_id] = (stamp, by_id)
+            _chunk_cache.move_to_end(file_id)
+            while len(_chunk_cache) > settings.VECTOR_INDEX_CACHE:
+                _chunk_cache.popitem(last=False)
+    return by_id
+
+def has_chunk_ids(index: VectorIndex) -> bool:
+    """False for indexes built before chunk ids (search returns row positions)."""
+    import faiss
+
+    return isinstance(index.index, faiss.IndexIDMap2)
+
+def original_vectors(index: VectorIndex) -> np.ndarray | None:
+    """Full-precision vectors by row/id when recoverable exactly, else None."""
+    import faiss
+
+    if index.vectors is not None:
+        return np.asarray(index.vectors, dtype=np.float32)
+    if isinstance(index.index, faiss.IndexFlat) and index.d == index.full_dim:
+        return index.index.reconstruct_n(0, index.ntotal)
+    return None
+
+def update_index(file_id: str, remove_ids: list[int], embeddings: list[list[float]], ids: list[int], model: str | None = None) -> VectorIndex:
+    """Remove and add vectors by chunk id in place, then save.
+
+    Compressed indexes keep their trained codebooks; new vectors are encoded
+    with them.
+    """
+    vi = load_index(file_id, model=model, writable=True)
+    if not has_chunk_ids(vi):
+        raise ValueError(f"Index {file_id} has no chunk ids; rebuild it with build_index")
+    with span("vector_store.update_index", file_id=file_id, removed=len(remove_ids), added=len(ids)):
+        if remove_ids:
+            vi.index.remove_ids(np.asarray(remove_ids, dtype=np.int64))
+        new_ids = np.asarray(ids, dtype=np.int64)
+        full = np.asarray(embeddings, dtype=np.float32).reshape(len(new_ids), vi.full_dim)
+        if len(new_ids):
+            vi.index.add_with_ids(_truncate(full, vi.d), new_ids)
+        if vi.vectors is not None:
+            base = np.array(vi.vectors, dtype=np.float32)
+            base[[i for i in remove_ids if i < len(base)]] = 0.0
+            vi.vectors = _rows_by_id(full, new_ids, base=base)
+        save_index(vi, file_id, model)
+    return vi
+
+def search(index: VectorIndex, query_vec, k=3):
+    if len(query_vec) != index.full_dim:
+        # Legacy index without metadata, built by a model with another dimension
+        raise IndexMismatchError(f"Query has dimension {len(query_vec)}, index has {index.full_dim}")
+    q = np.array([query_vec], dtype=np.float32)
+    with SEARCH_LATENCY.time(), span("vector_store.search", k=k, ntotal=index.ntotal, quantization=index.quantization):
+        qi = _normalize(np.ascontiguousarray(q[:, : index.d])) if index.d < index.full_dim else q
+        if index.vectors is None:
+            D, I = index.index.search(qi, k)
+            return I[0], D[0]
+        # Approximate shortlist, then exact scores on the original vectors
+        D, I = index.index.search(qi, min(index.ntotal, k * max(1, settings.VECTOR_RERANK_FACTOR)))
+        cand = np.sort(I[0][I[0] >= 0])
+        exact = np.asarray(index.vectors[cand], dtype=np.float32) @ q[0]
+        order = np.argsort(-exact)[:k]
+        ids, scores = cand[order], exact[order]
+    if len(ids) < k:
+        pad = k - len(ids)
+        ids = np.concatenate([ids, np.full(pad, -1, dtype=np.int64)])
+        scores = np.concatenate([scores, np.full(pad, -np.inf, dtype=np.float32)])
+    return ids, scores
+
+
+def warm_up() -> None:
+    import faiss  # noqa: F401
+
+
+def _store_sizes() -> dict:
+    count, total, raw = 0, 0, 0
+    if not Dir.exists():
+        return {("faiss",): 0, ("rerank",): 0, ("count",): 0}
+    with os.scandir(Dir) as it:
+        for e in it:
+            if e.name.endswith(".faiss"):
+                count += 1
+                total += e.stat().st_size
+            elif e.name.endswith(".vecs.npy"):
+                raw += e.stat().st_size
+    return {("faiss",): total, ("rerank",): raw, ("count",): count}
+
+
+def _cache_stats() -> dict:
+    with _cache_lock:
+        entries = list(_cache.values())
+        mappings = list(_chunk_cache.values())
+    return {
+        ("entries",): len(entries),
+        ("bytes",): sum(stamp[2] for stamp, _, _ in entries),  # index file sizes
+        ("chunk_maps",): len(mappings),
+        ("chunk_map_bytes",): sum(stamp[2] for stamp, _ in mappings),  # _chunks.json sizes
+        ("capacity",): settings.VECTOR_INDEX_CACHE,
+    }
+
 
-def search(index, query_vec, k=3):
-    D, I = index.search(np.array([query_vec], dtype=np.float32), k)
-    return I[0], D[0]
\ No newline at end of file
+# Scanning vector_store/ on every scrape is too slow with many documents
+Gauge("studylm_vector_store_indexes", "Index files on disk: bytes (faiss), re-rank vector bytes (rerank) and number (count)", ("kind",), fn=cached(_store_sizes, 60))
+Gauge("studylm_index_cache", "Loaded-index LRU per process: entries, bytes (index files), parsed chunk mappings and capacity (VECTOR_INDEX_CACHE)", ("kind",), fn=_cache_stats)
@@ -0,0 +1,120 @@
+"""HTTP fetching and HTML-to-text for URL ingestion.
+
+One pooled ``requests.Session`` per process keeps connections alive, with at
+most URL_FETCH_PER_HOST connections to any host (extra fetches wait for a
+free connection). Fetches can be conditional (ETag / Last-Modified) so an
+unchanged page costs a 304. HTML is converted with selectolax or lxml when
+installed, otherwise BeautifulSoup.
+"""
+import re
+import threading
+from functools import lru_cache
+from typing import NamedTuple
+
+from .config import settings
+from .tracing import span
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class Page(NamedTuple):
+    status: int  # 200, or 304 when the validators sent still match
+    html: str
+    etag: str | None
+    last_modified: str | None
+
+
+def session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=max(1, settings.URL_FETCH_PER_HOST), pool_block=True)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers["User-Agent"] = "StudyLM/1.0"
+            _session = s
+    return _session
+
+
+def fetch(url: str, etag: str | None = None, last_modified: str | None = None) -> Page:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    with span("web.fetch", conditional=bool(headers)) as sp:
+        resp = session().get(url, headers=headers, timeout=settings.URL_FETCH_TIMEOUT)
+        if sp is not None:
+            sp.set(status=resp.status_code, bytes=len(resp.content))
+        if resp.status_code == 304:
+            return Page(304, "", etag, last_modified)
+        resp.raise_for_status()
+        return Page(resp.status_code, resp.text, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+
+
+def _selectolax(html: str) -> tuple[str | None, str]:
+    try:
+        from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    except ImportError:  # selectolax < 0.3.13
+        from selectolax.parser import HTMLParser
+
+    tree = HTMLParser(html)
+    t = tree.css_first("title")
+    title = t.text(strip=True) if t else None
+    for node in tree.css("script, style, noscript"):
+        node.decompose()
+    root = tree.body or tree.root
+    return title, root.text(separator="\n") if root else ""
+
+
+def _lxml(html: str) -> tuple[str | None, str]:
+    import lxml.html
+
+    doc = lxml.html.fromstring(html.encode("utf8"))
+    title = doc.findtext(".//title")
+    for el in doc.xpath("//script|//style|//noscript"):
+        el.drop_tree()
+    body = doc.find("body")
+    return (title.strip() if title else None), "\n".join((body if body is not None else doc).itertext())
+
+
+def _bs4(html: str) -> tuple[str | None, str]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    t = soup.find("title")
+    title = t.get_text(strip=True) if t else None
+    for tag in soup(["script", "style", "noscript"]):
+        tag.extract()
+    return title, soup.get_text("\n")
+
+
+@lru_cache(maxsize=1)
+def _extractors():
+    out = []
+    for name, fn in (("selectolax", _selectolax), ("lxml", _lxml)):
+        try:
+            __import__(name)
+            out.append(fn)
+        except ImportError:
+            pass
+    return out + [_bs4]
+
+
+def html_to_text(html: str) -> tuple[str | None, str]:
+    """(title, visible text) of an HTML page."""
+    with span("web.html_to_text", chars=len(html)):
+        for extract in _extractors():
+            try:
+                title, text = extract(html)
+                break
+            except Exception:
+                continue  # e.g. lxml on an empty document: try the next one
+        else:
+            title, text = None, ""
+    return title, re.sub(r"\n{2,}", "\n\n", (text or "").strip())
@@ -0,0 +1,91 @@
+"""Import-time budget for the backend (``python -X importtime -c "import main"``).
+
+Fails (exit 1) when importing ``main`` takes longer than ``--budget-ms``
+(median of ``--repeat`` fresh interpreters) or when any heavy/optional
+module that must load lazily shows up at import time. Run in CI and in the
+Docker build:
+
+    python -m benchmarks.bench_startup --budget-ms 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Loaded on first use or by the startup warm-up, never by ``import main``
+LAZY = (
+    "faiss", "fitz", "pymupdf", "tiktoken", "openai", "requests", "bs4",
+    "youtube_transcript_api", "pytesseract", "PIL", "pandas", "camelot",
+    "sentence_transformers", "onnxruntime", "torch", "selectolax", "lxml", "tesserocr",
+    "faster_whisper", "brotli",
+)
+
+
+def _importtime(cwd: str) -> tuple[float, dict[str, float]]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (str(BACKEND_DIR), env.get("PYTHONPATH")) if p)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import main failed:\n{proc.stderr[-2000:]}")
+    modules: dict[str, float] = {}
+    total = None
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        us = float(cumulative)
+        modules[name.rstrip()] = us / 1000.0  # keep indentation: depth in the tree
+        if name.strip() == "main":
+            total = us / 1000.0
+    if total is None:
+        raise SystemExit("no importtime entry for main")
+    return total, modules
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--budget-ms", type=float, default=1000.0)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10, help="slowest direct imports of main to list")
+    args = ap.parse_args(argv)
+
+    # Scratch cwd: the import must not depend on (or create) runtime directories
+    with tempfile.TemporaryDirectory(prefix="studylm-startup-") as cwd:
+        _importtime(cwd)  # warm .pyc caches
+        runs = [_importtime(cwd) for _ in range(max(1, args.repeat))]
+        leftovers = sorted(os.listdir(cwd))
+    median = statistics.median(t for t, _ in runs)
+    modules = runs[-1][1]
+    eager = sorted({name.strip() for name in modules if name.strip().split(".")[0] in LAZY})
+    # importtime indents two spaces per level below the top-level import
+    direct = sorted(
+        ((ms, name.strip()) for name, ms in modules.items() if len(name) - len(name.lstrip()) == 3),
+        reverse=True,
+    )
+
+    print(f"import main: median {median:.0f} ms over {len(runs)} runs (budget {args.budget_ms:.0f} ms)")
+    for ms, name in direct[: args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+    failed = False
+    if median > args.budget_ms:
+        print(f"FAIL: import time {median:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    if eager:
+        print(f"FAIL: imported eagerly (should be lazy): {', '.join(eager)}")
+        failed = True
+    if leftovers:
+        print(f"FAIL: import created files in the working directory: {', '.join(leftovers)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
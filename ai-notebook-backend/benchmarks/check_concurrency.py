@@ -0,0 +1,130 @@
+"""Lost-update check for multi-worker deployments.
+
+Starts ``--processes`` worker processes (like ``uvicorn --workers``), each
+running ``--threads`` client threads against the app in a shared scratch
+directory. Every thread interleaves ``attach_source``, ``add_fact`` and
+``ask_notebook`` on one notebook with unique payloads, then the final
+``notebooks.json`` is checked for every write. Exits 1 on any lost update.
+
+    python -m benchmarks.check_concurrency --processes 4 --threads 4 --ops 25
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _client(workdir: str):
+    os.chdir(workdir)
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    from fastapi.testclient import TestClient
+
+    from benchmarks import fakes
+
+    fakes.install()
+    import main
+
+    main._init_storage()
+    return TestClient(main.app)
+
+
+def _seed(workdir: str) -> str:
+    """Create the notebook plus one indexed source so asks do real retrieval."""
+    client = _client(workdir)
+    import main
+    from app.vector_store import build_index, save_index
+    from benchmarks.fakes import fake_embedding
+
+    chunks = [{"text": f"Entropy measures uncertainty, part {i}.", "page_start": 1, "page_end": 1} for i in range(8)]
+    save_index(build_index([fake_embedding(c["text"]) for c in chunks]), "seed")
+    (main.VECTORS_DIR / "seed_chunks.json").write_text(json.dumps(chunks), encoding="utf8")
+    main._write_stage("seed", "done")
+    nb_id = client.post("/notebooks", json={"title": "concurrency"}).json()["id"]
+    client.post(f"/notebooks/{nb_id}/sources", json={"file_id": "seed"})
+    return nb_id
+
+
+def _worker(workdir: str, nb_id: str, proc: int, threads: int, ops: int, errors) -> None:
+    client = _client(workdir)
+
+    def run(thread: int) -> None:
+        for i in range(ops):
+            tag = f"{proc}-{thread}-{i}"
+            calls = (
+                lambda: client.post(f"/notebooks/{nb_id}/sources", json={"file_id": f"src-{tag}"}),
+                lambda: client.post(f"/notebooks/{nb_id}/facts", json={"text": f"fact-{tag}"}),
+                lambda: client.post(f"/notebooks/{nb_id}/ask", json={"question": f"question-{tag}"}),
+            )
+            for call in calls:
+                r = call()
+                if r.status_code != 200:
+                    errors.put(f"{tag}: HTTP {r.status_code} {r.text[:200]}")
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run, range(threads)))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--processes", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--ops", type=int, default=25, help="rounds of attach/fact/ask per thread")
+    args = ap.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="studylm-concurrency-")
+    cwd = os.getcwd()
+    try:
+        ctx = mp.get_context("spawn")
+        seeder = ctx.Pool(1)
+        nb_id = seeder.apply(_seed, (workdir,))
+        seeder.close()
+        seeder.join()
+
+        errors = ctx.Queue()
+        start = time.perf_counter()
+        procs = [
+            ctx.Process(target=_worker, args=(workdir, nb_id, p, args.threads, args.ops, errors))
+            for p in range(args.processes)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        nb = json.loads((Path(workdir) / "notebooks.json").read_text(encoding="utf8"))[nb_id]
+        tags = [f"{p}-{t}-{i}" for p in range(args.processes) for t in range(args.threads) for i in range(args.ops)]
+        sources = set(nb.get("sources", []))
+        facts = {f["text"] for f in nb.get("facts", [])}
+        asked = {m["content"] for m in nb.get("chat_history", []) if m.get("role") == "user"}
+        lost = {
+            "attach_source": sum(f"src-{t}" not in sources for t in tags),
+            "add_fact": sum(f"fact-{t}" not in facts for t in tags),
+            "ask_notebook": sum(f"question-{t}" not in asked for t in tags),
+        }
+        failed = []
+        while not errors.empty():
+            failed.append(errors.get())
+        total = len(tags) * 3
+        print(f"{total} writes from {args.processes} processes x {args.threads} threads in {elapsed:.1f}s")
+        for op, n in lost.items():
+            print(f"  {op:<14} lost {n} of {len(tags)}")
+        for e in failed[:10]:
+            print(f"  error: {e}")
+        return 1 if any(lost.values()) or failed or any(p.exitcode for p in procs) else 0
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,120 @@
+"""Ingest correctness checks that need no upstream API or Tesseract.
+
+- Region OCR: a searchable scan (page image under an invisible OCR text
+  layer) must not be OCR'd again or have its text merged twice, while a
+  screenshot next to native text still is. Tesseract is replaced by a
+  recorder, so this checks which regions would be OCR'd, not recognition.
+- Table chunks: a row wider than MAX_CHUNK_TOKENS on its own (many cells,
+  and one very long cell) is split so every chunk fits the budget and no
+  cell text is lost.
+
+Exits 1 on any failure.
+
+    python -m benchmarks.check_ingest
+"""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+LINES = [f"Line {i}: the gradient of a convex loss points away from the minimum" for i in range(20)]
+
+
+def _image(page, rect) -> None:
+    import fitz
+
+    pix = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, int(rect.width * 2), int(rect.height * 2)), False)
+    pix.clear_with(200)
+    page.insert_image(rect, pixmap=pix)
+
+
+def _pdf(path: Path) -> None:
+    """Page 1: searchable scan. Page 2: scanned paragraph with its own OCR layer plus an uncovered screenshot."""
+    import fitz
+
+    doc = fitz.open()
+    scan = doc.new_page()
+    _image(scan, scan.rect)
+    for i, line in enumerate(LINES):
+        scan.insert_text((72, 72 + i * 30), line, render_mode=3)
+    mixed = doc.new_page()
+    mixed.insert_text((72, 60), "Slide title with native text above two pictures")
+    _image(mixed, fitz.Rect(72, 100, 520, 300))
+    mixed.insert_text((80, 150), "scanned paragraph already recognised", render_mode=3)
+    _image(mixed, fitz.Rect(72, 400, 520, 700))
+    doc.save(str(path))
+
+
+def check_regions(workdir: Path) -> list[str]:
+    from app import ocr, pdf_parser
+
+    calls = []
+
+    def recorder(samples, width, height, stride):
+        calls.append((width, height))
+        return "SCREENSHOT TEXT"
+
+    ocr._ocr_region, pdf_parser.ocr_available = recorder, lambda: True
+    path = workdir / "scan.pdf"
+    _pdf(path)
+    pages = pdf_parser.extract_text(str(path))
+    failures = []
+    if "ocr" in pages[0]:
+        failures.append(f"searchable scan was region-OCR'd: {pages[0]['ocr']}")
+    if any(pages[0]["text"].count(line) != 1 for line in LINES):
+        failures.append("searchable scan text is missing or duplicated")
+    if "SCREENSHOT TEXT" in pages[0]["text"]:
+        failures.append("OCR text merged into the searchable scan")
+    if pages[1].get("ocr", {}).get("regions") != 1 or pages[1]["text"].count("SCREENSHOT TEXT") != 1:
+        failures.append(f"page 2 should OCR only the uncovered screenshot: {pages[1].get('ocr')} {pages[1]['text']!r}")
+    if len(calls) != 1:
+        failures.append(f"expected 1 region OCR call, got {len(calls)}")
+    return failures
+
+
+def check_tables() -> list[str]:
+    from app import tables
+    from app.config import settings
+    from app.pdf_parser import get_encoder
+
+    encoder = get_encoder()
+    words = "eigenvalue decomposition of the covariance matrix".split()
+    header = [f"Column {i}" for i in range(120)]
+    wide = [" ".join(words[(i + j) % len(words)] for j in range(12)) for i in range(120)]
+    wide[7] = " ".join(words[j % len(words)] for j in range(5 * settings.MAX_CHUNK_TOKENS))
+    chunks = tables.to_chunks([{"page": 3, "rows": [header, ["a", "b"] + [""] * 118, wide, ["c", "d"] + [""] * 118]}])
+    failures = []
+    over = [len(encoder.encode(c["text"])) for c in chunks if len(encoder.encode(c["text"])) > settings.MAX_CHUNK_TOKENS]
+    if over:
+        failures.append(f"{len(over)} of {len(chunks)} chunks over MAX_CHUNK_TOKENS={settings.MAX_CHUNK_TOKENS}: {over}")
+    text = "\n".join(c["text"] for c in chunks)
+    missing = [i for i, cell in enumerate(wide) if i != 7 and cell not in text]
+    if missing:
+        failures.append(f"cells {missing} of the wide row are missing")
+    if sum(len(encoder.encode(c["text"])) for c in chunks) < 5 * settings.MAX_CHUNK_TOKENS:
+        failures.append("the very long cell was truncated instead of split")
+    return failures
+
+
+def main() -> int:
+    workdir = Path(tempfile.mkdtemp(prefix="studylm-check-ingest-"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ.update(OCR_ENABLED="1", OCR_REGIONS="1", OCR_CACHE_DIR="")
+    try:
+        sys.path.insert(0, str(BACKEND_DIR))
+        failures = [f"regions: {f}" for f in check_regions(workdir)]
+        failures += [f"tables: {f}" for f in check_tables()]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    for f in failures:
+        print(f"FAIL {f}")
+    print("ok" if not failures else f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
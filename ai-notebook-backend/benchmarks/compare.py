@@ -0,0 +1,47 @@
+"""Compare two benchmark JSON files and flag regressions.
+
+    python -m benchmarks.compare base.json head.json --threshold 0.15
+
+Exits 1 if any matching benchmark's p50 got slower by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def _key(rec: dict) -> str:
+    return rec["name"] + " " + json.dumps(rec.get("params", {}), sort_keys=True)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("base")
+    ap.add_argument("head")
+    ap.add_argument("--threshold", type=float, default=0.15, help="allowed relative p50 slowdown")
+    ap.add_argument("--metric", default="p50_ms")
+    args = ap.parse_args(argv)
+
+    with open(args.base, encoding="utf8") as f:
+        base = {_key(r): r for r in json.load(f)["results"]}
+    with open(args.head, encoding="utf8") as f:
+        head = {_key(r): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    for key in sorted(base.keys() & head.keys()):
+        b = base[key]["stats"][args.metric]
+        h = head[key]["stats"][args.metric]
+        change = (h - b) / b if b else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            flag = "  improved"
+        print(f"{key:<70} {b:>10.2f} -> {h:>10.2f} ms ({change:+.1%}){flag}")
+    for key in sorted(head.keys() - base.keys()):
+        print(f"{key:<70} (new)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Deterministic offline stand-ins for the OpenAI embedding, chat and audio APIs.
+
+Embeddings are hashed bag-of-words vectors (L2-normalised), so similar text
+gets similar vectors and retrieval behaves plausibly. Chat completions echo a
+fixed-length answer. Both can add a simulated network latency. Transcriptions
+turn the audio bytes into a short deterministic sentence.
+"""
+import hashlib
+import math
+import re
+import time
+from types import SimpleNamespace
+
+DIM = 1536  # same as text-embedding-3-small so index sizes are realistic
+_WORD = re.compile(r"\w+")
+_VOCAB = "entropy gradient lecture matrix proof theorem vector kernel sample model graph signal".split()
+
+
+def fake_embedding(text: str, dim: int = DIM) -> list[float]:
+    vec = [0.0] * dim
+    for w in _WORD.findall((text or "").lower()):
+        h = int.from_bytes(hashlib.blake2b(w.encode("utf8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class _Embeddings:
+    def __init__(self, latency_s: float) -> None:
+        self.latency_s = latency_s
+
+    def create(self, model: str, input, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        data = [SimpleNamespace(embedding=fake_embedding(t), index=i) for i, t in enumerate(texts)]
+        tokens = sum(len(_WORD.findall(t)) for t in texts)
+        return SimpleNamespace(data=data, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+class _Completions:
+    def __init__(self, latency_s: float) -> None:
+        self.latency_s = latency_s
+
+    def create(self, model: str, messages: list[dict], **kwargs):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        prompt = " ".join(str(m.get("content") or "") for m in messages)
+        digest = hashlib.sha1(prompt.encode("utf8")).hexdigest()[:12]
+        answer = f"Deterministic answer {digest}."
+        prompt_tokens = len(_WORD.findall(prompt))
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=4, total_tokens=prompt_tokens + 4)
+        msg = SimpleNamespace(role="assistant", content=answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=msg, index=0)], usage=usage)
+
+
+class _Transcriptions:
+    def create(self, model: str, file, **kwargs):
+        # Deterministic "speech" derived from the audio bytes
+        digest = hashlib.sha1(file.read()).hexdigest()
+        words = [_VOCAB[int(digest[i:i + 2], 16) % len(_VOCAB)] for i in range(0, 24, 2)]
+        return "Transcript " + " ".join(words) + "."
+
+
+class FakeOpenAI:
+    """Drop-in for ``openai.OpenAI`` covering the calls the backend makes."""
+
+    embed_latency_s = 0.0
+    chat_latency_s = 0.0
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.embeddings = _Embeddings(self.embed_latency_s)
+        self.chat = SimpleNamespace(completions=_Completions(self.chat_latency_s))
+        self.audio = SimpleNamespace(transcriptions=_Transcriptions())
+
+
+def install(embed_latency_ms: float = 0.0, chat_latency_ms: float = 0.0) -> None:
+    """Route the backend's OpenAI usage to the fakes (call before timing)."""
+    from app import embeddings
+    from app.config import settings
+
+    FakeOpenAI.embed_latency_s = embed_latency_ms / 1000.0
+    FakeOpenAI.chat_latency_s = chat_latency_ms / 1000.0
+    settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or "offline-benchmark"
+    # Measure our code, not the rate limiter throttling a backend that has no limits
+    settings.UPSTREAM_RPM = settings.UPSTREAM_TPM = 10**9
+    settings.UPSTREAM_MODEL_LIMITS = {}
+    embeddings.OpenAI = FakeOpenAI
+
+    import main
+
+    main._openai_client = lambda: FakeOpenAI()
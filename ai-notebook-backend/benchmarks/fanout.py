@@ -0,0 +1,89 @@
+"""Notebook retrieval latency vs number of sources: sequential vs thread fan-out.
+
+Builds ``--chunks`` synthetic chunks per source in a scratch workspace, then
+times ``main._search_sources`` (load index + chunk map + search, merged) for a
+notebook of each size with ``SEARCH_FANOUT_THREADS=1`` and with ``--threads``.
+``--cold`` drops the per-process index and chunk-map caches before every query.
+
+    python -m benchmarks.fanout --sources 1,10,50,200 --threads 8
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sources", default="1,10,50,200")
+    ap.add_argument("--chunks", type=int, default=300, help="chunks per source")
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--queries", type=int, default=20)
+    ap.add_argument("--cold", action="store_true", help="clear the index and chunk-map caches before each query")
+    args = ap.parse_args(argv)
+    counts = [int(n) for n in args.sources.split(",") if n]
+
+    workdir = Path(tempfile.mkdtemp(prefix="studylm-fanout-"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ.setdefault("VECTOR_INDEX_CACHE", str(max(counts) + 1))
+    try:
+        sys.path.insert(0, str(BACKEND_DIR))
+        import numpy as np
+
+        from benchmarks import fakes
+
+        fakes.install()
+        import main
+        from app import vector_store
+        from app.config import settings
+        from app.vector_store import build_index, save_index
+
+        main._init_storage()
+        rng = np.random.default_rng(0)
+        sources = [f"src-{i}" for i in range(max(counts))]
+        for fid in sources:
+            x = rng.standard_normal((args.chunks, args.dim), dtype=np.float32)
+            chunks = main._with_chunk_ids(
+                [{"text": f"{fid} passage {j}", "page_start": 1, "page_end": 1} for j in range(args.chunks)]
+            )
+            save_index(build_index(x), fid)
+            main._write_chunks(main.VECTORS_DIR / f"{fid}_chunks.json", chunks)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32).tolist()
+        print(f"{args.chunks} chunks x dim {args.dim} per source, {args.queries} queries, {'cold' if args.cold else 'warm'} cache")
+
+        for n in counts:
+            row = {}
+            for threads in (1, args.threads):
+                settings.SEARCH_FANOUT_THREADS = threads
+                main._search_sources(sources[:n], queries[0], limit=6)  # warm
+                samples = []
+                for q in queries:
+                    if args.cold:
+                        vector_store._cache.clear()
+                        vector_store._chunk_cache.clear()
+                    t = time.perf_counter()
+                    main._search_sources(sources[:n], q, limit=6)
+                    samples.append((time.perf_counter() - t) * 1000)
+                samples.sort()
+                row[threads] = (statistics.median(samples), samples[int(0.95 * (len(samples) - 1))])
+            seq, par = row[1], row[args.threads]
+            print(
+                f"sources={n:<4} sequential p50={seq[0]:8.2f}ms p95={seq[1]:8.2f}ms  "
+                f"{args.threads} threads p50={par[0]:8.2f}ms p95={par[1]:8.2f}ms  speedup={seq[0] / par[0]:.1f}x"
+            )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,112 @@
+"""Resident memory of N worker processes sharing one large index: copy vs mmap.
+
+Builds a synthetic index in a scratch vector store, then for each mode starts
+``--workers`` processes that load it through ``load_index`` and run searches.
+While all workers are alive each reports load time, RSS and PSS (proportional
+set size: shared pages are split between the processes mapping them), so the
+total PSS is the real memory cost of the fleet. Linux only (reads /proc).
+
+    python -m benchmarks.mmap_rss --vectors 100000 --dim 1536 --workers 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+MODES = {"copy": "-1", "mmap": "0"}  # VECTOR_MMAP_MIN_MB per mode
+
+
+def _mem_mb() -> dict:
+    out = {}
+    with open("/proc/self/smaps_rollup", encoding="utf8") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in {"Rss", "Pss"}:
+                out[key.lower() + "_mb"] = round(int(rest.split()[0]) / 1024, 1)
+    return out
+
+
+def _worker(store: str, mmap_min_mb: str, queries: int, dim: int, barrier, results) -> None:
+    os.environ["VECTOR_STORE_DIR"] = store
+    os.environ["VECTOR_MMAP_MIN_MB"] = mmap_min_mb
+    import numpy as np
+
+    from app.vector_store import load_index, search
+
+    base = _mem_mb()
+    t = time.perf_counter()
+    idx = load_index("bench", model="bench")
+    load_ms = (time.perf_counter() - t) * 1000
+    after_load = _mem_mb()
+    rng = np.random.default_rng(os.getpid())
+    t = time.perf_counter()
+    for _ in range(queries):
+        search(idx, rng.standard_normal(dim).astype(np.float32), 5)
+    search_ms = (time.perf_counter() - t) * 1000 / max(1, queries)
+    barrier.wait()  # every worker holds the index now
+    mem = _mem_mb()
+    results.put({
+        "load_ms": load_ms,
+        "search_ms": search_ms,
+        "rss_after_load_mb": round(after_load["rss_mb"] - base["rss_mb"], 1),
+        "rss_mb": round(mem["rss_mb"] - base["rss_mb"], 1),
+        "pss_mb": round(mem["pss_mb"] - base["pss_mb"], 1),
+    })
+    barrier.wait()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--vectors", type=int, default=100000)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--queries", type=int, default=20)
+    ap.add_argument("--quantization", default="none")
+    args = ap.parse_args(argv)
+
+    scratch = Path(tempfile.mkdtemp(prefix="studylm-mmap-"))
+    store = scratch / "vector_store"
+    os.environ["VECTOR_STORE_DIR"] = str(store)
+    try:
+        import numpy as np
+
+        from app.vector_store import build_index, save_index
+
+        x = np.random.default_rng(0).standard_normal((args.vectors, args.dim), dtype=np.float32)
+        x /= np.linalg.norm(x, axis=1, keepdims=True)
+        save_index(build_index(x, quantization=args.quantization, dim=0, rerank=False), "bench", model="bench")
+        del x
+        size_mb = (store / "bench.faiss").stat().st_size / 1024 / 1024
+        print(f"index: {args.vectors} x {args.dim} {args.quantization}, {size_mb:.1f} MB on disk, {args.workers} workers")
+
+        ctx = mp.get_context("spawn")
+        for mode, min_mb in MODES.items():
+            barrier = ctx.Barrier(args.workers)
+            results = ctx.Queue()
+            procs = [
+                ctx.Process(target=_worker, args=(str(store), min_mb, args.queries, args.dim, barrier, results))
+                for _ in range(args.workers)
+            ]
+            for p in procs:
+                p.start()
+            rows = [results.get(timeout=600) for _ in procs]
+            for p in procs:
+                p.join()
+            print(
+                f"{mode:<5} load p50={statistics.median(r['load_ms'] for r in rows):8.1f}ms  "
+                f"search={statistics.fmean(r['search_ms'] for r in rows):7.2f}ms  "
+                f"RSS after load/worker={statistics.fmean(r['rss_after_load_mb'] for r in rows):7.1f}MB  "
+                f"RSS/worker={statistics.fmean(r['rss_mb'] for r in rows):7.1f}MB  "
+                f"PSS total={sum(r['pss_mb'] for r in rows):7.1f}MB"
+            )
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
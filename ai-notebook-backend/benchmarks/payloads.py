@@ -0,0 +1,155 @@
+"""Response payloads: serialization time and wire size of large JSON endpoints.
+
+Builds a notebook with ``--history`` chat entries (every answer carrying
+``--citations`` citations) and a files-meta map of ``--files`` entries, then
+reports, per payload:
+
+- render time of FastAPI's old path (``jsonable_encoder`` + stdlib ``json``)
+  vs ``app.responses.dumps`` (orjson when installed);
+- raw, gzip and brotli (when installed) sizes and compression times;
+- end-to-end ``GET /notebooks/{id}`` and ``GET /files-meta`` through the app,
+  with and without ``Accept-Encoding``.
+
+    python -m benchmarks.payloads --history 1000 --citations 6
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+WORDS = "the lecture derives gradient descent updates for convex losses and compares step sizes on page".split()
+
+
+def _text(rng, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def make_notebook(history: int, citations: int, seed: int = 0) -> dict:
+    import random
+
+    rng = random.Random(seed)
+    sources = [f"{i:032x}" for i in range(12)]
+    chat = []
+    for i in range(history // 2):
+        ts = 1_700_000_000 + i * 60
+        chat.append({"role": "user", "content": _text(rng, 18) + "?", "ts": ts})
+        cites = []
+        for j in range(citations):
+            fid = rng.choice(sources)
+            page = rng.randint(1, 300)
+            cites.append({
+                "file_id": fid, "chunk_id": rng.randint(0, 900), "kind": "text",
+                "page_start": page, "page_end": page + rng.randint(0, 1),
+                "preview": _text(rng, 40)[:240], "url": f"/uploads/{fid}.pdf?v={fid[:16]}#page={page}",
+            })
+        chat.append({"role": "assistant", "content": _text(rng, 120), "ts": ts + 2, "citations": cites})
+    if history % 2:
+        chat.append({"role": "user", "content": _text(rng, 18) + "?", "ts": 1_700_000_000 + history * 60})
+    return {
+        "id": "nb-bench", "title": "Benchmark notebook", "sources": sources,
+        "notes": [{"id": f"n{i}", "text": _text(rng, 60), "ts": 1_700_000_000 + i} for i in range(20)],
+        "chat_history": chat, "settings": {"chat_model": "gpt-4o-mini", "temperature": 0.2},
+        "created_at": 1_700_000_000, "updated_at": 1_700_000_000 + history * 60,
+    }
+
+
+def make_files_meta(files: int) -> dict:
+    return {f"{i:032x}": {"label": f"Week {i % 14}", "title": f"Lecture {i}", "pages": 40 + i % 200} for i in range(files)}
+
+
+def _time_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    return statistics.median(samples)
+
+
+def _report(name: str, obj, repeat: int) -> None:
+    from fastapi.encoders import jsonable_encoder
+
+    from app.responses import brotli_module, dumps, orjson
+
+    raw = dumps(obj)
+    old_ms = _time_ms(lambda: json.dumps(jsonable_encoder(obj), ensure_ascii=False, allow_nan=False, separators=(",", ":")), repeat)
+    stdlib_ms = _time_ms(lambda: json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")), repeat)
+    new_ms = _time_ms(lambda: dumps(obj), repeat)
+    print(f"{name}: {len(raw) / 1024:,.0f} KiB raw")
+    print(f"  serialize  jsonable_encoder+json {old_ms:8.2f} ms   json {stdlib_ms:8.2f} ms   "
+          f"{'orjson' if orjson else 'json (orjson missing)'} {new_ms:8.2f} ms   speedup {old_ms / new_ms:5.1f}x")
+    for level in (1, 5, 9):
+        size = len(gzip.compress(raw, compresslevel=level, mtime=0))
+        ms = _time_ms(lambda: gzip.compress(raw, compresslevel=level, mtime=0), repeat)
+        print(f"  gzip -{level}    {size / 1024:8.0f} KiB ({size / len(raw):5.1%})  {ms:8.2f} ms")
+    brotli = brotli_module()
+    if brotli is None:
+        print("  brotli     not installed (pip install brotli)")
+    else:
+        for quality in (1, 4, 11):
+            size = len(brotli.compress(raw, quality=quality))
+            ms = _time_ms(lambda: brotli.compress(raw, quality=quality), repeat)
+            print(f"  br q{quality:<2}      {size / 1024:8.0f} KiB ({size / len(raw):5.1%})  {ms:8.2f} ms")
+
+
+def _endpoint(client, path: str, repeat: int) -> None:
+    for encoding in ("identity", "gzip", "br"):
+        sizes = []
+
+        def get():
+            r = client.get(path, headers={"accept-encoding": encoding})
+            r.raise_for_status()
+            sizes.append((r.headers.get("content-encoding", "identity"), int(r.headers.get("content-length") or len(r.content))))
+
+        ms = _time_ms(get, repeat)
+        coding, size = sizes[-1]
+        print(f"  GET {path:<22} accept {encoding:<8} -> {coding:<8} {size / 1024:8.0f} KiB  p50 {ms:8.2f} ms")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--history", type=int, default=1000, help="chat_history entries (user + assistant)")
+    ap.add_argument("--citations", type=int, default=6, help="citations per assistant answer")
+    ap.add_argument("--files", type=int, default=2000, help="entries in files-meta")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="studylm-payloads-"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        sys.path.insert(0, str(BACKEND_DIR))
+        from benchmarks import fakes
+
+        fakes.install()
+        import main
+        from app import db
+        from fastapi.testclient import TestClient
+
+        main._init_storage()
+        nb = make_notebook(args.history, args.citations)
+        meta = make_files_meta(args.files)
+        db.save_notebooks({nb["id"]: nb})
+        db.save_files_meta(meta)
+
+        _report(f"notebook ({args.history} history entries, {args.citations} citations/answer)", nb, args.repeat)
+        _report(f"files-meta ({args.files} files)", {"files": meta}, args.repeat)
+        print("through the app (TestClient, includes notebook store read):")
+        with TestClient(main.app) as client:
+            _endpoint(client, f"/notebooks/{nb['id']}", args.repeat)
+            _endpoint(client, "/files-meta", args.repeat)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Synthetic, reproducible PDFs shaped like lecture material.
+
+- ``text``: native text pages (headings + paragraphs), the common case.
+- ``scanned``: the same content rasterised to image-only pages, which forces
+  the OCR path.
+Files are cached under ``benchmarks/.cache`` keyed by kind/pages/seed.
+"""
+import random
+from pathlib import Path
+
+import fitz
+
+CACHE_DIR = Path(__file__).resolve().parent / ".cache"
+
+_WORDS = (
+    "algorithm analysis approximation array asymptotic bayesian binary boundary cache calculus "
+    "classification cluster complexity compiler concurrency convergence corpus derivative "
+    "distribution dynamic eigenvalue entropy estimator evaluation feature function gradient graph "
+    "hash heuristic hypothesis inference integral invariant kernel lattice linear logarithm matrix "
+    "memory model network normal optimisation parameter partition polynomial probability proof "
+    "protocol queue recursion regression sample scheduler semantics sequence signal sorting "
+    "spectrum statistic stochastic structure symbol theorem throughput topology transform tree "
+    "variance vector"
+).split()
+
+
+def _page_text(rng: random.Random, page_no: int) -> str:
+    title = " ".join(rng.choice(_WORDS).capitalize() for _ in range(3))
+    paras = []
+    for _ in range(rng.randint(3, 6)):
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 18))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        paras.append(" ".join(sentences))
+    return f"Lecture {page_no}: {title}\n\n" + "\n\n".join(paras)
+
+
+def make_pdf(kind: str, pages: int, seed: int = 0) -> Path:
+    if kind not in {"text", "scanned"}:
+        raise ValueError(f"unknown kind {kind!r}")
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    out = CACHE_DIR / f"{kind}-{pages}p-s{seed}.pdf"
+    if out.exists():
+        return out
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for i in range(1, pages + 1):
+        text = _page_text(rng, i)
+        page = doc.new_page()  # A4-ish default
+        rect = page.rect + (50, 50, -50, -50)
+        page.insert_textbox(rect, text, fontsize=10)
+        if kind == "scanned":
+            # Rasterise and replace the page with the bitmap only (no text layer)
+            pix = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY)
+            doc.delete_page(-1)
+            page = doc.new_page(width=pix.width * 72 / 150, height=pix.height * 72 / 150)
+            page.insert_image(page.rect, pixmap=pix)
+    doc.save(out, garbage=3, deflate=True)
+    doc.close()
+    return out
@@ -0,0 +1,117 @@
+"""Memory vs recall trade-offs of index compression on your own corpora.
+
+Reads the vectors behind existing indexes (``{id}.vecs.npy`` when present,
+otherwise reconstructed from uncompressed ``.faiss`` files), rebuilds each
+document's index per configuration and measures recall@k against exact
+search. Chunk vectors double as queries (the self-match is ignored).
+
+    python -m benchmarks.quantization --vector-store vector_store --dims 256,512 --k 5
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.config import settings
+from app.vector_store import QUANTIZATIONS, VectorIndex, build_index, search
+
+
+def _load_corpus(store: Path, limit: int) -> list[np.ndarray]:
+    docs = []
+    for p in sorted(store.glob("*.faiss")):
+        raw = p.with_name(f"{p.stem}.vecs.npy")
+        idx = faiss.read_index(str(p))
+        base = idx
+        if isinstance(idx, faiss.IndexIDMap2):
+            base = faiss.downcast_index(idx.index)
+        if raw.exists():
+            x = np.load(raw)
+            if base is not idx:
+                x = x[faiss.vector_to_array(idx.id_map)]  # live chunk ids only
+        elif isinstance(base, faiss.IndexFlat):
+            x = base.reconstruct_n(0, base.ntotal)
+        else:
+            continue  # lossy index without originals: no ground truth
+        if len(x) >= 3:
+            docs.append(np.asarray(x, dtype=np.float32))
+        if limit and len(docs) >= limit:
+            break
+    return docs
+
+
+def _evaluate(docs: list[np.ndarray], quantization: str, dim: int, k: int, queries: int, rng) -> dict:
+    index_bytes = raw_bytes = 0
+    recall, recall_rr, lat, lat_rr = [], [], [], []
+    for x in docs:
+        vi = build_index(x, quantization=quantization, dim=dim, rerank=True)
+        index_bytes += faiss.serialize_index(vi.index).nbytes
+        plain = VectorIndex(vi.index, vi.full_dim, vi.quantization)
+        if vi.vectors is not None:
+            raw_bytes += vi.vectors.nbytes
+        kk = min(k, len(x) - 1)
+        for qi in rng.choice(len(x), size=min(queries, len(x)), replace=False):
+            exact = x @ x[qi]
+            exact[qi] = -np.inf
+            truth = set(np.argsort(-exact)[:kk].tolist())
+            for target, samples, idx in ((recall, lat, plain), (recall_rr, lat_rr, vi if vi.vectors is not None else plain)):
+                t = time.perf_counter()
+                ids, _ = search(idx, x[qi], kk + 1)
+                samples.append(time.perf_counter() - t)
+                got = [i for i in ids.tolist() if i != qi and i >= 0][:kk]
+                target.append(len(truth.intersection(got)) / kk)
+    n = sum(len(x) for x in docs)
+    return {
+        "quantization": quantization,
+        "dim": dim or int(docs[0].shape[1]),
+        "vectors": n,
+        "index_bytes": index_bytes,
+        "bytes_per_vector": round(index_bytes / n, 1),
+        "rerank_bytes": raw_bytes,
+        f"recall@{k}": round(statistics.fmean(recall), 4),
+        f"recall@{k}_rerank": round(statistics.fmean(recall_rr), 4),
+        "search_p50_ms": round(statistics.median(lat) * 1000, 3),
+        "search_rerank_p50_ms": round(statistics.median(lat_rr) * 1000, 3),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--vector-store", default=settings.VECTOR_STORE_DIR)
+    ap.add_argument("--quantizations", default=",".join(QUANTIZATIONS))
+    ap.add_argument("--dims", default="", help="Matryoshka truncations to try besides the full dimension, e.g. 256,512")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=20, help="queries per document")
+    ap.add_argument("--rerank-factor", type=int, default=settings.VECTOR_RERANK_FACTOR)
+    ap.add_argument("--limit-docs", type=int, default=0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="", help="optional JSON output path")
+    args = ap.parse_args(argv)
+    settings.VECTOR_RERANK_FACTOR = args.rerank_factor
+
+    docs = _load_corpus(Path(args.vector_store), args.limit_docs)
+    if not docs:
+        ap.error(f"no usable indexes in {args.vector_store}")
+    print(f"{len(docs)} documents, {sum(len(x) for x in docs)} vectors, dim {docs[0].shape[1]}")
+    dims = [0] + [int(d) for d in args.dims.split(",") if d]
+    rows = []
+    for dim in dims:
+        for q in [q.strip() for q in args.quantizations.split(",") if q.strip()]:
+            rng = np.random.default_rng(args.seed)
+            row = _evaluate(docs, q, dim, args.k, args.queries, rng)
+            rows.append(row)
+            print(
+                f"{q:<5} dim={row['dim']:<5} {row['bytes_per_vector']:>8.1f} B/vec (+{row['rerank_bytes'] / row['vectors']:.0f} rerank)  "
+                f"recall@{args.k}={row[f'recall@{args.k}']:.3f}  rerank={row[f'recall@{args.k}_rerank']:.3f}  "
+                f"p50={row['search_p50_ms']:.3f}ms/{row['search_rerank_p50_ms']:.3f}ms"
+            )
+    if args.out:
+        Path(args.out).write_text(json.dumps({"args": vars(args), "results": rows}, indent=2), encoding="utf8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,258 @@
+"""Offline benchmark suite for the ingest and query hot paths.
+
+Runs against a throwaway working directory with deterministic fake
+OpenAI backends, so no network or API key is needed:
+
+    python -m benchmarks.run --pages 10,200 --out bench.json
+    python -m benchmarks.run --suites ask,notebook_ask --concurrency 1,8
+    python -m benchmarks.compare base.json bench.json
+
+Results are JSON (one record per benchmark/parameter set with latency
+percentiles in ms and throughput) so runs can be diffed between commits.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SUITES = ("extract_text", "chunk_text", "index", "process_pdf", "ask", "notebook_ask")
+
+
+def _stats(samples: list[float]) -> dict:
+    ms = sorted(s * 1000.0 for s in samples)
+    p95 = ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))]
+    return {
+        "n": len(ms),
+        "min_ms": round(ms[0], 3),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(p95, 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def _timeit(fn, repeat: int, warmup: int = 1) -> list[float]:
+    for _ in range(warmup):
+        fn()
+    out = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t)
+    return out
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+class Suite:
+    def __init__(self, args) -> None:
+        self.args = args
+        self.results: list[dict] = []
+
+    def record(self, name: str, params: dict, samples: list[float], **extra) -> None:
+        rec = {"name": name, "params": params, "stats": _stats(samples), **extra}
+        self.results.append(rec)
+        print(f"{name:<14} {json.dumps(params, sort_keys=True):<48} p50={rec['stats']['p50_ms']:.2f}ms p95={rec['stats']['p95_ms']:.2f}ms")
+
+    # --- component benchmarks ---
+    def extract_text(self, pdf: Path, params: dict) -> list[dict]:
+        from app.pdf_parser import extract_text
+
+        pages = extract_text(str(pdf))
+        samples = _timeit(lambda: extract_text(str(pdf)), self.args.repeat, warmup=0)
+        ocr_chars = sum(len(p["text"]) for p in pages)
+        self.record("extract_text", params, samples, pages_per_s=round(params["pages"] / statistics.median(samples), 1), text_chars=ocr_chars)
+        return pages
+
+    def chunk_text(self, pages: list[dict], params: dict) -> list[dict]:
+        from app.pdf_parser import chunk_text
+
+        chunks = chunk_text(pages)
+        samples = _timeit(lambda: chunk_text(pages), self.args.repeat, warmup=0)
+        self.record("chunk_text", params, samples, chunks=len(chunks))
+        return chunks
+
+    def index(self, chunks: list[dict], params: dict) -> None:
+        from app.vector_store import build_index, search
+        from benchmarks.fakes import fake_embedding
+
+        if not chunks:
+            return
+        vecs = [fake_embedding(c["text"]) for c in chunks]
+        samples = _timeit(lambda: build_index(vecs), self.args.repeat)
+        self.record("build_index", params, samples, vectors=len(vecs))
+        idx = build_index(vecs)
+        queries = [fake_embedding(c["text"][:200]) for c in chunks[: max(1, min(len(chunks), 50))]]
+        it = iter(queries * (self.args.repeat * 4 // len(queries) + 2))
+        samples = _timeit(lambda: search(idx, next(it)), self.args.repeat * 4)
+        self.record("search", params, samples, vectors=len(vecs))
+
+    def process_pdf(self, pdf: Path, params: dict) -> str:
+        import main
+
+        samples = []
+        file_id = ""
+        for _ in range(max(1, self.args.repeat // 2)):
+            file_id = f"bench-{uuid.uuid4()}"
+            dest = main.UPLOADS_DIR / f"{file_id}.pdf"
+            shutil.copyfile(pdf, dest)
+            t = time.perf_counter()
+            main.process_pdf(dest, file_id)
+            samples.append(time.perf_counter() - t)
+            if main._read_stage(file_id) != "done":
+                err = main.VECTORS_DIR / f"{file_id}.error.txt"
+                raise RuntimeError(f"process_pdf failed: {err.read_text() if err.exists() else 'unknown'}")
+        self.record("process_pdf", params, samples, pages_per_s=round(params["pages"] / statistics.median(samples), 1))
+        return file_id
+
+    # --- end-to-end benchmarks ---
+    def _load(self, name: str, params: dict, call, total: int, concurrency: int) -> None:
+        def one(_):
+            t = time.perf_counter()
+            r = call()
+            if r.status_code != 200:
+                raise RuntimeError(f"{name}: HTTP {r.status_code} {r.text[:200]}")
+            return time.perf_counter() - t
+
+        call()  # warm caches
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(one, range(total)))
+        wall = time.perf_counter() - start
+        self.record(name, {**params, "concurrency": concurrency}, samples, throughput_rps=round(total / wall, 2))
+
+    def ask(self, client, file_id: str, params: dict) -> None:
+        qs = iter(range(10**9))
+        for c in self.args.concurrency:
+            self._load(
+                "ask",
+                params,
+                lambda: client.post("/ask", json={"file_id": file_id, "question": f"What is gradient {next(qs)}?"}),
+                self.args.requests,
+                c,
+            )
+
+    def notebook_ask(self, client, file_ids: list[str], params: dict) -> None:
+        nb_id = client.post("/notebooks", json={"title": "bench"}).json()["id"]
+        for fid in file_ids:
+            client.post(f"/notebooks/{nb_id}/sources", json={"file_id": fid})
+        qs = iter(range(10**9))
+        for c in self.args.concurrency:
+            self._load(
+                "notebook_ask",
+                {**params, "sources": len(file_ids)},
+                lambda: client.post(f"/notebooks/{nb_id}/ask", json={"question": f"Explain entropy {next(qs)}"}),
+                self.args.requests,
+                c,
+            )
+
+
+def main_cli(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--suites", default=",".join(SUITES), help=f"comma list of {', '.join(SUITES)}")
+    ap.add_argument("--kinds", default="text,scanned", help="PDF kinds: text,scanned")
+    ap.add_argument("--pages", default="10,100", help="page counts, e.g. 10,100,500,2000")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--requests", type=int, default=50, help="requests per end-to-end load run")
+    ap.add_argument("--concurrency", default="1,8", help="client concurrency levels for ask suites")
+    ap.add_argument("--embed-latency-ms", type=float, default=0.0, help="simulated embeddings API latency")
+    ap.add_argument("--chat-latency-ms", type=float, default=0.0, help="simulated chat API latency")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="bench.json")
+    args = ap.parse_args(argv)
+    args.concurrency = [int(x) for x in args.concurrency.split(",") if x]
+    suites = {s.strip() for s in args.suites.split(",") if s.strip()}
+    unknown = suites - set(SUITES)
+    if unknown:
+        ap.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    out_path = Path(args.out).resolve()
+
+    # Generate inputs before switching into the scratch workspace
+    sys.path.insert(0, str(BACKEND_DIR))
+    from benchmarks.pdfs import make_pdf
+
+    kinds = [k for k in args.kinds.split(",") if k]
+    page_counts = [int(p) for p in args.pages.split(",") if p]
+    pdfs = {(k, n): make_pdf(k, n, args.seed) for k in kinds for n in page_counts}
+
+    workdir = Path(tempfile.mkdtemp(prefix="studylm-bench-"))
+    os.chdir(workdir)  # uploads/, vector_store/ and *.json land here
+    try:
+        from benchmarks import fakes
+
+        fakes.install(args.embed_latency_ms, args.chat_latency_ms)
+        import main
+
+        main._init_storage()  # what the app's startup hook does
+        suite = Suite(args)
+        from app.pdf_parser import ocr_available
+
+        ocr_ok = ocr_available()
+        ready_ids: list[str] = []
+        for (kind, n), pdf in pdfs.items():
+            params = {"kind": kind, "pages": n}
+            pages = None
+            if suites & {"extract_text", "chunk_text", "index"}:
+                pages = suite.extract_text(pdf, params) if "extract_text" in suites else None
+                if pages is None:
+                    from app.pdf_parser import extract_text
+
+                    pages = extract_text(str(pdf))
+                chunks = suite.chunk_text(pages, params) if "chunk_text" in suites or "index" in suites else []
+                if "index" in suites:
+                    suite.index(chunks, params)
+            if suites & {"process_pdf", "ask", "notebook_ask"}:
+                if kind == "scanned" and not ocr_ok:
+                    continue  # nothing to index without Tesseract
+                ready_ids.append(suite.process_pdf(pdf, params))
+
+        if ready_ids and suites & {"ask", "notebook_ask"}:
+            from fastapi.testclient import TestClient
+
+            import main
+
+            client = TestClient(main.app)
+            if "ask" in suites:
+                suite.ask(client, ready_ids[-1], {})
+            if "notebook_ask" in suites:
+                suite.notebook_ask(client, ready_ids, {})
+
+        doc = {
+            "meta": {
+                "git_rev": _git_rev(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "ocr_available": ocr_ok,
+                "args": {k: v for k, v in vars(args).items() if k != "out"},
+            },
+            "results": suite.results,
+        }
+        out_path.write_text(json.dumps(doc, indent=2), encoding="utf8")
+        print(f"Wrote {len(suite.results)} results to {out_path}")
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
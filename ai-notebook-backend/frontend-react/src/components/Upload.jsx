@@ -27,11 +27,46 @@ export function Upload({ base = '', onUpload, refreshFiles, toast }) {
   const stopPoller = (id) => {
     const t = pollersRef.current[id]
     if (t) {
-      clearTimeout(t)
+      if (typeof t.close === 'function') t.close()
+      else clearTimeout(t)
       delete pollersRef.current[id]
     }
   }
 
+  // "embedding 40/60 · ~3s left" from a progress event
+  const progressText = (ev) => {
+    const counts = {
+      parsing: [ev.pages_done, ev.pages_total],
+      transcribing: [ev.segments_done, ev.segments_total],
+      embedding: [ev.chunks_embedded, ev.chunks_total],
+    }[ev.stage]
+    let text = ev.stage || ''
+    if (counts && counts[1]) text += ` ${counts[0] || 0}/${counts[1]}`
+    if (ev.eta_s) text += ` · ~${Math.ceil(ev.eta_s)}s left`
+    return text
+  }
+
+  // Follow ingest progress pushed by the backend; fall back to polling /status
+  const watchProgress = (fid) => {
+    if (typeof EventSource === 'undefined') return pollStatusOnce(fid, 0)
+    const es = new EventSource(`${base}/events?file_id=${encodeURIComponent(fid)}`)
+    pollersRef.current[fid] = es
+    es.addEventListener('progress', (msg) => {
+      const ev = JSON.parse(msg.data)
+      const status = ev.stage === 'done' ? 'success' : ev.stage === 'error' ? 'error' : null
+      setUploadedFiles(prev => prev.map(f => (
+        f.id === fid ? { ...f, stage: progressText(ev), status: status || f.status } : f
+      )))
+      if (status) stopPoller(fid)
+    })
+    es.onerror = () => {
+      // the stream ends after the final event; anything earlier is a dropped connection
+      if (pollersRef.current[fid] !== es) return
+      stopPoller(fid)
+      pollStatusOnce(fid, 0)
+    }
+  }
+
   const pollStatusOnce = async (fid, attempt = 0) => {
     try {
       const res = await fetch(`${base}/status/${fid}`)
@@ -62,8 +97,8 @@ export function Upload({ base = '', onUpload, refreshFiles, toast }) {
 
   useEffect(() => {
     return () => {
-      // cleanup any pending timers on unmount
-      Object.values(pollersRef.current).forEach((t) => clearTimeout(t))
+      // cleanup any pending timers and streams on unmount
+      Object.values(pollersRef.current).forEach((t) => (typeof t.close === 'function' ? t.close() : clearTimeout(t)))
       pollersRef.current = {}
     }
   }, [])
@@ -120,8 +155,8 @@ export function Upload({ base = '', onUpload, refreshFiles, toast }) {
           stage: 'parsing'
         }])
 
-        // begin polling status for this file until ready
-        pollStatusOnce(result.file_id, 0)
+        // follow progress for this file until ready
+        watchProgress(result.file_id)
 
         if (onUpload) onUpload(result.file_id)
         toast?.success(`${file.name} uploaded successfully`)
@@ -380,8 +415,8 @@ export function Upload({ base = '', onUpload, refreshFiles, toast }) {
                 const data = await res.json()
                 const fid = data.file_id
                 setUploadedFiles(prev => [...prev, { id: fid, name: url, size: 0, status: 'indexing', stage: 'parsing' }])
-                pollStatusOnce(fid, 0)
-                toast?.success('Link ingested')
+                watchProgress(fid)
+                toast?.success('Link queued')
                 setLinkUrl('')
                 refreshFiles && refreshFiles()
               }catch(e){
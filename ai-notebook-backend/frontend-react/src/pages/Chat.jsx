@@ -115,7 +115,7 @@ export default function Chat({ base = '' }) {
     } catch {}
   }
 
-  const isImageUrl = (u) => /\.(png|jpg|jpeg)(#.*)?$/i.test(u || '')
+  const isImageUrl = (u) => /\.(png|jpg|jpeg)(\?[^#]*)?(#.*)?$/i.test(u || '')
 
   const copyShareMarkdown = async () => {
     try {
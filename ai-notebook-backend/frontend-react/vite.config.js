@@ -19,6 +19,7 @@ export default defineConfig({
       '/save_note': 'http://127.0.0.1:8000',
       '/notes': 'http://127.0.0.1:8000',
       '/status': 'http://127.0.0.1:8000',
+      '/events': 'http://127.0.0.1:8000',
       '/uploads-list': 'http://127.0.0.1:8000',
       '/uploads': 'http://127.0.0.1:8000',
       '/files': 'http://127.0.0.1:8000',
@@ -1,255 +1,104 @@
-# --- MULTIMODAL Q&A ENDPOINT ---
-@app.post("/multimodal-qa")
-async def multimodal_qa(
-    text: str = Body("", embed=True),
-    image_ocr: str = Body("", embed=True),
-    tables: list = Body([], embed=True),
-    question: str = Body(..., embed=True),
-    chat_model: Optional[str] = Body(None),
-):
-    """Answer a question using any combination of text, image OCR, and table data."""
-    context = []
-    if text.strip():
-        context.append(f"Text:\n{text.strip()}")
-    if image_ocr.strip():
-        context.append(f"Image OCR:\n{image_ocr.strip()}")
-    if tables:
-        for i, t in enumerate(tables):
-            context.append(f"Table {i+1}:\n{t}")
-    if not context:
-        raise HTTPException(status_code=400, detail="No context provided.")
-    user_msg = (
-        f"Here is some context from various sources.\n\n{chr(10).join(context)}\n\nQ: {question}\nA:"
-    )
-    full_prompt = [
-        {"role": "system", "content": system_msg},
-        {"role": "user", "content": user_msg},
-    ]
-    from openai import OpenAI
-    if not settings.OPENAI_API_KEY:
-        raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    try:
-        resp = client.chat.completions.create(
-            model=(chat_model or settings.CHAT_MODEL),
-            messages=full_prompt,
-            temperature=0.2,
-            max_tokens=512,
-        )
-        answer = resp.choices[0].message.content.strip()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
-    return {"answer": answer}
-# --- SUMMARIZATION ENDPOINT ---
-from fastapi import Body
-@app.post("/summarize")
-async def summarize(
-    content: str = Body(..., embed=True),
-    chat_model: Optional[str] = Body(None),
-):
-    """Summarize any text, OCR, or transcript content using the LLM."""
-    if not content.strip():
-        raise HTTPException(status_code=400, detail="No content to summarize.")
-    user_msg = (
-        f"Summarize the following content in a concise, clear way for a student.\n\n{content}\n\nSummary:"
-    )
-    full_prompt = [
-        {"role": "system", "content": system_msg},
-        {"role": "user", "content": user_msg},
-    ]
-    from openai import OpenAI
-    if not settings.OPENAI_API_KEY:
-        raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    try:
-        resp = client.chat.completions.create(
-            model=(chat_model or settings.CHAT_MODEL),
-            messages=full_prompt,
-            temperature=0.2,
-            max_tokens=512,
-        )
-        summary = resp.choices[0].message.content.strip()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
-    return {"summary": summary}
-from fastapi import Form
-# --- IMAGE Q&A ENDPOINT ---
-from typing import Optional
-@app.post("/ask-image")
-async def ask_image(
-    file: UploadFile = File(...),
-    question: str = Form(...),
-    chat_model: Optional[str] = Form(None),
-):
-    """Accept an image, extract text with OCR, and answer a question about it."""
-    # Save uploaded image to memory
-    contents = await file.read()
-    from PIL import Image
-    import io
-    img = Image.open(io.BytesIO(contents))
-    # OCR
-    import pytesseract
-    lang = getattr(settings, "OCR_LANGUAGE", "eng")
-    cfg = getattr(settings, "OCR_TESSERACT_CONFIG", None)
-    text = pytesseract.image_to_string(img, lang=lang, config=cfg)
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="No text found in image.")
-    # Use LLM to answer question about extracted text
-    user_msg = (
-        f"Here is some text extracted from an image via OCR:\n\n{text}\n\nQ: {question}\nA:"
-    )
-    full_prompt = [
-        {"role": "system", "content": system_msg},
-        {"role": "user", "content": user_msg},
-    ]
-    from openai import OpenAI
-    if not settings.OPENAI_API_KEY:
-        raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    try:
-        resp = client.chat.completions.create(
-            model=(chat_model or settings.CHAT_MODEL),
-            messages=full_prompt,
-            temperature=0.2,
-            max_tokens=512,
-        )
-        answer = resp.choices[0].message.content.strip()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
-    return {"answer": answer, "ocr_text": text}
-
-
-# --- TABLE EXTRACTION (PDF or Image) ---
-from fastapi import Form
-@app.post("/extract-table")
-async def extract_table(
-    file: UploadFile = File(...),
-    filetype: str = Form(...),  # 'pdf' or 'image'
-    page: int = Form(1),        # for PDF, which page
-):
-    """Extract tables from a PDF (using camelot) or image (using pytesseract)."""
-    import io
-    import pandas as pd
-    tables = []
-    if filetype == 'pdf':
-        # Save PDF to temp
-        contents = await file.read()
-        with open("/tmp/_table.pdf", "wb") as f:
-            f.write(contents)
-        try:
-            import camelot
-            pdf_tables = camelot.read_pdf("/tmp/_table.pdf", pages=str(page), flavor="stream")
-            for t in pdf_tables:
-                tables.append(t.df.to_dict())
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"PDF table extraction failed: {e}")
-    elif filetype == 'image':
-        # Use pytesseract to extract tables from image
-        from PIL import Image
-        import pytesseract
-        img = Image.open(io.BytesIO(await file.read()))
-        try:
-            df = pd.read_html(pytesseract.image_to_string(img))[0]
-            tables.append(df.to_dict())
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Image table extraction failed: {e}")
-    else:
-        raise HTTPException(status_code=400, detail="filetype must be 'pdf' or 'image'")
-    return {"tables": tables}
-
-
-# --- AUDIO TRANSCRIPTION & Q&A ---
-@app.post("/transcribe-audio")
-async def transcribe_audio(
-    file: UploadFile = File(...),
-    question: str = Form(None),
-    chat_model: Optional[str] = Form(None),
-):
-    """Transcribe audio (mp3/wav/m4a) and optionally answer a question about it."""
-    import io
-    contents = await file.read()
-    from openai import OpenAI
-    if not settings.OPENAI_API_KEY:
-        raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    # Transcribe audio using Whisper
-    try:
-        audio_file = io.BytesIO(contents)
-        audio_file.name = file.filename
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            response_format="text"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Transcription error: {e}")
-    transcript_text = transcript.strip()
-    if not question:
-        return {"transcript": transcript_text}
-    # Q&A about transcript
-    user_msg = (
-        f"Here is a transcript from an audio file:\n\n{transcript_text}\n\nQ: {question}\nA:"
-    )
-    full_prompt = [
-        {"role": "system", "content": system_msg},
-        {"role": "user", "content": user_msg},
-    ]
-    try:
-        resp = client.chat.completions.create(
-            model=(chat_model or settings.CHAT_MODEL),
-            messages=full_prompt,
-            temperature=0.2,
-            max_tokens=512,
-        )
-        answer = resp.choices[0].message.content.strip()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
-    return {"transcript": transcript_text, "answer": answer}
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import itertools
 import json
+import os
+import time
 import uuid
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Header
+from typing import Optional
+from fastapi import FastAPI, UploadFile, File, Form, Body, HTTPException, BackgroundTasks, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi.responses import RedirectResponse, HTMLResponse, FileResponse, Response
+from fastapi.responses import RedirectResponse, HTMLResponse, FileResponse, Response, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
-from app.pdf_parser import extract_text, chunk_text
-from pathlib import Path
+from app.pdf_parser import extract_text, chunk_text, ocr_available
 import io
 import re
-import requests
-from bs4 import BeautifulSoup
-try:
-    from youtube_transcript_api import YouTubeTranscriptApi
-    _YT_AVAILABLE = True
-except Exception:
-    _YT_AVAILABLE = False
-try:
-    import pytesseract
-    from PIL import Image
-    _OCR_AVAILABLE = True
-except Exception:
-    _OCR_AVAILABLE = False
- 
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+# Heavy/optional libraries (requests, bs4, youtube_transcript_api, pytesseract,
+# PIL, faiss, fitz, tiktoken, openai) are imported where used; see _warm_up()
+from app import audio as _audio, catalog as _catalog, conversation as _conversation, embeddings as _embeddings, ocr as _ocr, pdf_parser as _pdf_parser, progress as _progress, rerank as _rerank, responses as _responses, static as _static, tables as _tables, vector_store as _vector_store, web as _web
 from app.embeddings import embed_texts
-from app.vector_store import build_index, save_index, load_index, search
+from app.singleflight import SingleFlight, flight_key
+from app.upstream import BACKGROUND, INTERACTIVE, estimate_chat_tokens, scheduler
+from app import metrics
+from app.tracing import span, trace, SPAN_KIND_SERVER
+from app.vector_store import (
+    IndexMismatchError, build_index, chunks_by_id as _chunks_by_id, forget_index, has_chunk_ids, index_model,
+    load_chunks, original_vectors, save_index, load_index, search, update_index,
+)
 from app.db import (
     load_notes,
-    save_notes,
     load_notebooks,
-    save_notebooks,
     load_files_meta,
-    save_files_meta,
+    notes_tx,
+    notebooks_tx,
+    files_meta_tx,
+    load_batches,
+    batches_tx,
+    load_urls,
+    urls_tx,
+    locked,
 )
 from app.config import settings
 
+def _init_storage():
+    UPLOADS_DIR.mkdir(exist_ok=True)
+    VECTORS_DIR.mkdir(parents=True, exist_ok=True)
+    # A new catalog is filled from uploads/ once; afterwards it is kept up to date at ingest
+    with locked(Path(settings.CATALOG_DB)):
+        if not _catalog.initialized():
+            added = _catalog.backfill(UPLOADS_DIR, VECTORS_DIR, load_files_meta())
+            _catalog.mark_initialized()
+            print(f"File catalog: added {added} existing uploads")
+
+
+def _warm_up():
+    """Load the tokenizer, PDF/FAISS libraries, embedding client and reranker ahead of traffic."""
+    start = time.perf_counter()
+    try:
+        _pdf_parser.warm_up()
+        _vector_store.warm_up()
+        _embeddings.warm_up()
+        _rerank.warm_up()
+        print(f"Warm-up done in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        print(f"Warm-up failed (will load on first use): {e}")
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    _init_storage()
+    _ocr.preload()  # must happen on the main thread, whatever the warm-up mode
+    mode = settings.STARTUP_WARMUP
+    if mode == "blocking":
+        await run_in_threadpool(_warm_up)
+    elif mode == "background":
+        # Accept traffic right away; first requests load whatever is still missing
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    yield
+
+
 app = FastAPI(
+    lifespan=_lifespan,
     title="StudyLM Backend (MVP)",
     docs_url=("/docs" if settings.ENABLE_API_DOCS else None),
     redoc_url=("/redoc" if settings.ENABLE_API_DOCS else None),
     openapi_url=("/openapi.json" if settings.ENABLE_API_DOCS else None),
+    default_response_class=_responses.JSONResponse,
 )
 
 app.add_middleware(
@@ -259,6 +108,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    _responses.CompressionMiddleware,
+    minimum_size=settings.COMPRESS_MIN_BYTES,
+    gzip_level=settings.COMPRESS_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESS_BROTLI_QUALITY,
+)
 
 
 class ApiPrefixMiddleware(BaseHTTPMiddleware):
@@ -274,6 +129,51 @@ class ApiPrefixMiddleware(BaseHTTPMiddleware):
 
 app.add_middleware(ApiPrefixMiddleware)
 
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            # Label by route template (not raw path) to keep cardinality bounded
+            route = request.scope.get("route")
+            metrics.HTTP_LATENCY.observe(
+                time.perf_counter() - start,
+                method=request.method,
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code),
+            )
+
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        # Header toggles are honoured only for internal callers (same token as /health)
+        internal = _is_internal(request.headers.get("x-internal"))
+        force = internal and request.headers.get("x-trace", "").strip() in {"1", "true"}
+        profile = internal and request.headers.get("x-profile", "").strip() in {"1", "true"}
+        with trace(
+            f"{request.method} {request.url.path}",
+            force=force,
+            profile=profile,
+            kind=SPAN_KIND_SERVER,
+            **{"http.method": request.method, "http.target": request.url.path},
+        ) as root:
+            response = await call_next(request)
+            if root is not None:
+                route = request.scope.get("route")
+                root.name = f"{request.method} {getattr(route, 'path', request.url.path)}"
+                root.set(**{"http.status_code": response.status_code})
+            return response
+
+
+app.add_middleware(TracingMiddleware)
+# Added last so it runs first and times the whole stack
+app.add_middleware(MetricsMiddleware)
+
 @app.get("/models")
 def list_models():
     """Return allowed chat models and defaults for the UI."""
@@ -285,14 +185,13 @@ def list_models():
         "embedding": settings.EMBEDDING_MODEL,
     }
 
+# Created by the startup hook (_init_storage)
 UPLOADS_DIR = Path("uploads")
-UPLOADS_DIR.mkdir(exist_ok=True)
 VECTORS_DIR = Path(settings.VECTOR_STORE_DIR)
-VECTORS_DIR.mkdir(exist_ok=True)
 REACT_DIST = Path("frontend-react") / "dist"
 
 # Serve uploaded files at /uploads/<filename>
-app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR), name="uploads")
+app.mount("/uploads", _static.UploadFiles(directory=UPLOADS_DIR, check_dir=False), name="uploads")
 # Note: React/Vite frontend served separately. No static app mount here.
 
 # If a production React build exists, serve its assets and index at /app
@@ -324,8 +223,10 @@ def _stage_path(file_id: str) -> Path:
     return Path(VECTORS_DIR) / f"{file_id}.stage.txt"
 
 def _write_stage(file_id: str, stage: str):
+    _progress.report(file_id, stage=stage)
     try:
         _stage_path(file_id).write_text(stage, encoding="utf8")
+        _catalog.update(file_id, stage=stage)
     except Exception:
         pass
 
@@ -334,22 +235,91 @@ def _read_stage(file_id: str) -> str | None:
     return p.read_text(encoding="utf8").strip() if p.exists() else None
 
 
-def _source_url(file_id: str, page_start: int | None = None) -> str | None:
+def _ocr_stats_path(file_id: str) -> Path:
+    return Path(VECTORS_DIR) / f"{file_id}.ocr.json"
+
+
+def _write_ocr_stats(file_id: str, pages: list[dict]) -> None:
+    """Record per-page OCR timings from extract_text for /status."""
+    per_page = [p["ocr"] for p in pages if "ocr" in p]
+    path = _ocr_stats_path(file_id)
+    if not per_page:
+        path.unlink(missing_ok=True)
+        return
+    stats = {"pages": len(per_page), "total_ms": round(sum(p["ms"] for p in per_page), 1)}
+    for p in per_page:
+        stats[p["source"]] = stats.get(p["source"], 0) + 1
+    stats["per_page"] = per_page
+    path.write_text(json.dumps(stats), encoding="utf8")
+
+
+def _read_ocr_stats(file_id: str) -> dict | None:
+    p = _ocr_stats_path(file_id)
+    return json.loads(p.read_text(encoding="utf8")) if p.exists() else None
+
+
+def _read_chunks(mapping_file: Path) -> list[dict]:
+    with span("chunks.read", file=mapping_file.name):
+        return json.loads(mapping_file.read_text())
+
+
+def _chunk_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf8")).hexdigest()
+
+
+def _with_chunk_ids(chunks: list[dict], start: int = 0) -> list[dict]:
+    """Stamp chunks with their vector id in the index and a content hash (used to diff replacements)."""
+    for i, c in enumerate(chunks, start=start):
+        c["id"] = i
+        c["hash"] = _chunk_hash(c["text"])
+    return chunks
+
+
+def _catalog_add(file_id: str, path: Path, title: str | None = None) -> None:
+    _catalog.add(file_id, path.name, path.stat().st_size, title=title)
+
+
+def _catalog_chunks(file_id: str, chunks: list[dict]) -> None:
+    """Record the page and chunk counts of a freshly indexed document."""
+    pages = max((c.get("page_end") or c.get("page_start") or 0 for c in chunks), default=0)
+    _catalog.update(file_id, pages=pages or None, chunks=len(chunks))
+
+
+def _write_chunks(mapping_file: Path, chunks: list[dict]) -> None:
+    tmp = mapping_file.with_name(f".{mapping_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(chunks, indent=2), encoding="utf8")
+    os.replace(tmp, mapping_file)
+
+
+def _source_url(file_id: str, page_start: int | None = None, t_start: float | None = None) -> str | None:
     """Return a best-available URL to the uploaded source for this file_id.
-    Prefers PDF if present (adds #page anchor), else PNG, JPG, then TXT.
+    Prefers PDF if present (adds #page anchor), else PNG, JPG, TXT, then audio
+    (adds a #t= media fragment). The ``?v=`` content version makes the URL
+    cacheable as immutable; a replaced PDF gets a new one.
     """
     pdf = UPLOADS_DIR / f"{file_id}.pdf"
     if pdf.exists():
         if page_start:
-            return f"/uploads/{file_id}.pdf#page={page_start}"
-        return f"/uploads/{file_id}.pdf"
+            return f"/uploads/{file_id}.pdf?v={_static.version(pdf)}#page={page_start}"
+        return f"/uploads/{file_id}.pdf?v={_static.version(pdf)}"
     for ext in ("png", "jpg", "txt"):
         p = UPLOADS_DIR / f"{file_id}.{ext}"
         if p.exists():
-            return f"/uploads/{file_id}.{ext}"
+            return f"/uploads/{file_id}.{ext}?v={_static.version(p)}"
+    for ext in AUDIO_EXTS:
+        p = UPLOADS_DIR / f"{file_id}{ext}"
+        if p.exists():
+            return f"/uploads/{file_id}{ext}?v={_static.version(p)}" + (f"#t={t_start:g}" if t_start is not None else "")
     return None
 
 
+def _time_range(chunk: dict) -> dict:
+    """t_start/t_end (seconds) for citations of audio chunks."""
+    if chunk.get("t_start") is None:
+        return {}
+    return {"t_start": chunk["t_start"], "t_end": chunk.get("t_end")}
+
+
 @app.get("/")
 def root():
     """Landing route -> React app if built, otherwise safe info (docs hidden by default)."""
@@ -380,13 +350,7 @@ def upload_form():
 
 @app.get("/uploads-list")
 def list_uploads():
-    # include common types we save
-    patterns = ["*.pdf", "*.png", "*.jpg", "*.jpeg", "*.txt"]
-    names = []
-    for pat in patterns:
-        names += [p.name for p in UPLOADS_DIR.glob(pat)]
-    files = sorted(names)
-    return {"files": files, "base_url": "/uploads/"}
+    return {"files": _catalog.names(), "base_url": "/uploads/"}
 
 
 @app.post("/upload")
@@ -398,6 +362,7 @@ async def upload(background_tasks: BackgroundTasks, file: UploadFile = File(...)
     temp_path = UPLOADS_DIR / f"{file_id}.pdf"
     with open(temp_path, "wb") as f:
         f.write(await file.read())
+    _catalog_add(file_id, temp_path, title=file.filename)
 
     # Process in background to keep API fast
     background_tasks.add_task(process_pdf, temp_path, file_id)
@@ -405,12 +370,52 @@ async def upload(background_tasks: BackgroundTasks, file: UploadFile = File(...)
     return {"file_id": file_id, "message": "File queued for processing. It may take ~10-60s depending on size."}
 
 
+_INGEST_ACTIVE = metrics.Gauge("studylm_ingest_jobs_active", "Ingest jobs currently running", ("kind",))
+# Ingest work waiting to start: URL jobs for a _URL_SLOTS slot, batch items for a parse thread
+_QUEUED = {"url": 0, "batch": 0}
+_QUEUED_LOCK = threading.Lock()
+metrics.Gauge(
+    "studylm_ingest_jobs_queued", "Ingest work waiting for a slot (url | batch)", ("kind",),
+    fn=lambda: {(k,): v for k, v in _QUEUED.items()},
+)
+
+
+def _queued(kind: str, n: int) -> None:
+    with _QUEUED_LOCK:
+        _QUEUED[kind] += n
+
+
 def process_pdf(temp_path: Path, file_id: str):
     """Parse → chunk → embed → store."""
     print(f"Processing {file_id} …")
+    _INGEST_ACTIVE.inc(kind="pdf")
+    try:
+        with trace("ingest.pdf", file_id=file_id), _progress.bound(file_id):
+            _process_pdf(temp_path, file_id)
+    finally:
+        _INGEST_ACTIVE.dec(kind="pdf")
+
+
+def _table_chunks(file_id: str, path: Path, pages: list[dict]) -> list[dict]:
+    """Tables of a PDF as extra chunks when ENABLE_TABLE_EXTRACTION is on ([] if extraction fails)."""
+    if not settings.ENABLE_TABLE_EXTRACTION:
+        return []
+    _write_stage(file_id, "tables")
+    try:
+        with metrics.INGEST_STAGE.time(stage="tables"), span("ingest.tables"):
+            return _tables.to_chunks(_tables.extract(str(path), len(pages)))
+    except Exception as e:
+        print(f"Table extraction failed for {file_id}: {e}")
+        return []
+
+
+def _process_pdf(temp_path: Path, file_id: str):
     try:
         _write_stage(file_id, "parsing")
-        pages = extract_text(str(temp_path))  # [{page:int,text:str}]
+        with metrics.INGEST_STAGE.time(stage="parse"), span("ingest.parse"):
+            pages = extract_text(str(temp_path))  # [{page:int,text:str,ocr?:dict}]
+        _write_ocr_stats(file_id, pages)
+        tables = _table_chunks(file_id, temp_path, pages)
     except Exception as e:
         # Record a marker file so status shows not-ready with reason
         (VECTORS_DIR / f"{file_id}.error.txt").write_text(str(e), encoding="utf8")
@@ -418,59 +423,260 @@ def process_pdf(temp_path: Path, file_id: str):
         print(f"Failed to process {file_id}: {e}")
         return
 
-    chunks = chunk_text(pages)  # [{text, page_start, page_end}]
+    with metrics.INGEST_STAGE.time(stage="chunk"), span("ingest.chunk"):
+        chunks = _with_chunk_ids(chunk_text(pages) + tables)  # [{text, page_start, page_end, id, hash, kind?, csv?}]
     try:
+        _progress.report(file_id, chunks_total=len(chunks))
         _write_stage(file_id, "embedding")
-        embeddings = embed_texts([c["text"] for c in chunks])
-        idx = build_index(embeddings)
-        save_index(idx, file_id)
+        with metrics.INGEST_STAGE.time(stage="embed"), span("ingest.embed", chunks=len(chunks)):
+            embeddings = _embed([c["text"] for c in chunks], priority=BACKGROUND)
+        _store_document(file_id, chunks, embeddings)
     except Exception as e:
         (VECTORS_DIR / f"{file_id}.error.txt").write_text(str(e), encoding="utf8")
         _write_stage(file_id, "error")
         print(f"Failed to build index for {file_id}: {e}")
         return
 
-    # Keep chunk mapping (with page ranges) so we can cite context later
-    mapping_file = Path(VECTORS_DIR) / f"{file_id}_chunks.json"
-    mapping_file.write_text(json.dumps(chunks, indent=2), encoding="utf8")
-
     # Note: keep the uploaded PDF file for viewing; do not delete temp_path
-    _write_stage(file_id, "done")
     print(f"Done {file_id}")
 
 
+def _store_document(file_id: str, chunks: list[dict], embeddings: list[list[float]]) -> None:
+    """Save the index and chunk mapping of a freshly ingested document and mark it done."""
+    with metrics.INGEST_STAGE.time(stage="index_write"), span("ingest.index_write"):
+        save_index(build_index(embeddings), file_id)
+        # Keep chunk mapping (with page ranges) so we can cite context later
+        _write_chunks(Path(VECTORS_DIR) / f"{file_id}_chunks.json", chunks)
+    _catalog_chunks(file_id, chunks)
+    row = _catalog.get(file_id)
+    if row and (UPLOADS_DIR / row["name"]).exists():
+        _static.content_hash(UPLOADS_DIR / row["name"])  # citation links need its version
+    _write_stage(file_id, "done")
+
+
+# ---------------------- Replace a source in place ----------------------
+@app.put("/file/{file_id}")
+async def replace_file(file_id: str, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """Upload a new version of a PDF under the same file_id.
+
+    Notes, notebook memberships and citations keep pointing at ``file_id``; only
+    chunks whose text changed are embedded again.
+    """
+    if file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="Only PDFs allowed")
+    if not (UPLOADS_DIR / f"{file_id}.pdf").exists():
+        raise HTTPException(status_code=404, detail="PDF source not found")
+
+    # The current version stays viewable and searchable until the new one is indexed
+    incoming_dir = UPLOADS_DIR / ".incoming"
+    incoming_dir.mkdir(exist_ok=True)
+    temp_path = incoming_dir / f"{file_id}.{uuid.uuid4().hex}.pdf"
+    with open(temp_path, "wb") as f:
+        f.write(await file.read())
+
+    _write_stage(file_id, "queued")
+    background_tasks.add_task(reindex_pdf, temp_path, file_id)
+    return {"file_id": file_id, "message": "Replacement queued; unchanged passages are reused from the current index."}
+
+
+def reindex_pdf(temp_path: Path, file_id: str):
+    """Parse → chunk → diff against the indexed version → embed new chunks → update."""
+    print(f"Re-indexing {file_id} …")
+    _INGEST_ACTIVE.inc(kind="pdf_replace")
+    try:
+        # One replacement per document at a time, across worker processes
+        with trace("ingest.pdf_replace", file_id=file_id), _progress.bound(file_id), locked(VECTORS_DIR / f"{file_id}.faiss"):
+            _reindex_pdf(temp_path, file_id)
+    finally:
+        _INGEST_ACTIVE.dec(kind="pdf_replace")
+        temp_path.unlink(missing_ok=True)
+
+
+def _reindex_pdf(temp_path: Path, file_id: str):
+    try:
+        _write_stage(file_id, "parsing")
+        with metrics.INGEST_STAGE.time(stage="parse"), span("ingest.parse"):
+            pages = extract_text(str(temp_path))
+        _write_ocr_stats(file_id, pages)
+        tables = _table_chunks(file_id, temp_path, pages)
+        with metrics.INGEST_STAGE.time(stage="chunk"), span("ingest.chunk"):
+            chunks = chunk_text(pages) + tables
+        if not chunks:
+            raise ValueError("No text extracted from the new version")
+        reused, embedded, removed = _reindex_chunks(file_id, chunks)
+        os.replace(temp_path, UPLOADS_DIR / f"{file_id}.pdf")
+        _catalog.update(file_id, size_bytes=(UPLOADS_DIR / f"{file_id}.pdf").stat().st_size)
+    except Exception as e:
+        # The previous version's index and chunks are left in place
+        (VECTORS_DIR / f"{file_id}.error.txt").write_text(str(e), encoding="utf8")
+        _write_stage(file_id, "error")
+        print(f"Failed to re-index {file_id}: {e}")
+        return
+
+    (VECTORS_DIR / f"{file_id}.error.txt").unlink(missing_ok=True)
+    _write_stage(file_id, "done")
+    print(f"Done {file_id}: {reused} chunks reused, {embedded} embedded, {removed} removed")
+
+
+def _reindex_chunks(file_id: str, chunks: list[dict]) -> tuple[int, int, int]:
+    """Index a new version of a document's chunks, embedding only the changed ones.
+
+    Returns (reused, embedded, removed) chunk counts. On error the previous
+    index and chunk mapping are left as they were.
+    """
+    mapping_file = Path(VECTORS_DIR) / f"{file_id}_chunks.json"
+    try:
+        vi = load_index(file_id, writable=True)
+    except (FileNotFoundError, IndexMismatchError):
+        vi = None  # never indexed, or built with another embedding model: embed everything
+    old = _read_chunks(mapping_file) if vi is not None and mapping_file.exists() else []
+    # Indexes saved before chunk ids were position-addressed: rebuild them with ids,
+    # reusing their vectors when they can be recovered exactly
+    incremental = vi is not None and has_chunk_ids(vi)
+    old_vectors = None if vi is None or incremental else original_vectors(vi)
+    reusable = incremental or old_vectors is not None
+
+    # Match chunks by content hash; a reused chunk keeps its vector id and takes the new page range
+    pool: dict[str, list[int]] = {}
+    for pos, c in enumerate(old):
+        pool.setdefault(c.get("hash") or _chunk_hash(c["text"]), []).append(int(c.get("id", pos)))
+    next_id = max((int(c.get("id", pos)) for pos, c in enumerate(old)), default=-1) + 1
+    fresh = []
+    for c in chunks:
+        c["hash"] = _chunk_hash(c["text"])
+        ids = pool.get(c["hash"]) if reusable else None
+        if ids:
+            c["id"] = ids.pop(0)
+        else:
+            c["id"] = next_id
+            next_id += 1
+            fresh.append(c)
+    stale = [i for ids in pool.values() for i in ids]
+
+    _progress.report(file_id, chunks_total=len(fresh), chunks_reused=len(chunks) - len(fresh))
+    _write_stage(file_id, "embedding")
+    with metrics.INGEST_STAGE.time(stage="embed"), span("ingest.embed", chunks=len(fresh), reused=len(chunks) - len(fresh)):
+        embeddings = _embed([c["text"] for c in fresh], priority=BACKGROUND) if fresh else []
+    with metrics.INGEST_STAGE.time(stage="index_write"), span("ingest.index_write", removed=len(stale)):
+        if incremental:
+            update_index(file_id, stale, embeddings, [c["id"] for c in fresh])
+        else:
+            new_vecs = dict(zip((c["id"] for c in fresh), embeddings))
+            vectors = [new_vecs[c["id"]] if c["id"] in new_vecs else old_vectors[c["id"]] for c in chunks]
+            save_index(build_index(vectors, ids=[c["id"] for c in chunks]), file_id)
+        _write_chunks(mapping_file, chunks)
+    _catalog_chunks(file_id, chunks)
+    return len(chunks) - len(fresh), len(fresh), len(stale)
+
+
+# --------------------------- Audio ingestion ---------------------------
+AUDIO_EXTS = (".mp3", ".wav", ".m4a", ".ogg", ".webm", ".flac", ".mp4")
+
+
+async def _save_stream(file: UploadFile, dest: Path, max_mb: int) -> None:
+    """Copy an upload to ``dest`` 1 MB at a time; 413 past ``max_mb``."""
+    size = 0
+    with open(dest, "wb") as out:
+        while piece := await file.read(1 << 20):
+            size += len(piece)
+            if size > max_mb * 1024 * 1024:
+                out.close()
+                dest.unlink(missing_ok=True)
+                raise HTTPException(status_code=413, detail=f"File larger than {max_mb}MB")
+            out.write(piece)
+
+
+@app.post("/upload_audio")
+async def upload_audio(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """Queue a lecture recording for transcription and indexing; poll /status/{file_id}."""
+    ext = Path(file.filename or "").suffix.lower()
+    if ext not in AUDIO_EXTS:
+        raise HTTPException(status_code=400, detail=f"Audio must be one of: {', '.join(AUDIO_EXTS)}")
+    file_id = str(uuid.uuid4())
+    dest = UPLOADS_DIR / f"{file_id}{ext}"
+    await _save_stream(file, dest, settings.MAX_AUDIO_MB)
+    _catalog_add(file_id, dest, title=file.filename)
+    _write_stage(file_id, "queued")
+    background_tasks.add_task(process_audio, dest, file_id)
+    return {"file_id": file_id, "message": "Audio queued for transcription and processing."}
+
+
+def process_audio(path: Path, file_id: str):
+    _INGEST_ACTIVE.inc(kind="audio")
+    try:
+        with trace("ingest.audio", file_id=file_id), _progress.bound(file_id):
+            _process_audio(path, file_id)
+    finally:
+        _INGEST_ACTIVE.dec(kind="audio")
+
+
+def _process_audio(path: Path, file_id: str):
+    try:
+        _write_stage(file_id, "transcribing")
+        with metrics.INGEST_STAGE.time(stage="transcribe"), span("ingest.transcribe"):
+            segments = _audio.transcribe(str(path))
+        if not segments:
+            raise ValueError("No speech found in the audio")
+        (VECTORS_DIR / f"{file_id}.transcript.json").write_text(json.dumps(segments), encoding="utf8")
+        # Segments play the part of pages, chunked one at a time so every chunk
+        # (and citation) spans a single segment's time range
+        chunks = []
+        with metrics.INGEST_STAGE.time(stage="chunk"), span("ingest.chunk"):
+            for i, seg in enumerate(segments, start=1):
+                for c in chunk_text([{"page": i, "text": seg["text"]}]):
+                    c["t_start"], c["t_end"] = seg["start"], seg["end"]
+                    chunks.append(c)
+        chunks = _with_chunk_ids(chunks)
+        _progress.report(file_id, chunks_total=len(chunks))
+        _write_stage(file_id, "embedding")
+        with metrics.INGEST_STAGE.time(stage="embed"), span("ingest.embed", chunks=len(chunks)):
+            embeddings = _embed([c["text"] for c in chunks], priority=BACKGROUND)
+        _store_document(file_id, chunks, embeddings)
+    except Exception as e:
+        _fail_item(file_id, e)
+        return
+    print(f"Done {file_id}: {len(segments)} audio segments")
+
+
 # --------------------------- Image OCR ingestion ---------------------------
 @app.post("/upload_image")
 async def upload_image(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     if file.content_type not in {"image/png", "image/jpeg", "image/jpg"}:
         raise HTTPException(status_code=400, detail="Only PNG/JPEG images allowed")
-    if not _OCR_AVAILABLE:
-        raise HTTPException(status_code=500, detail="OCR not available (pytesseract/Pillow not installed)")
+    if not ocr_available():
+        raise HTTPException(status_code=500, detail="OCR not available (install tesserocr, or pytesseract and tesseract)")
     file_id = str(uuid.uuid4())
     # preserve extension for serving/viewing
     ext = ".png" if file.content_type == "image/png" else ".jpg"
     temp_path = UPLOADS_DIR / f"{file_id}{ext}"
     with open(temp_path, "wb") as f:
         f.write(await file.read())
+    _catalog_add(file_id, temp_path, title=file.filename)
     background_tasks.add_task(process_image, temp_path, file_id)
     return {"file_id": file_id, "message": "Image queued for OCR and processing."}
 
 
 def process_image(temp_path: Path, file_id: str):
+    _INGEST_ACTIVE.inc(kind="image")
+    try:
+        with trace("ingest.image", file_id=file_id), _progress.bound(file_id):
+            _process_image(temp_path, file_id)
+    finally:
+        _INGEST_ACTIVE.dec(kind="image")
+
+
+def _process_image(temp_path: Path, file_id: str):
     try:
-        img = Image.open(temp_path)
-        lang = getattr(settings, "OCR_LANGUAGE", "eng") or "eng"
-        cfg = getattr(settings, "OCR_TESSERACT_CONFIG", None)
-        text = pytesseract.image_to_string(img, lang=lang, config=cfg)
         # Wrap as a single-page doc for downstream pipeline
-        pages = [{"page": 1, "text": text.strip()}]
-        chunks = chunk_text(pages)
-        embeddings = embed_texts([c["text"] for c in chunks])
-        idx = build_index(embeddings)
-        save_index(idx, file_id)
-        mapping_file = Path(VECTORS_DIR) / f"{file_id}_chunks.json"
-        mapping_file.write_text(json.dumps(chunks, indent=2), encoding="utf8")
-        _write_stage(file_id, "done")
+        _write_stage(file_id, "parsing")
+        pages = [{"page": 1, "text": _ocr.image_text(temp_path)}]
+        with metrics.INGEST_STAGE.time(stage="chunk"):
+            chunks = _with_chunk_ids(chunk_text(pages))
+        _progress.report(file_id, pages_total=1, pages_done=1, ocr_pages=1, chunks_total=len(chunks))
+        _write_stage(file_id, "embedding")
+        with metrics.INGEST_STAGE.time(stage="embed"):
+            embeddings = _embed([c["text"] for c in chunks], priority=BACKGROUND)
+        _store_document(file_id, chunks, embeddings)
     except Exception as e:
         (VECTORS_DIR / f"{file_id}.error.txt").write_text(str(e), encoding="utf8")
         _write_stage(file_id, "error")
@@ -500,19 +706,30 @@ def _extract_youtube_id(u: str) -> str | None:
     return None
 
 
-@app.post("/ingest_url")
-def ingest_url(payload: IngestUrl):
-    u = (payload.url or "").strip()
-    if not (u.startswith("http://") or u.startswith("https://")):
-        raise HTTPException(status_code=400, detail="Invalid URL")
+def _youtube_api():
+    try:
+        from youtube_transcript_api import YouTubeTranscriptApi
+        return YouTubeTranscriptApi
+    except Exception:
+        return None
+
+
+def _fetch_url(u: str, known: dict | None = None) -> dict | None:
+    """Title, text, HTTP validators and content hash of a web page or YouTube transcript.
+
+    With ``known`` (the last fetch) the request is conditional and None means
+    not modified. ValueError when nothing usable.
+    """
     text = ""
     title = None
-    if _is_youtube_url(u) and _YT_AVAILABLE:
+    etag = last_modified = None
+    yt_api = _youtube_api() if _is_youtube_url(u) else None
+    if yt_api is not None:
         vid = _extract_youtube_id(u)
         if not vid:
-            raise HTTPException(status_code=400, detail="Could not parse YouTube ID")
+            raise ValueError("Could not parse YouTube ID")
         try:
-            transcript = YouTubeTranscriptApi.get_transcript(vid)
+            transcript = yt_api.get_transcript(vid)
             text = "\n".join([seg.get("text") or "" for seg in transcript])
             title = f"YouTube:{vid}"
         except Exception:
@@ -520,38 +737,421 @@ def ingest_url(payload: IngestUrl):
             pass
     if not text:
         try:
-            resp = requests.get(u, timeout=20)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
-            # simple extraction: title + visible text
-            t = soup.find("title")
-            title = (t.get_text(strip=True) if t else None) or u
-            # remove script/style
-            for tag in soup(["script", "style", "noscript"]):
-                tag.extract()
-            text = soup.get_text("\n")
-            text = re.sub(r"\n{2,}", "\n\n", (text or "").strip())
+            page = _web.fetch(u, (known or {}).get("etag"), (known or {}).get("last_modified"))
+            if page.status == 304:
+                return None
+            title, text = _web.html_to_text(page.html)
+            title = title or u
+            etag, last_modified = page.etag, page.last_modified
         except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to fetch URL: {e}")
+            raise ValueError(f"Failed to fetch URL: {e}")
 
     if not text:
-        raise HTTPException(status_code=400, detail="No text extracted from URL")
+        raise ValueError("No text extracted from URL")
+    return {"title": title, "text": text, "etag": etag, "last_modified": last_modified, "content_hash": _chunk_hash(text)}
 
-    file_id = str(uuid.uuid4())
+
+def _save_url_text(file_id: str, u: str, title: str | None, text: str) -> None:
     # Save a reference .txt file for viewing
     txt_path = UPLOADS_DIR / f"{file_id}.txt"
     txt_path.write_text(f"Source: {u}\n\n{title or ''}\n\n{text}", encoding="utf8")
+    _static.precompress(txt_path)
+    _catalog.update(file_id, size_bytes=txt_path.stat().st_size, title=title or u)
 
-    # Index
-    pages = [{"page": 1, "text": text}]
-    chunks = chunk_text(pages)
-    embeddings = embed_texts([c["text"] for c in chunks])
-    idx = build_index(embeddings)
-    save_index(idx, file_id)
-    mapping_file = Path(VECTORS_DIR) / f"{file_id}_chunks.json"
-    mapping_file.write_text(json.dumps(chunks, indent=2), encoding="utf8")
+
+def _url_key(u: str) -> str:
+    return u.split("#", 1)[0]
+
+
+def _is_indexed(file_id: str) -> bool:
+    return (VECTORS_DIR / f"{file_id}.faiss").exists() and (VECTORS_DIR / f"{file_id}_chunks.json").exists()
+
+
+def _url_file_id(u: str) -> tuple[str, bool]:
+    """(file_id, already ingested): a URL submitted again keeps its file_id."""
+    with urls_tx() as data:
+        entry = data.get(_url_key(u))
+        if entry and (UPLOADS_DIR / f"{entry['file_id']}.txt").exists():
+            return entry["file_id"], True
+        file_id = str(uuid.uuid4())
+        data[_url_key(u)] = {"file_id": file_id, "url": u}
+    # listed (size 0) until the page is fetched and saved
+    _catalog.add(file_id, f"{file_id}.txt", title=u)
+    return file_id, False
+
+
+def _remember_url(u: str, file_id: str, page: dict | None) -> None:
+    with urls_tx() as data:
+        entry = data.setdefault(_url_key(u), {"file_id": file_id, "url": u})
+        if page is not None:
+            entry.update({k: page[k] for k in ("title", "etag", "last_modified", "content_hash")})
+        entry["fetched_at"] = _now_ts()
+
+
+def _refresh_url(file_id: str, u: str) -> tuple[list[dict], dict] | None:
+    """Fetch ``u`` for ``file_id``: (chunks, page) for new content, None when unchanged since indexed."""
+    known = load_urls().get(_url_key(u))
+    indexed = bool(known) and known.get("file_id") == file_id and _is_indexed(file_id)
+    _write_stage(file_id, "fetching")
+    with metrics.INGEST_STAGE.time(stage="fetch"), span("ingest.fetch"):
+        page = _fetch_url(u, known if indexed else None)
+    if page is None or (indexed and page["content_hash"] == known.get("content_hash")):
+        _remember_url(u, file_id, page)  # keep the newest validators
+        return None
+    _save_url_text(file_id, u, page["title"], page["text"])
+    with metrics.INGEST_STAGE.time(stage="chunk"), span("ingest.chunk"):
+        chunks = _with_chunk_ids(chunk_text([{"page": 1, "text": page["text"]}]))
+    return chunks, page
+
+
+@app.post("/ingest_url")
+def ingest_url(payload: IngestUrl, background_tasks: BackgroundTasks):
+    u = (payload.url or "").strip()
+    if not (u.startswith("http://") or u.startswith("https://")):
+        raise HTTPException(status_code=400, detail="Invalid URL")
+    file_id, existing = _url_file_id(u)
+    _write_stage(file_id, "queued")
+    background_tasks.add_task(process_url, file_id, u)
+    if existing:
+        return {"file_id": file_id, "message": "URL already ingested; re-indexing only if it changed."}
+    return {"file_id": file_id, "message": "URL queued for fetching and indexing."}
+
+
+_URL_SLOTS = threading.BoundedSemaphore(max(1, settings.URL_INGEST_WORKERS))
+
+
+@contextmanager
+def _url_slot():
+    """One of the process-wide URL_INGEST_WORKERS fetch slots (waiters are counted as queued)."""
+    _queued("url", 1)
+    try:
+        _URL_SLOTS.acquire()
+    finally:
+        _queued("url", -1)
+    try:
+        yield
+    finally:
+        _URL_SLOTS.release()
+
+
+def process_url(file_id: str, u: str):
+    """Fetch (conditionally) → chunk → embed new chunks → store."""
+    _INGEST_ACTIVE.inc(kind="url")
+    try:
+        with _url_slot(), trace("ingest.url", file_id=file_id), _progress.bound(file_id), locked(VECTORS_DIR / f"{file_id}.faiss"):
+            _process_url(file_id, u)
+    finally:
+        _INGEST_ACTIVE.dec(kind="url")
+
+
+def _process_url(file_id: str, u: str):
+    try:
+        got = _refresh_url(file_id, u)
+        if got is None:
+            print(f"Unchanged {u}")
+        else:
+            chunks, page = got
+            if _is_indexed(file_id):
+                reused, embedded, removed = _reindex_chunks(file_id, chunks)
+                print(f"Re-indexed {u}: {reused} chunks reused, {embedded} embedded, {removed} removed")
+            else:
+                _progress.report(file_id, chunks_total=len(chunks))
+                _write_stage(file_id, "embedding")
+                with metrics.INGEST_STAGE.time(stage="embed"), span("ingest.embed", chunks=len(chunks)):
+                    embeddings = _embed([c["text"] for c in chunks], priority=BACKGROUND)
+                _store_document(file_id, chunks, embeddings)
+            _remember_url(u, file_id, page)
+    except Exception as e:
+        _fail_item(file_id, e)
+        return
+    (VECTORS_DIR / f"{file_id}.error.txt").unlink(missing_ok=True)
     _write_stage(file_id, "done")
-    return {"file_id": file_id, "message": "URL ingested and indexed"}
+
+
+# --------------------------- Batch ingestion ---------------------------
+_BATCH_EXTS = {".pdf": "pdf", ".png": "image", ".jpg": "image", ".jpeg": "image"}
+_BATCH_TYPES = {"application/pdf": "pdf", "image/png": "image", "image/jpeg": "image", "image/jpg": "image"}
+_ZIP_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+
+def _batch_kind(name: str | None, content_type: str | None) -> str | None:
+    ext = Path(name or "").suffix.lower()
+    if ext == ".zip" or content_type in _ZIP_TYPES:
+        return "zip"
+    return _BATCH_EXTS.get(ext) or _BATCH_TYPES.get(content_type or "")
+
+
+def _save_batch_file(src, name: str, kind: str) -> dict:
+    file_id = str(uuid.uuid4())
+    ext = ".pdf" if kind == "pdf" else (".png" if name.lower().endswith(".png") else ".jpg")
+    with open(UPLOADS_DIR / f"{file_id}{ext}", "wb") as out:
+        shutil.copyfileobj(src, out)
+    _catalog_add(file_id, UPLOADS_DIR / f"{file_id}{ext}", title=name)
+    _write_stage(file_id, "queued")
+    return {"file_id": file_id, "kind": kind, "name": name}
+
+
+def _over_limits(src, size: int, kind: str) -> str | None:
+    """Why a PDF/image upload or ZIP member breaks MAX_PDF_MB/MAX_PDF_PAGES, else None."""
+    if size > settings.MAX_PDF_MB * 1024 * 1024:
+        return f"larger than {settings.MAX_PDF_MB}MB"
+    if kind == "pdf":
+        import fitz
+
+        try:
+            with fitz.open(stream=src.read(), filetype="pdf") as doc:
+                pages = doc.page_count
+        except Exception:
+            return None  # not a readable PDF: parsing reports it on the item
+        if pages > settings.MAX_PDF_PAGES:
+            return f"more than {settings.MAX_PDF_PAGES} pages"
+    return None
+
+
+@app.post("/ingest/batch")
+def ingest_batch(
+    background_tasks: BackgroundTasks,
+    files: list[UploadFile] = File(default=[]),
+    urls: list[str] = Form(default=[]),
+    notebook_id: str | None = Form(default=None),
+):
+    """Ingest many PDFs/images (or .zip bundles of them) and URLs as one job group.
+
+    ``urls`` may be repeated or newline-separated. Everything is optionally
+    attached to ``notebook_id``; poll ``GET /ingest/batch/{batch_id}`` for progress.
+    """
+    url_list = [u.strip() for value in urls for u in value.splitlines() if u.strip()]
+    for u in url_list:
+        if not (u.startswith("http://") or u.startswith("https://")):
+            raise HTTPException(status_code=400, detail=f"Invalid URL: {u}")
+    kinds = [(f, _batch_kind(f.filename, f.content_type)) for f in files]
+    unsupported = [f.filename for f, kind in kinds if kind is None]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {', '.join(unsupported)} (PDF, PNG, JPEG or ZIP)")
+    if notebook_id and notebook_id not in load_notebooks():
+        raise HTTPException(status_code=404, detail="Notebook not found")
+
+    # Plan first so limits are checked before anything is written
+    plan: list[tuple] = []  # (open_source, name, kind)
+    skipped: list[dict] = []
+    for f, kind in kinds:
+        if kind != "zip":
+            size = f.file.seek(0, os.SEEK_END)
+            f.file.seek(0)
+            reason = _over_limits(f.file, size, kind)
+            f.file.seek(0)
+            if reason:
+                skipped.append({"name": f.filename or "upload", "reason": reason})
+            else:
+                plan.append((lambda f=f: f.file, f.filename or "upload", kind))
+            continue
+        try:
+            archive = zipfile.ZipFile(f.file)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail=f"Not a valid ZIP archive: {f.filename}")
+        for info in archive.infolist():
+            base = Path(info.filename).name
+            if info.is_dir() or not base or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            member_kind = _BATCH_EXTS.get(Path(base).suffix.lower())
+            if member_kind is None:
+                skipped.append({"name": info.filename, "reason": "unsupported type"})
+                continue
+            with archive.open(info) as src:
+                reason = _over_limits(src, info.file_size, member_kind)
+            if reason:
+                skipped.append({"name": info.filename, "reason": reason})
+            else:
+                plan.append((lambda a=archive, i=info: a.open(i), base, member_kind))
+    if not plan and not url_list:
+        raise HTTPException(status_code=400, detail="Nothing to ingest")
+    if len(plan) + len(url_list) > settings.MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items ({len(plan) + len(url_list)}); limit is {settings.MAX_BATCH_ITEMS}")
+
+    items = []
+    for open_source, name, kind in plan:
+        with open_source() as src:
+            items.append(_save_batch_file(src, name, kind))
+    for u in url_list:
+        file_id, _ = _url_file_id(u)
+        _write_stage(file_id, "queued")
+        items.append({"file_id": file_id, "kind": "url", "name": u, "url": u})
+
+    batch_id = str(uuid.uuid4())
+    with batches_tx() as data:
+        data[batch_id] = {
+            "id": batch_id,
+            "created_at": _now_ts(),
+            "finished_at": None,
+            "notebook_id": notebook_id,
+            "items": items,
+            "skipped": skipped,
+        }
+    if notebook_id:
+        # Attach right away: sources that are not indexed yet are skipped by retrieval
+        with notebooks_tx() as data:
+            nb = data.get(notebook_id)
+            if nb is not None:
+                sources = nb.setdefault("sources", [])
+                sources.extend(it["file_id"] for it in items if it["file_id"] not in sources)
+                nb["updated_at"] = _now_ts()
+
+    background_tasks.add_task(process_batch, batch_id, items)
+    return {"batch_id": batch_id, "items": len(items), "skipped": skipped, "status_url": f"/ingest/batch/{batch_id}"}
+
+
+@app.get("/ingest/batch/{batch_id}")
+def batch_status(batch_id: str):
+    """Aggregate progress of a batch plus per-item stage and error."""
+    batch = load_batches().get(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    counts = dict.fromkeys(("queued", "fetching", "parsing", "embedding", "done", "error"), 0)
+    items = []
+    for it in batch["items"]:
+        stage = _read_stage(it["file_id"]) or "queued"
+        err = VECTORS_DIR / f"{it['file_id']}.error.txt"
+        counts[stage] = counts.get(stage, 0) + 1
+        items.append({
+            "file_id": it["file_id"],
+            "kind": it["kind"],
+            "name": it["name"],
+            "stage": stage,
+            "error": err.read_text(encoding="utf8") if stage == "error" and err.exists() else None,
+        })
+    total = len(items)
+    finished = counts["done"] + counts["error"]
+    return {
+        "batch_id": batch_id,
+        "notebook_id": batch.get("notebook_id"),
+        "created_at": batch.get("created_at"),
+        "finished_at": batch.get("finished_at"),
+        "total": total,
+        "counts": counts,
+        "progress": round(finished / total, 3) if total else 1.0,
+        "complete": finished == total,
+        "skipped": batch.get("skipped", []),
+        "items": items,
+    }
+
+
+def process_batch(batch_id: str, items: list[dict]):
+    print(f"Processing batch {batch_id} ({len(items)} items) …")
+    _INGEST_ACTIVE.inc(kind="batch")
+    try:
+        with trace("ingest.batch", batch_id=batch_id, items=len(items)):
+            _process_batch(items)
+    finally:
+        _INGEST_ACTIVE.dec(kind="batch")
+        with batches_tx() as data:
+            if batch_id in data:
+                data[batch_id]["finished_at"] = _now_ts()
+    print(f"Done batch {batch_id}")
+
+
+def _fail_item(file_id: str, e) -> None:
+    (VECTORS_DIR / f"{file_id}.error.txt").write_text(str(e), encoding="utf8")
+    _write_stage(file_id, "error")
+    print(f"Failed to process {file_id}: {e}")
+
+
+def _parse_item(item: dict) -> list[dict] | None:
+    """Parse/OCR/fetch one batch item into chunks (None: URL unchanged)."""
+    with _progress.bound(item["file_id"]):
+        return _parse_one(item)
+
+
+def _parse_one(item: dict) -> list[dict] | None:
+    file_id, kind = item["file_id"], item["kind"]
+    _write_stage(file_id, "parsing")
+    if kind == "pdf":
+        with metrics.INGEST_STAGE.time(stage="parse"), span("ingest.parse", file_id=file_id):
+            pages = extract_text(str(UPLOADS_DIR / f"{file_id}.pdf"))
+        _write_ocr_stats(file_id, pages)
+        tables = _table_chunks(file_id, UPLOADS_DIR / f"{file_id}.pdf", pages)
+    elif kind == "image":
+        path = next(UPLOADS_DIR / f"{file_id}{ext}" for ext in (".png", ".jpg") if (UPLOADS_DIR / f"{file_id}{ext}").exists())
+        pages = [{"page": 1, "text": _ocr.image_text(path)}]
+    else:
+        # Same process-wide fetch slots as /ingest_url (per-host limits apply in _web)
+        with _url_slot():
+            got = _refresh_url(file_id, item["url"])
+        if got is None:
+            return None  # unchanged since it was indexed
+        chunks, page = got
+        item["page"] = {k: v for k, v in page.items() if k != "text"}
+        return chunks
+    with metrics.INGEST_STAGE.time(stage="chunk"), span("ingest.chunk", file_id=file_id):
+        return _with_chunk_ids(chunk_text(pages) + (tables if kind == "pdf" else []))
+
+
+def _process_batch(items: list[dict]) -> None:
+    # Items are parsed on a shared bounded pool; their chunks are pooled across
+    # documents so every embeddings request is full, then each document's index
+    # is written as soon as its vectors are back.
+    pool = _thread_pool("batch-ingest", max(1, settings.BATCH_INGEST_WORKERS))
+
+    def parse(item: dict):
+        _queued("batch", -1)
+        return _parse_item(item)
+
+    _queued("batch", len(items))
+    futures = {pool.submit(contextvars.copy_context().run, parse, it): it for it in items}
+    pending: list[tuple[dict, list[dict]]] = []
+
+    def flush() -> None:
+        if not pending:
+            return
+        for item, chunks in pending:
+            _progress.report(item["file_id"], chunks_total=len(chunks))
+            _write_stage(item["file_id"], "embedding")
+        texts = [c["text"] for _, chunks in pending for c in chunks]
+        try:
+            with metrics.INGEST_STAGE.time(stage="embed"), span("ingest.embed", chunks=len(texts), documents=len(pending)):
+                embeddings = _embed(texts, priority=BACKGROUND)
+        except Exception as e:
+            for item, _ in pending:
+                _fail_item(item["file_id"], e)
+            pending.clear()
+            return
+        pos = 0
+        for item, chunks in pending:
+            _progress.report(item["file_id"], chunks_embedded=len(chunks))
+            try:
+                _store_document(item["file_id"], chunks, embeddings[pos:pos + len(chunks)])
+                if "page" in item:
+                    _remember_url(item["url"], item["file_id"], item["page"])
+            except Exception as e:
+                _fail_item(item["file_id"], e)
+            pos += len(chunks)
+        pending.clear()
+
+    for fut in as_completed(futures):
+        item = futures[fut]
+        file_id = item["file_id"]
+        try:
+            chunks = fut.result()
+            if chunks is None:
+                _write_stage(file_id, "done")
+                continue
+            if item["kind"] == "url" and _is_indexed(file_id):
+                # A changed page that was ingested before: embed only its new chunks
+                with locked(VECTORS_DIR / f"{file_id}.faiss"):
+                    _reindex_chunks(file_id, chunks)
+                _remember_url(item["url"], file_id, item["page"])
+                (VECTORS_DIR / f"{file_id}.error.txt").unlink(missing_ok=True)
+                _write_stage(file_id, "done")
+                continue
+        except Exception as e:
+            _fail_item(file_id, e)
+            continue
+        if not chunks:
+            _fail_item(file_id, "No text extracted")
+            continue
+        pending.append((item, chunks))
+        if sum(len(c) for _, c in pending) >= settings.EMBEDDING_BATCH_SIZE:
+            flush()
+    flush()
 
 
 class AskRequest(BaseModel):
@@ -561,24 +1161,29 @@ class AskRequest(BaseModel):
 
 
 @app.post("/ask")
-async def ask(payload: AskRequest):
+def ask(payload: AskRequest):
     """Retrieve relevant chunks, ask GPT, and return answer."""
     # Load index & context
     try:
         idx = load_index(payload.file_id)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Document not ready yet")
+    except IndexMismatchError as e:
+        raise HTTPException(status_code=409, detail=f"{e}. Re-upload the document to re-index it.")
 
-    mapping_file = Path(VECTORS_DIR) / f"{payload.file_id}_chunks.json"
-    if not mapping_file.exists():
+    try:
+        by_id = load_chunks(payload.file_id)
+    except FileNotFoundError:
         raise HTTPException(status_code=500, detail="Missing chunks")
 
-    chunks: list[dict] = json.loads(mapping_file.read_text())
-
     # Embedding of the user question
-    q_vecs = embed_texts([payload.question])
-    nearest, _ = search(idx, q_vecs[0])
-    context_chunks = [chunks[i] for i in nearest]
+    q_vecs = _embed([payload.question])
+    try:
+        nearest, _ = search(idx, q_vecs[0], k=_rerank.candidates(3))
+    except IndexMismatchError as e:
+        raise HTTPException(status_code=409, detail=f"{e}. Re-upload the document to re-index it.")
+    context_chunks = [by_id[int(i)] for i in nearest if int(i) in by_id]
+    context_chunks = _rerank.rerank(payload.question, context_chunks, 3, text=lambda c: c.get("text") or "")
     context_texts = [c["text"] for c in context_chunks]
     user_msg = (
         "Here is some context from the document:\n\n"
@@ -591,18 +1196,9 @@ async def ask(payload: AskRequest):
     ]
 
     # Call LLM using OpenAI Python SDK v1
-    from openai import OpenAI
-    if not settings.OPENAI_API_KEY:
-        raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    client = _openai_client()
     try:
-        resp = client.chat.completions.create(
-            model=(payload.chat_model or settings.CHAT_MODEL),
-            messages=full_prompt,
-            temperature=0.2,
-            max_tokens=512,
-        )
-        answer = resp.choices[0].message.content.strip()
+        answer = _chat_complete(client, full_prompt, payload.chat_model or settings.CHAT_MODEL).strip()
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
@@ -611,13 +1207,16 @@ async def ask(payload: AskRequest):
     for c in context_chunks:
         page_start = c.get("page_start")
         page_end = c.get("page_end")
-        url = _source_url(payload.file_id, page_start)
+        url = _source_url(payload.file_id, page_start, c.get("t_start"))
         citations.append(
             {
+                "chunk_id": c.get("id"),
+                "kind": c.get("kind", "text"),
                 "page_start": page_start,
                 "page_end": page_end,
                 "preview": (c.get("text") or "").strip()[:240],
                 "url": url,
+                **_time_range(c),
             }
         )
 
@@ -659,19 +1258,18 @@ def _nb_get(nb_id: str) -> dict:
 
 @app.post("/notebooks")
 def create_notebook(payload: NotebookCreate):
-    data = load_notebooks()
     nb_id = str(uuid.uuid4())
-    data[nb_id] = {
-        "id": nb_id,
-        "title": payload.title.strip() or "Untitled",
-        "description": payload.description or "",
-        "created_at": _now_ts(),
-        "updated_at": _now_ts(),
-        "sources": [],  # list of file_id
-        "facts": [],  # list of {id,text,ts}
-        "chat_history": [],  # list of {role,content,ts,citations?}
-    }
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        data[nb_id] = {
+            "id": nb_id,
+            "title": payload.title.strip() or "Untitled",
+            "description": payload.description or "",
+            "created_at": _now_ts(),
+            "updated_at": _now_ts(),
+            "sources": [],  # list of file_id
+            "facts": [],  # list of {id,text,ts}
+            "chat_history": [],  # list of {role,content,ts,citations?}
+        }
     return {"id": nb_id}
 
 
@@ -694,86 +1292,80 @@ def list_notebooks():
 @app.get("/notebooks/{nb_id}")
 def get_notebook(nb_id: str):
     nb = _nb_get(nb_id)
-    return nb
+    # Plain JSON from the store: render it directly instead of walking it with jsonable_encoder
+    return _responses.JSONResponse(nb)
 
 
 @app.patch("/notebooks/{nb_id}")
 def patch_notebook(nb_id: str, payload: NotebookPatch):
-    data = load_notebooks()
-    nb = data.get(nb_id)
-    if not nb:
-        raise HTTPException(status_code=404, detail="Notebook not found")
-    if payload.title is not None:
-        nb["title"] = payload.title
-    if payload.description is not None:
-        nb["description"] = payload.description
-    nb["updated_at"] = _now_ts()
-    data[nb_id] = nb
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb = data.get(nb_id)
+        if not nb:
+            raise HTTPException(status_code=404, detail="Notebook not found")
+        if payload.title is not None:
+            nb["title"] = payload.title
+        if payload.description is not None:
+            nb["description"] = payload.description
+        nb["updated_at"] = _now_ts()
+        data[nb_id] = nb
     return {"message": "Updated"}
 
 
 @app.delete("/notebooks/{nb_id}")
 def delete_notebook(nb_id: str):
-    data = load_notebooks()
-    if nb_id in data:
+    with notebooks_tx() as data:
         data.pop(nb_id, None)
-        save_notebooks(data)
     return {"message": "Deleted"}
 
 
 @app.post("/notebooks/{nb_id}/sources")
 def attach_source(nb_id: str, payload: NotebookSourceAttach):
-    data = load_notebooks()
-    nb = data.get(nb_id)
-    if not nb:
-        raise HTTPException(status_code=404, detail="Notebook not found")
-    fid = payload.file_id
-    if fid not in nb.setdefault("sources", []):
-        nb["sources"].append(fid)
-    nb["updated_at"] = _now_ts()
-    data[nb_id] = nb
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb = data.get(nb_id)
+        if not nb:
+            raise HTTPException(status_code=404, detail="Notebook not found")
+        fid = payload.file_id
+        if fid not in nb.setdefault("sources", []):
+            nb["sources"].append(fid)
+        nb["updated_at"] = _now_ts()
+        data[nb_id] = nb
     return {"message": "Attached", "sources": nb["sources"]}
 
 
 @app.delete("/notebooks/{nb_id}/sources/{file_id}")
 def detach_source(nb_id: str, file_id: str):
-    data = load_notebooks()
-    nb = data.get(nb_id)
-    if not nb:
-        raise HTTPException(status_code=404, detail="Notebook not found")
-    nb["sources"] = [f for f in nb.get("sources", []) if f != file_id]
-    nb["updated_at"] = _now_ts()
-    data[nb_id] = nb
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb = data.get(nb_id)
+        if not nb:
+            raise HTTPException(status_code=404, detail="Notebook not found")
+        nb["sources"] = [f for f in nb.get("sources", []) if f != file_id]
+        nb["updated_at"] = _now_ts()
+        data[nb_id] = nb
     return {"message": "Detached", "sources": nb["sources"]}
 
 
 @app.post("/notebooks/{nb_id}/facts")
 def add_fact(nb_id: str, payload: NotebookFactCreate):
-    data = load_notebooks()
-    nb = data.get(nb_id)
-    if not nb:
-        raise HTTPException(status_code=404, detail="Notebook not found")
-    fact_id = str(uuid.uuid4())
-    nb.setdefault("facts", []).append({"id": fact_id, "text": payload.text, "ts": _now_ts()})
-    nb["updated_at"] = _now_ts()
-    data[nb_id] = nb
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb = data.get(nb_id)
+        if not nb:
+            raise HTTPException(status_code=404, detail="Notebook not found")
+        fact_id = str(uuid.uuid4())
+        nb.setdefault("facts", []).append({"id": fact_id, "text": payload.text, "ts": _now_ts()})
+        nb["updated_at"] = _now_ts()
+        data[nb_id] = nb
     return {"id": fact_id}
 
 
 @app.delete("/notebooks/{nb_id}/facts/{fact_id}")
 def remove_fact(nb_id: str, fact_id: str):
-    data = load_notebooks()
-    nb = data.get(nb_id)
-    if not nb:
-        raise HTTPException(status_code=404, detail="Notebook not found")
-    nb["facts"] = [f for f in nb.get("facts", []) if f.get("id") != fact_id]
-    nb["updated_at"] = _now_ts()
-    data[nb_id] = nb
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb = data.get(nb_id)
+        if not nb:
+            raise HTTPException(status_code=404, detail="Notebook not found")
+        nb["facts"] = [f for f in nb.get("facts", []) if f.get("id") != fact_id]
+        nb["updated_at"] = _now_ts()
+        data[nb_id] = nb
     return {"message": "Removed"}
 
 
@@ -788,24 +1380,70 @@ class NotebookAsk(BaseModel):
 @app.get("/notebooks/{nb_id}/history")
 def notebook_history(nb_id: str):
     nb = _nb_get(nb_id)
-    return {"history": nb.get("chat_history", [])}
+    return _responses.JSONResponse({"history": nb.get("chat_history", [])})
 
 
 @app.delete("/notebooks/{nb_id}/history")
 def clear_notebook_history(nb_id: str):
-    data = load_notebooks()
-    nb = data.get(nb_id)
-    if not nb:
-        raise HTTPException(status_code=404, detail="Notebook not found")
-    nb["chat_history"] = []
-    nb["updated_at"] = _now_ts()
-    data[nb_id] = nb
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb = data.get(nb_id)
+        if not nb:
+            raise HTTPException(status_code=404, detail="Notebook not found")
+        nb["chat_history"] = []
+        nb.pop("history_summary", None)
+        nb["updated_at"] = _now_ts()
+        data[nb_id] = nb
     return {"message": "Cleared"}
 
 
+def _search_query(nb: dict, question: str) -> str:
+    """``question`` rewritten as a standalone query using the chat so far (itself for a new chat)."""
+    messages = _conversation.condense_messages(nb, question) if settings.CHAT_CONDENSE else None
+    if messages is None:
+        return question
+    try:
+        with span("notebook.condense_question"):
+            query = _chat_complete(
+                _openai_client(), messages, model=settings.CHAT_CONDENSE_MODEL or settings.CHAT_MODEL, temperature=0, max_tokens=128
+            ).strip()
+    except Exception:
+        return question  # searching with the raw follow-up beats failing the answer
+    return query or question
+
+
+def _update_history_summary(nb_id: str) -> None:
+    """Fold the messages that left the recent window into the notebook's rolling summary."""
+    while True:
+        nb = load_notebooks().get(nb_id)
+        job = _conversation.pending(nb) if nb else None
+        if job is None:
+            return
+        messages, upto, end = job
+        previous, _ = _conversation.summary(nb)
+        last_ts = nb["chat_history"][end - 1].get("ts")
+        try:
+            text = _chat_complete(
+                _openai_client(),
+                _conversation.summary_messages(previous, messages),
+                model=settings.CHAT_CONDENSE_MODEL or settings.CHAT_MODEL,
+                temperature=0,
+                max_tokens=settings.CHAT_SUMMARY_TOKENS,
+                priority=BACKGROUND,
+            ).strip()
+        except Exception:
+            return  # upto stays put: these messages are folded after the next question
+        with notebooks_tx() as data:
+            nb = data.get(nb_id)
+            history = (nb or {}).get("chat_history") or []
+            # Stop if the history was cleared or another worker folded these turns meanwhile
+            if not nb or len(history) < end or history[end - 1].get("ts") != last_ts or _conversation.summary(nb)[1] != upto:
+                return
+            nb["history_summary"] = {"text": text, "upto": end}
+            data[nb_id] = nb
+
+
 @app.post("/notebooks/{nb_id}/ask")
-def ask_notebook(nb_id: str, payload: NotebookAsk):
+def ask_notebook(nb_id: str, payload: NotebookAsk, background_tasks: BackgroundTasks):
     nb = _nb_get(nb_id)
     nb_settings = nb.get("settings", {})
     sources: list[str] = nb.get("sources", [])
@@ -816,31 +1454,19 @@ def ask_notebook(nb_id: str, payload: NotebookAsk):
     if not sources:
         raise HTTPException(status_code=400, detail="Notebook has no sources")
 
+    # Follow-ups are searched as standalone queries resolved against the chat so far
+    query = _search_query(nb, payload.question)
+
     # Build combined retrieval: search each available source index and gather top results
-    q_vecs = embed_texts([payload.question])
+    q_vecs = _embed([query])
     qv = q_vecs[0]
-    results = []  # list of (score, file_id, chunk_idx, chunk)
-    for fid in sources:
-        try:
-            idx = load_index(fid)
-        except FileNotFoundError:
-            continue
-        mapping_file = Path(VECTORS_DIR) / f"{fid}_chunks.json"
-        if not mapping_file.exists():
-            continue
-        chunks: list[dict] = json.loads(mapping_file.read_text())
-        nearest, scores = search(idx, qv)
-        for i, sc in zip(nearest, scores):
-            if i < 0 or i >= len(chunks):
-                continue
-            results.append((float(sc), fid, int(i), chunks[i]))
-
+    results = _search_sources(sources, qv, k=_rerank.candidates(3), limit=_rerank.candidates(6))
     if not results:
         raise HTTPException(status_code=404, detail="No indexed sources ready")
 
-    # Take top-N across all sources
-    results.sort(key=lambda r: r[0], reverse=True)
-    top = results[:6]
+    # Take top-N across all sources; raw scores from separate indexes are only
+    # roughly comparable, so a configured cross-encoder decides the final order
+    top = _rerank.rerank(query, results, 6, text=lambda r: r[3].get("text") or "")
     context_texts = [c[3].get("text") or "" for c in top]
 
     facts = nb.get("facts", [])
@@ -852,9 +1478,11 @@ def ask_notebook(nb_id: str, payload: NotebookAsk):
             + "\n\nAdditional notebook facts to consider (author-provided):\n"
             + facts_text
         )
+    conversation = _conversation.context(nb)
     user_msg = (
         "Here is some context from the notebook sources (may include multiple files):\n\n"
         + "\n\n".join(context_texts)
+        + (f"\n\nConversation so far:\n{conversation}" if conversation else "")
         + f"\n\nQ: {payload.question}\nA:"
     )
     full_prompt = [
@@ -862,19 +1490,15 @@ def ask_notebook(nb_id: str, payload: NotebookAsk):
         {"role": "user", "content": user_msg},
     ]
 
-    from openai import OpenAI
-
-    if not settings.OPENAI_API_KEY:
-        raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    client = _openai_client()
     try:
-        resp = client.chat.completions.create(
+        answer = _chat_complete(
+            client,
+            full_prompt,
             model=(payload.chat_model or nb_settings.get("chat_model") or settings.CHAT_MODEL),
-            messages=full_prompt,
             temperature=(payload.temperature if payload.temperature is not None else nb_settings.get("temperature", 0.2)),
             max_tokens=(payload.max_tokens or nb_settings.get("max_tokens") or 512),
-        )
-        answer = resp.choices[0].message.content.strip()
+        ).strip()
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
@@ -882,28 +1506,37 @@ def ask_notebook(nb_id: str, payload: NotebookAsk):
     for sc, fid, idx_i, chunk in top:
         page_start = chunk.get("page_start")
         page_end = chunk.get("page_end")
-        url = _source_url(fid, page_start)
+        url = _source_url(fid, page_start, chunk.get("t_start"))
         citations.append(
             {
                 "file_id": fid,
+                "chunk_id": idx_i,
+                "kind": chunk.get("kind", "text"),
                 "page_start": page_start,
                 "page_end": page_end,
                 "preview": (chunk.get("text") or "").strip()[:240],
                 "url": url,
+                **_time_range(chunk),
             }
         )
 
     # Persist chat history
-    data = load_notebooks()
-    nb = data.get(nb_id)
-    if nb is not None:
-        nb.setdefault("chat_history", []).append({"role": "user", "content": payload.question, "ts": _now_ts()})
-        nb["chat_history"].append({"role": "assistant", "content": answer, "ts": _now_ts(), "citations": citations})
-        nb["updated_at"] = _now_ts()
-        data[nb_id] = nb
-        save_notebooks(data)
-
-    return {"answer": answer, "citations": citations}
+    with notebooks_tx() as data:
+        nb = data.get(nb_id)
+        if nb is not None:
+            asked = {"role": "user", "content": payload.question, "ts": _now_ts()}
+            if query != payload.question:
+                asked["search_query"] = query
+            if not nb.get("chat_history"):
+                # Marks the chat as summarized from its first turn (see _conversation.pending)
+                nb["history_summary"] = {"text": "", "upto": 0}
+            nb.setdefault("chat_history", []).append(asked)
+            nb["chat_history"].append({"role": "assistant", "content": answer, "ts": _now_ts(), "citations": citations})
+            nb["updated_at"] = _now_ts()
+            data[nb_id] = nb
+    background_tasks.add_task(_update_history_summary, nb_id)
+
+    return {"answer": answer, "citations": citations, "search_query": query}
 
 
 # ---------------------- Notebook Study Tools API ----------------------
@@ -940,36 +1573,158 @@ def _gather_notebook_context(nb: dict, query_hint: str, top_k: int = 8, include_
     if not sources:
         raise HTTPException(status_code=400, detail="Notebook has no sources")
     # Embed the hint as the query vector
-    q_vecs = embed_texts([query_hint])
+    q_vecs = _embed([query_hint])
     qv = q_vecs[0]
-    results: list[tuple[float, str, int, dict]] = []
-    for fid in sources:
-        try:
-            idx = load_index(fid)
-        except FileNotFoundError:
-            continue
-        mapping_file = Path(VECTORS_DIR) / f"{fid}_chunks.json"
-        if not mapping_file.exists():
-            continue
-        chunks: list[dict] = json.loads(mapping_file.read_text())
-        nearest, scores = search(idx, qv)
-        for i, sc in zip(nearest, scores):
-            if i < 0 or i >= len(chunks):
-                continue
-            results.append((float(sc), fid, int(i), chunks[i]))
-    if not results:
+    top = _search_sources(sources, qv, limit=top_k)
+    if not top:
         raise HTTPException(status_code=404, detail="No indexed sources ready")
-    results.sort(key=lambda r: r[0], reverse=True)
-    top = results[:top_k]
     return top
 
 
+def _search_source(fid: str, qv: list[float], k: int) -> list[tuple[float, str, int, dict]]:
+    """Top ``k`` chunks of one source as (score, file_id, chunk_id, chunk), best first."""
+    try:
+        idx = load_index(fid)
+    except (FileNotFoundError, IndexMismatchError):
+        # Not indexed yet, or built with another embedding model
+        return []
+    try:
+        by_id = load_chunks(fid)
+    except FileNotFoundError:
+        return []
+    try:
+        nearest, scores = search(idx, qv, k=k)
+    except IndexMismatchError:
+        return []
+    out = []
+    for i, sc in zip(nearest, scores):
+        chunk = by_id.get(int(i))
+        if chunk is not None:
+            out.append((float(sc), fid, int(i), chunk))
+    return out
+
+
+@lru_cache(maxsize=None)
+def _thread_pool(name: str, threads: int) -> ThreadPoolExecutor:
+    """Process-wide bounded pool, shared by all requests/jobs of one kind."""
+    return ThreadPoolExecutor(max_workers=threads, thread_name_prefix=name)
+
+
+# Sources whose search timed out but is still holding a pool thread -> how many such searches
+_stuck_searches: dict[str, int] = {}
+_stuck_lock = threading.Lock()
+
+
+def _mark_stuck(fid: str, fut) -> None:
+    with _stuck_lock:
+        _stuck_searches[fid] = _stuck_searches.get(fid, 0) + 1
+
+    def release(_):
+        with _stuck_lock:
+            n = _stuck_searches.pop(fid, 1) - 1
+            if n > 0:
+                _stuck_searches[fid] = n
+
+    fut.add_done_callback(release)
+
+
+def _search_sources(sources: list[str], qv: list[float], k: int = 3, limit: int | None = None) -> list[tuple[float, str, int, dict]]:
+    """Best ``limit`` chunks across sources, searching each for its top ``k``.
+
+    Sources are searched in parallel (FAISS releases the GIL); one that fails,
+    or is still running at NOTEBOOK_SEARCH_TIMEOUT_MS, is left out. A running
+    search cannot be cancelled, so until a timed-out search of a source ends
+    that source is skipped rather than searched again, and a few stuck sources
+    cannot take over the whole pool.
+    """
+    threads = settings.SEARCH_FANOUT_THREADS
+    per_source: list[list] = []
+    with span("notebook.search_sources", sources=len(sources), k=k) as sp:
+        if len(sources) <= 1 or threads <= 1:
+            for fid in sources:
+                try:
+                    per_source.append(_search_source(fid, qv, k))
+                except Exception as e:
+                    metrics.SOURCES_SKIPPED.inc(reason="error")
+                    print(f"Search failed for source {fid}: {e}")
+        else:
+            pool = _thread_pool("source-search", threads)
+            with _stuck_lock:
+                busy = [fid for fid in sources if _stuck_searches.get(fid)]
+            for fid in busy:
+                metrics.SOURCES_SKIPPED.inc(reason="busy")
+                print(f"Search skipped for source {fid}: previous search still running")
+            # Each task gets its own copy of the context so spans attach to this request's trace
+            futures = {
+                pool.submit(contextvars.copy_context().run, _search_source, fid, qv, k): fid
+                for fid in sources
+                if fid not in busy
+            }
+            done, pending = wait(futures, timeout=settings.NOTEBOOK_SEARCH_TIMEOUT_MS / 1000.0)
+            for fut in pending:
+                if not fut.cancel():  # already running: keep it from being submitted again
+                    _mark_stuck(futures[fut], fut)
+                metrics.SOURCES_SKIPPED.inc(reason="timeout")
+                print(f"Search timed out for source {futures[fut]}")
+            for fut, fid in futures.items():  # source order keeps ties deterministic
+                if fut not in done:
+                    continue
+                try:
+                    per_source.append(fut.result())
+                except Exception as e:
+                    metrics.SOURCES_SKIPPED.inc(reason="error")
+                    print(f"Search failed for source {fid}: {e}")
+            if sp is not None:
+                sp.set(timed_out=len(pending), busy=len(busy))
+        # Each list is already best-first: heap-merge instead of sorting everything
+        merged = heapq.merge(*per_source, key=lambda r: r[0], reverse=True)
+        return list(itertools.islice(merged, limit))
+
+
 def _openai_client():
     from openai import OpenAI
 
     if not settings.OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
-    return OpenAI(api_key=settings.OPENAI_API_KEY)
+    # Retries are handled by the upstream scheduler
+    return OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+
+
+# Identical concurrent upstream calls (e.g. a whole class hitting the same
+# notebook summary) share one request; see app.singleflight.
+_chat_flight = SingleFlight("chat")
+_embed_flight = SingleFlight("embed")
+
+
+def _chat_complete(
+    client, messages: list[dict], model: str, temperature: float = 0.2, max_tokens: int = 512, priority: int = INTERACTIVE
+) -> str:
+    # Priority is part of the key: an interactive call must not wait behind a background one
+    key = flight_key("chat", model, messages, temperature=temperature, max_tokens=max_tokens, priority=priority)
+
+    def call():
+        resp = scheduler.run(
+            model,
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            ),
+            tokens=estimate_chat_tokens(messages, model, max_tokens),
+            priority=priority,
+            usage=lambda r: getattr(getattr(r, "usage", None), "total_tokens", None),
+        )
+        return resp.choices[0].message.content or ""
+
+    with span("llm.chat_completion", model=model, max_tokens=max_tokens):
+        return _chat_flight.do(key, call)
+
+
+def _embed(texts: list[str], priority: int = INTERACTIVE) -> list[list[float]]:
+    key = flight_key("embed", settings.EMBEDDING_MODEL, texts, priority=priority)
+    with span("llm.embed", count=len(texts)):
+        return _embed_flight.do(key, lambda: embed_texts(texts, priority=priority))
 
 
 def _extract_json_maybe(text: str):
@@ -1030,23 +1785,22 @@ def summarize_notebook(nb_id: str, payload: SummarizeRequest):
     )
     client = _openai_client()
     try:
-        resp = client.chat.completions.create(
+        md = _chat_complete(
+            client,
+            [{"role": "system", "content": sys}, {"role": "user", "content": user_msg}],
             model=(payload.chat_model or nb_settings.get("chat_model") or settings.CHAT_MODEL),
-            messages=[{"role": "system", "content": sys}, {"role": "user", "content": user_msg}],
             temperature=(payload.temperature if payload.temperature is not None else nb_settings.get("temperature", 0.2)),
             max_tokens=(payload.max_tokens or nb_settings.get("max_tokens") or 800),
-        )
-        md = resp.choices[0].message.content.strip()
+        ).strip()
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
-    data = load_notebooks()
-    nb2 = data.get(nb_id) or nb
-    study = nb2.setdefault("study", {})
-    study[kind] = {"markdown": md, "ts": _now_ts()}
-    nb2["updated_at"] = _now_ts()
-    data[nb_id] = nb2
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb2 = data.get(nb_id) or nb
+        study = nb2.setdefault("study", {})
+        study[kind] = {"markdown": md, "ts": _now_ts()}
+        nb2["updated_at"] = _now_ts()
+        data[nb_id] = nb2
 
     return {"kind": kind, "markdown": md}
 
@@ -1074,26 +1828,25 @@ def flashcards_notebook(nb_id: str, payload: FlashcardsRequest):
     )
     client = _openai_client()
     try:
-        resp = client.chat.completions.create(
+        raw = _chat_complete(
+            client,
+            [{"role": "system", "content": sys}, {"role": "user", "content": user_msg}],
             model=(payload.chat_model or nb_settings.get("chat_model") or settings.CHAT_MODEL),
-            messages=[{"role": "system", "content": sys}, {"role": "user", "content": user_msg}],
             temperature=(payload.temperature if payload.temperature is not None else nb_settings.get("temperature", 0.2)),
             max_tokens=(payload.max_tokens or nb_settings.get("max_tokens") or 900),
         )
-        raw = resp.choices[0].message.content
         cards = _extract_json_maybe(raw)
         if not isinstance(cards, list):
             raise ValueError("Expected a JSON array")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
-    data = load_notebooks()
-    nb2 = data.get(nb_id) or nb
-    study = nb2.setdefault("study", {})
-    study["flashcards"] = {"items": cards, "ts": _now_ts()}
-    nb2["updated_at"] = _now_ts()
-    data[nb_id] = nb2
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb2 = data.get(nb_id) or nb
+        study = nb2.setdefault("study", {})
+        study["flashcards"] = {"items": cards, "ts": _now_ts()}
+        nb2["updated_at"] = _now_ts()
+        data[nb_id] = nb2
     return {"count": len(cards), "items": cards}
 
 
@@ -1120,26 +1873,25 @@ def quiz_notebook(nb_id: str, payload: QuizRequest):
     )
     client = _openai_client()
     try:
-        resp = client.chat.completions.create(
+        raw = _chat_complete(
+            client,
+            [{"role": "system", "content": sys}, {"role": "user", "content": user_msg}],
             model=(payload.chat_model or nb_settings.get("chat_model") or settings.CHAT_MODEL),
-            messages=[{"role": "system", "content": sys}, {"role": "user", "content": user_msg}],
             temperature=(payload.temperature if payload.temperature is not None else nb_settings.get("temperature", 0.2)),
             max_tokens=(payload.max_tokens or nb_settings.get("max_tokens") or 1200),
         )
-        raw = resp.choices[0].message.content
         quiz = _extract_json_maybe(raw)
         if not isinstance(quiz, list):
             raise ValueError("Expected a JSON array of quiz items")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
-    data = load_notebooks()
-    nb2 = data.get(nb_id) or nb
-    study = nb2.setdefault("study", {})
-    study["quiz"] = {"items": quiz, "ts": _now_ts()}
-    nb2["updated_at"] = _now_ts()
-    data[nb_id] = nb2
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb2 = data.get(nb_id) or nb
+        study = nb2.setdefault("study", {})
+        study["quiz"] = {"items": quiz, "ts": _now_ts()}
+        nb2["updated_at"] = _now_ts()
+        data[nb_id] = nb2
     return {"count": len(quiz), "items": quiz}
 
 
@@ -1163,26 +1915,66 @@ def get_notebook_settings(nb_id: str):
 
 @app.patch("/notebooks/{nb_id}/settings")
 def patch_notebook_settings(nb_id: str, payload: NotebookSettingsModel):
-    data = load_notebooks()
-    nb = data.get(nb_id)
-    if not nb:
-        raise HTTPException(status_code=404, detail="Notebook not found")
-    settings_nb = nb.setdefault("settings", {})
-    if payload.chat_model is not None:
-        settings_nb["chat_model"] = payload.chat_model
-    if payload.temperature is not None:
-        settings_nb["temperature"] = payload.temperature
-    if payload.max_tokens is not None:
-        settings_nb["max_tokens"] = int(payload.max_tokens)
-    nb["updated_at"] = _now_ts()
-    data[nb_id] = nb
-    save_notebooks(data)
+    with notebooks_tx() as data:
+        nb = data.get(nb_id)
+        if not nb:
+            raise HTTPException(status_code=404, detail="Notebook not found")
+        settings_nb = nb.setdefault("settings", {})
+        if payload.chat_model is not None:
+            settings_nb["chat_model"] = payload.chat_model
+        if payload.temperature is not None:
+            settings_nb["temperature"] = payload.temperature
+        if payload.max_tokens is not None:
+            settings_nb["max_tokens"] = int(payload.max_tokens)
+        nb["updated_at"] = _now_ts()
+        data[nb_id] = nb
     return {"message": "Updated", "settings": settings_nb}
 
 
+# nb_id -> (updated_at, version stamp, markdown). The stamp hashes everything the
+# export shows; it is only recomputed when the notebook's updated_at moves.
+_EXPORTS: "OrderedDict[str, tuple]" = OrderedDict()
+_EXPORTS_LOCK = threading.Lock()
+_EXPORTS_MAX = 256
+
+
+def _export_cache_stats() -> dict:
+    with _EXPORTS_LOCK:
+        md_bytes = sum(len(md) for _, _, md in _EXPORTS.values())
+        return {("entries",): len(_EXPORTS), ("bytes",): md_bytes, ("capacity",): _EXPORTS_MAX}
+
+
+metrics.Gauge("studylm_export_cache", "Memoized export.md renders: entries, bytes (characters) and capacity", ("kind",), fn=_export_cache_stats)
+
+
+def _export_stamp(nb: dict) -> str:
+    data = [nb.get("title"), nb.get("facts", []), nb.get("study", {}), nb.get("sources", [])]
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf8")).hexdigest()[:32]
+
+
 @app.get("/notebooks/{nb_id}/export.md")
-def export_markdown(nb_id: str):
+def export_markdown(nb_id: str, if_none_match: str | None = Header(default=None)):
     nb = _nb_get(nb_id)
+    updated = nb.get("updated_at")
+    with _EXPORTS_LOCK:
+        hit = _EXPORTS.get(nb_id)
+    if hit and updated is not None and hit[0] == updated:
+        stamp, md = hit[1], hit[2]
+    else:
+        stamp = _export_stamp(nb)
+        md = hit[2] if hit and hit[1] == stamp else _render_export(nb)  # e.g. only chat history changed
+        with _EXPORTS_LOCK:
+            _EXPORTS[nb_id] = (updated, stamp, md)
+            _EXPORTS.move_to_end(nb_id)
+            while len(_EXPORTS) > _EXPORTS_MAX:
+                _EXPORTS.popitem(last=False)
+    headers = {"ETag": f'"{stamp}"', "Cache-Control": "no-cache"}
+    if if_none_match and f'"{stamp}"' in {t.strip().removeprefix("W/") for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+    return Response(content=md, media_type="text/markdown", headers=headers)
+
+
+def _render_export(nb: dict) -> str:
     title = nb.get("title") or "Untitled Notebook"
     facts = nb.get("facts", [])
     study = nb.get("study", {})
@@ -1218,8 +2010,7 @@ def export_markdown(nb_id: str):
         md += "\n\n## Sources\n\n"
         for fid in sources:
             md += f"- {fid}.pdf — /uploads/{fid}.pdf\n"
-
-    return Response(content=md, media_type="text/markdown")
+    return md
 
 
 class SaveNoteRequest(BaseModel):
@@ -1229,9 +2020,8 @@ class SaveNoteRequest(BaseModel):
 
 @app.post("/save_note")
 async def save_note(payload: SaveNoteRequest):
-    data = load_notes()
-    data.setdefault(payload.file_id, []).append(payload.note)
-    save_notes(data)
+    with notes_tx() as data:
+        data.setdefault(payload.file_id, []).append(payload.note)
     return {"message": "Note saved"}
 
 
@@ -1248,48 +2038,92 @@ class FileLabelPatch(BaseModel):
 
 @app.get("/files-meta")
 def get_files_meta():
-    return {"files": load_files_meta()}
+    return _responses.JSONResponse({"files": load_files_meta()})
 
 
 @app.patch("/file/{file_id}/label")
 def patch_file_label(file_id: str, payload: FileLabelPatch):
-    data = load_files_meta()
-    entry = data.setdefault(file_id, {})
-    entry["label"] = (payload.label or "").strip()
-    data[file_id] = entry
-    save_files_meta(data)
+    with files_meta_tx() as data:
+        entry = data.setdefault(file_id, {})
+        entry["label"] = (payload.label or "").strip()
+        data[file_id] = entry
+    _catalog.update(file_id, label=entry["label"] or None)
     return {"message": "Updated", "file_id": file_id, "label": entry["label"]}
 
 
+def _listing(row: dict) -> dict:
+    return {
+        "file": row["name"],
+        "file_id": row["file_id"],
+        "label": row["label"],
+        "title": row["title"],
+        "kind": row["kind"],
+        "size_bytes": row["size_bytes"],
+        "pages": row["pages"],
+        "stage": row["stage"],
+        "uploaded_at": row["uploaded_at"],
+    }
+
+
 @app.get("/files")
-def list_files():
-    """List uploaded sources (pdf, images, text) with optional labels from files.json."""
-    patterns = ["*.pdf", "*.png", "*.jpg", "*.jpeg", "*.txt"]
-    names = []
-    for pat in patterns:
-        names += [p.name for p in UPLOADS_DIR.glob(pat)]
-    files = sorted(names)
-    meta = load_files_meta()
-    out = []
-    for name in files:
-        # derive file_id from prefix before extension
-        fid = name.split('.')[0]
-        out.append({"file": name, "file_id": fid, "label": (meta.get(fid) or {}).get("label")})
-    return {"files": out, "base_url": "/uploads/"}
+def list_files(
+    kind: str | None = None,
+    stage: str | None = None,
+    label: str | None = None,
+    q: str | None = None,
+    sort: str = "name",
+    order: str = "asc",
+    limit: int | None = None,
+    offset: int = 0,
+):
+    """List uploaded sources from the file catalog.
+
+    Filters: ``kind`` (pdf, image, text, audio), ``stage``, ``label`` and ``q``
+    (substring of name, title or label). ``limit``/``offset`` page through
+    the result; ``total`` counts every match.
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    if (limit is not None and limit < 0) or offset < 0:
+        raise HTTPException(status_code=400, detail="limit and offset must not be negative")
+    try:
+        total, rows = _catalog.query(kind=kind, stage=stage, label=label, q=q, sort=sort, order=order, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"files": [_listing(r) for r in rows], "total": total, "base_url": "/uploads/"}
+
+
+def _is_internal(x_internal: str | None) -> bool:
+    # Require matching token when docs are disabled; allow open in dev
+    if settings.ENABLE_API_DOCS:
+        return True
+    token = settings.HEALTHCHECK_TOKEN or settings.OPENAI_API_KEY
+    return bool(token) and x_internal == token
+
+
+def _require_internal(x_internal: str | None):
+    # If the special header is not present, return 404 to hide endpoint existence.
+    if not _is_internal(x_internal):
+        raise HTTPException(status_code=404, detail="Not Found")
 
 
 # Health endpoint (for internal checks). Require a simple shared header to avoid public exposure.
 @app.get("/health")
 def health(x_internal: str | None = Header(default=None)):
-    # If the special header is not present, return 404 to hide endpoint existence.
-    # In Uvicorn/Starlette, headers map to parameters via Header(...) usually, but we keep it simple:
     # This endpoint is primarily consumed by internal health checks in Docker/K8s.
-    # Require matching token when docs are disabled; allow open in dev
-    if not settings.ENABLE_API_DOCS:
-        token = settings.HEALTHCHECK_TOKEN or settings.OPENAI_API_KEY
-        if not token or x_internal != token:
-            raise HTTPException(status_code=404, detail="Not Found")
-    return {"status": "OK"}
+    _require_internal(x_internal)
+    return {
+        "status": "OK",
+        "singleflight": {"chat": _chat_flight.stats(), "embed": _embed_flight.stats()},
+        "upstream": scheduler.stats(),
+    }
+
+
+# Prometheus scrape endpoint; protected the same way as /health.
+@app.get("/metrics")
+def metrics_endpoint(x_internal: str | None = Header(default=None)):
+    _require_internal(x_internal)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/status/{file_id}")
@@ -1303,49 +2137,120 @@ def status(file_id: str):
         "ready": ready,
         "error": error_path.read_text(encoding="utf8") if error_path.exists() else None,
         "stage": _read_stage(file_id),
+        "progress": _progress.get(file_id),
+        "ocr": _read_ocr_stats(file_id),
         "embedding_model": settings.EMBEDDING_MODEL,
+        "index_embedding_model": index_model(file_id),
         "chat_model": settings.CHAT_MODEL,
     }
 
 
+def _progress_event(ev: dict) -> dict:
+    if ev.get("stage") == "error" and not ev.get("error"):
+        err = VECTORS_DIR / f"{ev['file_id']}.error.txt"
+        ev = dict(ev, error=err.read_text(encoding="utf8") if err.exists() else None)
+    return ev
+
+
+def _stored_progress(file_id: str) -> dict | None:
+    """Last known state of a job that is not running in this process."""
+    row = _catalog.get(file_id)
+    stage = (row or {}).get("stage") or _read_stage(file_id) or ("done" if _is_indexed(file_id) else None)
+    if stage is None:
+        return None
+    ev = json.loads(row["progress"]) if row and row.get("progress") else {}
+    if ev.get("stage") != stage:
+        ev = {"file_id": file_id, "stage": stage, "ready": stage == "done"}
+    return ev
+
+
+def _sse(ev: dict) -> str:
+    return f"event: progress\ndata: {json.dumps(_progress_event(ev))}\n\n"
+
+
+@app.get("/events")
+async def ingest_events(file_id: list[str] = Query(default=[]), batch_id: str | None = None):
+    """Server-sent ingest progress, instead of polling /status.
+
+    Streams the jobs of the given ``file_id``s (repeatable) and/or the items of
+    ``batch_id`` and closes once all of them are done or failed; with neither,
+    it streams every ingest job until the client disconnects. Each ``progress``
+    event carries stage, pages_done/pages_total, ocr_pages,
+    segments_done/segments_total, chunks_embedded/chunks_total, elapsed_s
+    and eta_s (seconds left in the current stage).
+    """
+    ids = set(file_id)
+    if batch_id:
+        batch = load_batches().get(batch_id)
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        ids |= {it["file_id"] for it in batch["items"]}
+    watch = ids or None
+    queue = _progress.subscribe(watch)  # before the snapshot, so nothing falls in between
+
+    def snapshot() -> list[dict]:
+        return [ev for fid in sorted(ids) if (ev := _progress.get(fid) or _stored_progress(fid))]
+
+    def other_workers(since: float) -> list[dict]:
+        return [ev for r in _catalog.changed_since(since, watch) if (ev := _stored_progress(r["file_id"]))]
+
+    async def stream():
+        try:
+            open_ids = set(ids)
+            for ev in await run_in_threadpool(snapshot):
+                yield _sse(ev)
+                if ev["stage"] in _progress.FINAL:
+                    open_ids.discard(ev["file_id"])
+            if ids and not open_ids:
+                return
+            polled_at, beat_at = time.time(), time.monotonic()
+            while True:
+                try:
+                    ev = await asyncio.wait_for(queue.get(), timeout=settings.PROGRESS_POLL_SECONDS)
+                    events = [ev]
+                except asyncio.TimeoutError:
+                    events = []
+                if settings.WORKERS > 1 and time.time() - polled_at >= settings.PROGRESS_POLL_SECONDS:
+                    # jobs running in other worker processes
+                    since, polled_at = polled_at, time.time()
+                    events += await run_in_threadpool(other_workers, since)
+                for ev in events:
+                    yield _sse(ev)
+                    beat_at = time.monotonic()
+                    if ev["stage"] in _progress.FINAL:
+                        open_ids.discard(ev["file_id"])
+                if ids and not open_ids:
+                    return
+                if time.monotonic() - beat_at >= settings.PROGRESS_HEARTBEAT_SECONDS:
+                    yield ": keep-alive\n\n"
+                    beat_at = time.monotonic()
+        finally:
+            _progress.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.get("/file/{file_id}")
 def get_file_info(file_id: str):
-    pdf_path = UPLOADS_DIR / f"{file_id}.pdf"
-    png_path = UPLOADS_DIR / f"{file_id}.png"
-    jpg_path = UPLOADS_DIR / f"{file_id}.jpg"
-    txt_path = UPLOADS_DIR / f"{file_id}.txt"
-    idx_path = Path(VECTORS_DIR) / f"{file_id}.faiss"
-    chunks_path = Path(VECTORS_DIR) / f"{file_id}_chunks.json"
-    exists_pdf = pdf_path.exists()
-    exists_png = png_path.exists()
-    exists_jpg = jpg_path.exists()
-    exists_txt = txt_path.exists()
-    size_bytes = pdf_path.stat().st_size if exists_pdf else 0
-    size_mb = round(size_bytes / (1024 * 1024), 2) if exists_pdf else 0
-    pages = None
-    if chunks_path.exists():
-        try:
-            chunks = json.loads(chunks_path.read_text(encoding="utf8"))
-            mx = 0
-            for c in chunks:
-                ps = c.get("page_start") or 0
-                pe = c.get("page_end") or ps
-                mx = max(mx, ps, pe)
-            pages = mx or None
-        except Exception:
-            pages = None
+    row = _catalog.get(file_id) or {}
+    ext = row.get("ext")
+    size_bytes = row.get("size_bytes") or 0
     return {
         "file_id": file_id,
-        "exists_pdf": exists_pdf,
-    "exists_png": exists_png,
-    "exists_jpg": exists_jpg,
-    "exists_txt": exists_txt,
+        "exists_pdf": ext == ".pdf",
+        "exists_png": ext == ".png",
+        "exists_jpg": ext == ".jpg",
+        "exists_txt": ext == ".txt",
+        "kind": row.get("kind"),
+        "title": row.get("title"),
+        "label": row.get("label"),
         "size_bytes": size_bytes,
-        "size_mb": size_mb,
-        "pages": pages,
-        "indexed": idx_path.exists() and chunks_path.exists(),
-        "stage": _read_stage(file_id),
-        "uploaded_at": (pdf_path.stat().st_mtime if exists_pdf else None),
+        "size_mb": round(size_bytes / (1024 * 1024), 2),
+        "pages": row.get("pages"),
+        "chunks": row.get("chunks"),
+        "indexed": row.get("chunks") is not None,
+        "stage": row.get("stage"),
+        "uploaded_at": row.get("uploaded_at"),
     }
 
 
@@ -1355,9 +2260,14 @@ def delete_file(file_id: str):
     # remove any uploaded variant with this id
     for p in list(UPLOADS_DIR.glob(f"{file_id}.*")) + [
         Path(VECTORS_DIR) / f"{file_id}.faiss",
+        Path(VECTORS_DIR) / f"{file_id}.meta.json",
+        Path(VECTORS_DIR) / f"{file_id}.vecs.npy",
         Path(VECTORS_DIR) / f"{file_id}_chunks.json",
         Path(VECTORS_DIR) / f"{file_id}.error.txt",
+        Path(VECTORS_DIR) / f".{file_id}.faiss.lock",
         _stage_path(file_id),
+        _ocr_stats_path(file_id),
+        Path(VECTORS_DIR) / f"{file_id}.transcript.json",
     ]:
         try:
             if p.exists():
@@ -1365,16 +2275,333 @@ def delete_file(file_id: str):
                 removed.append(str(p))
         except Exception as e:
             print(f"Delete failed {p}: {e}")
-    data = load_notes()
-    if file_id in data:
+    forget_index(file_id)
+    _catalog.remove(file_id)
+    with urls_tx() as data:
+        for key in [k for k, v in data.items() if v.get("file_id") == file_id]:
+            data.pop(key)
+    with notes_tx() as data:
         data.pop(file_id, None)
-        save_notes(data)
     # also remove any files metadata labels
     try:
-        meta = load_files_meta()
-        if file_id in meta:
+        with files_meta_tx() as meta:
             meta.pop(file_id, None)
-            save_files_meta(meta)
     except Exception:
         pass
     return {"message": "Deleted", "removed": removed}
+
+
+# --- MULTIMODAL Q&A ENDPOINT ---
+# Content ids: /ask-image and /multimodal-qa inputs are stored like a small
+# document under a hash of their content, so follow-up questions skip OCR and
+# embedding. Context above CONTENT_INLINE_TOKENS is indexed and retrieved
+# instead of being pasted into every prompt. They are a cache, not sources: no
+# stage, progress events or catalog row, and only the CONTENT_CACHE_MAX most
+# recently used are kept.
+_CONTENT_ID = re.compile(r"^(img|mm)-[0-9a-f]{40}$")
+
+
+def _content_files(content_id: str) -> list[Path]:
+    return [
+        VECTORS_DIR / f"{content_id}_chunks.json",
+        VECTORS_DIR / f"{content_id}.faiss",
+        VECTORS_DIR / f"{content_id}.meta.json",
+        VECTORS_DIR / f"{content_id}.vecs.npy",
+        _stage_path(content_id),  # written by older versions
+        VECTORS_DIR / f".{content_id}.faiss.lock",
+    ]
+
+
+def _content_entries() -> int:
+    return sum(1 for prefix in ("img-", "mm-") for _ in VECTORS_DIR.glob(f"{prefix}*_chunks.json"))
+
+
+metrics.Gauge(
+    "studylm_content_cache", "Stored /ask-image and /multimodal-qa content ids: entries and capacity (CONTENT_CACHE_MAX)", ("kind",),
+    fn=metrics.cached(lambda: {("entries",): _content_entries(), ("capacity",): settings.CONTENT_CACHE_MAX}, 60),
+)
+
+
+def _content_index(content_id: str, chunks: list[dict]) -> None:
+    save_index(build_index(_embed([c["text"] for c in chunks])), content_id)
+
+
+def _sweep_content(keep: str) -> None:
+    """Remove the least recently used content ids beyond CONTENT_CACHE_MAX."""
+    if settings.CONTENT_CACHE_MAX <= 0:
+        return
+    entries = []
+    for prefix in ("img-", "mm-"):
+        for p in VECTORS_DIR.glob(f"{prefix}*_chunks.json"):
+            try:
+                entries.append((p.stat().st_mtime, p.name[: -len("_chunks.json")]))
+            except FileNotFoundError:
+                continue
+    entries.sort(reverse=True)
+    for _, content_id in entries[settings.CONTENT_CACHE_MAX:]:
+        if content_id == keep or not _CONTENT_ID.match(content_id):
+            continue
+        with locked(VECTORS_DIR / f"{content_id}.faiss"):
+            forget_index(content_id)
+            for p in _content_files(content_id):
+                p.unlink(missing_ok=True)
+
+
+def _content_chunks(content_id: str, build_pages=None) -> list[dict]:
+    """Chunks stored for ``content_id``; built once from ``build_pages()`` when missing."""
+    if not _CONTENT_ID.match(content_id):
+        raise HTTPException(status_code=400, detail="Invalid content_id")
+    mapping = VECTORS_DIR / f"{content_id}_chunks.json"
+    if build_pages is None and not mapping.exists():
+        # Checked before locking so unknown ids leave no lock file behind
+        raise HTTPException(status_code=404, detail="Unknown content_id; send the content again")
+    with locked(VECTORS_DIR / f"{content_id}.faiss"):
+        if not mapping.exists():
+            if build_pages is None:
+                raise HTTPException(status_code=404, detail="Unknown content_id; send the content again")
+            chunks = _with_chunk_ids(chunk_text(build_pages()))
+            if not chunks:
+                raise HTTPException(status_code=400, detail="No text found in the content.")
+            encoder = _pdf_parser.get_encoder()
+            if sum(len(encoder.encode(c["text"])) for c in chunks) > settings.CONTENT_INLINE_TOKENS:
+                _content_index(content_id, chunks)
+            _write_chunks(mapping, chunks)
+            created = True
+        else:
+            os.utime(mapping)  # recently used
+            created = False
+        chunks = _read_chunks(mapping)
+    if created:
+        _sweep_content(keep=content_id)
+    return chunks
+
+
+def _content_context(content_id: str, chunks: list[dict], question: str, k: int) -> list[dict]:
+    """All chunks of small content; the ``k`` most relevant of indexed content."""
+    if not (VECTORS_DIR / f"{content_id}.faiss").exists():
+        return chunks
+    qv = _embed([question])[0]
+    try:
+        nearest, _ = search(load_index(content_id), qv, k=_rerank.candidates(k))
+    except (IndexMismatchError, FileNotFoundError):
+        # Built with another embedding model (or removed meanwhile): re-embed the stored chunks
+        with locked(VECTORS_DIR / f"{content_id}.faiss"):
+            try:
+                index = load_index(content_id)
+            except (IndexMismatchError, FileNotFoundError):
+                forget_index(content_id)
+                _content_index(content_id, chunks)
+                index = load_index(content_id)
+        nearest, _ = search(index, qv, k=_rerank.candidates(k))
+    by_id = _chunks_by_id(chunks)
+    found = [by_id[int(i)] for i in nearest if int(i) in by_id]
+    return _rerank.rerank(question, found, k, text=lambda c: c.get("text") or "")
+
+
+def _table_text(t) -> str:
+    if isinstance(t, list) and t and all(isinstance(r, list) for r in t):
+        return _tables.to_markdown([[str(c) for c in r] for r in t])
+    return t if isinstance(t, str) else json.dumps(t, ensure_ascii=False)
+
+
+@app.post("/multimodal-qa")
+def multimodal_qa(
+    text: str = Body("", embed=True),
+    image_ocr: str = Body("", embed=True),
+    tables: list = Body([], embed=True),
+    question: str = Body(..., embed=True),
+    chat_model: Optional[str] = Body(None),
+    content_id: Optional[str] = Body(None, embed=True),
+):
+    """Answer a question using any combination of text, image OCR, and table data.
+
+    Returns a ``content_id``; later questions can send just that id instead of the content.
+    """
+    pages = []
+    if text.strip():
+        pages.append(f"Text:\n{text.strip()}")
+    if image_ocr.strip():
+        pages.append(f"Image OCR:\n{image_ocr.strip()}")
+    for i, t in enumerate(tables or []):
+        pages.append(f"Table {i+1}:\n{_table_text(t)}")
+    if pages:
+        digest = hashlib.sha1(json.dumps(pages, ensure_ascii=False).encode("utf8")).hexdigest()
+        content_id = f"mm-{digest}"
+        chunks = _content_chunks(content_id, lambda: [{"page": i, "text": p} for i, p in enumerate(pages, start=1)])
+    elif content_id:
+        chunks = _content_chunks(content_id)
+    else:
+        raise HTTPException(status_code=400, detail="No context provided.")
+    context = _content_context(content_id, chunks, question, settings.CONTENT_TOP_K)
+    user_msg = (
+        f"Here is some context from various sources.\n\n{chr(10).join(c['text'] for c in context)}\n\nQ: {question}\nA:"
+    )
+    full_prompt = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": user_msg},
+    ]
+    client = _openai_client()
+    try:
+        answer = _chat_complete(client, full_prompt, chat_model or settings.CHAT_MODEL).strip()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
+    return {"answer": answer, "content_id": content_id}
+# --- SUMMARIZATION ENDPOINT ---
+@app.post("/summarize")
+def summarize(
+    content: str = Body(..., embed=True),
+    chat_model: Optional[str] = Body(None),
+):
+    """Summarize any text, OCR, or transcript content using the LLM."""
+    if not content.strip():
+        raise HTTPException(status_code=400, detail="No content to summarize.")
+    user_msg = (
+        f"Summarize the following content in a concise, clear way for a student.\n\n{content}\n\nSummary:"
+    )
+    full_prompt = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": user_msg},
+    ]
+    client = _openai_client()
+    try:
+        summary = _chat_complete(client, full_prompt, chat_model or settings.CHAT_MODEL).strip()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
+    return {"summary": summary}
+# --- IMAGE Q&A ENDPOINT ---
+@app.post("/ask-image")
+async def ask_image(
+    file: Optional[UploadFile] = File(None),
+    question: str = Form(...),
+    chat_model: Optional[str] = Form(None),
+    content_id: Optional[str] = Form(None),
+):
+    """Accept an image, extract text with OCR, and answer a question about it.
+
+    OCR runs once per distinct image: the response's ``content_id`` (a hash of
+    the image) can be sent instead of the file for follow-up questions.
+    """
+    if file is not None:
+        contents = await file.read()
+        content_id = f"img-{hashlib.sha1(contents).hexdigest()}"
+
+        def ocr_pages():
+            if not ocr_available():
+                raise HTTPException(status_code=500, detail="OCR not available (install tesserocr, or pytesseract and tesseract)")
+            suffix = Path(file.filename or "").suffix.lower() or ".png"
+            with tempfile.TemporaryDirectory(prefix="studylm-image-") as tmp:
+                path = Path(tmp) / f"image{suffix}"
+                path.write_bytes(contents)
+                text = _ocr.image_text(path)
+            if not text.strip():
+                raise HTTPException(status_code=400, detail="No text found in image.")
+            return [{"page": 1, "text": text}]
+
+        chunks = await run_in_threadpool(_content_chunks, content_id, ocr_pages)
+    elif content_id:
+        chunks = await run_in_threadpool(_content_chunks, content_id)
+    else:
+        raise HTTPException(status_code=400, detail="Send an image file or a content_id")
+    text = "\n\n".join(c["text"] for c in chunks)
+    context = await run_in_threadpool(_content_context, content_id, chunks, question, settings.CONTENT_TOP_K)
+    # Use LLM to answer question about extracted text
+    user_msg = (
+        f"Here is some text extracted from an image via OCR:\n\n{chr(10).join(c['text'] for c in context)}\n\nQ: {question}\nA:"
+    )
+    full_prompt = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": user_msg},
+    ]
+    client = _openai_client()
+    try:
+        answer = await run_in_threadpool(
+            _chat_complete, client, full_prompt, chat_model or settings.CHAT_MODEL
+        )
+        answer = answer.strip()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
+    return {"answer": answer, "ocr_text": text, "content_id": content_id}
+
+
+# --- TABLE EXTRACTION (PDF or Image) ---
+@app.post("/extract-table")
+async def extract_table(
+    file: UploadFile = File(...),
+    filetype: str = Form(...),  # 'pdf' or 'image'
+    page: int = Form(1),        # for PDF, which page
+):
+    """Extract tables from a PDF (using camelot) or image (using pytesseract)."""
+    import io
+    import pandas as pd
+    tables = []
+    if filetype == 'pdf':
+        # Per-request temp file: concurrent calls must not share a path
+        contents = await file.read()
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(contents)
+        try:
+            found = await run_in_threadpool(_tables.find_tables, f.name, [page])
+            for t in found:
+                rows = t["rows"]
+                # same shape as pandas DataFrame.to_dict(): {column: {row: cell}}
+                tables.append({str(c): {str(r): row[c] for r, row in enumerate(rows)} for c in range(len(rows[0]))})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"PDF table extraction failed: {e}")
+        finally:
+            os.unlink(f.name)
+    elif filetype == 'image':
+        # Use pytesseract to extract tables from image
+        from PIL import Image
+        import pytesseract
+        img = Image.open(io.BytesIO(await file.read()))
+        try:
+            df = pd.read_html(pytesseract.image_to_string(img))[0]
+            tables.append(df.to_dict())
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Image table extraction failed: {e}")
+    else:
+        raise HTTPException(status_code=400, detail="filetype must be 'pdf' or 'image'")
+    return {"tables": tables}
+
+
+# --- AUDIO TRANSCRIPTION & Q&A ---
+@app.post("/transcribe-audio")
+async def transcribe_audio(
+    file: UploadFile = File(...),
+    question: str = Form(None),
+    chat_model: Optional[str] = Form(None),
+):
+    """Transcribe audio (mp3/wav/m4a) and optionally answer a question about it.
+
+    Nothing is kept; use /upload_audio to index a recording for repeated questions.
+    """
+    # Only questions need OpenAI (AUDIO_TRANSCRIBER=local:* works offline); check before transcribing
+    client = _openai_client() if question else None
+    ext = Path(file.filename or "").suffix.lower() or ".wav"
+    with tempfile.TemporaryDirectory(prefix="studylm-transcribe-") as tmp:
+        path = Path(tmp) / f"audio{ext}"
+        await _save_stream(file, path, settings.MAX_AUDIO_MB)
+        try:
+            segments = await run_in_threadpool(_audio.transcribe, str(path), INTERACTIVE)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Transcription error: {e}")
+    transcript = " ".join(seg["text"] for seg in segments)
+    transcript_text = transcript.strip()
+    if not question:
+        return {"transcript": transcript_text, "segments": segments}
+    # Q&A about transcript
+    user_msg = (
+        f"Here is a transcript from an audio file:\n\n{transcript_text}\n\nQ: {question}\nA:"
+    )
+    full_prompt = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": user_msg},
+    ]
+    try:
+        answer = await run_in_threadpool(
+            _chat_complete, client, full_prompt, chat_model or settings.CHAT_MODEL
+        )
+        answer = answer.strip()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
+    return {"transcript": transcript_text, "segments": segments, "answer": answer}
@@ -7,6 +7,24 @@ import streamlit as st
 BASE_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
 st.set_page_config(page_title="StudyLM", layout="wide")
 
+
+def wait_ready(fid: str, timeout: float = 12) -> dict | None:
+    """Follow the backend's progress stream for fid until it is done or failed (None on timeout)."""
+    deadline = time.time() + timeout
+    try:
+        with requests.get(f"{BASE_URL}/events", params={"file_id": fid}, stream=True, timeout=timeout) as r:
+            for line in r.iter_lines():
+                if line.startswith(b"data:"):
+                    ev = json.loads(line[5:])
+                    if ev.get("stage") in ("done", "error"):
+                        return ev
+                if time.time() > deadline:
+                    break
+    except requests.RequestException:
+        pass
+    return None
+
+
 st.title("StudyLM — Streamlit UI (MVP)")
 st.caption(f"Backend: {BASE_URL}")
 
@@ -76,15 +94,12 @@ with right:
         if not fid:
             st.warning("Select or upload a document first.")
         else:
-            # Basic polling to ensure ready
-            ready = False
-            for _ in range(12):
-                s = requests.get(f"{BASE_URL}/status/{fid}").json()
-                if s.get("ready"):
-                    ready = True
-                    break
-                time.sleep(1)
-            if not ready:
+            # Wait on the progress stream instead of polling /status
+            ev = wait_ready(fid)
+            ready = bool(ev and ev.get("ready"))
+            if ev and ev.get("error"):
+                st.error(ev["error"])
+            elif not ready:
                 st.warning("Document not ready yet. Try again in a bit.")
             else:
                 with st.spinner("Thinking…"):